@@ -0,0 +1,213 @@
+"""
+Caché de las páginas de listado con invalidación por versión de modelo.
+
+Cada modelo tiene un contador de versión en la caché de Django. La clave de
+una página incluye las versiones de los modelos que muestra, así que basta
+con incrementar el contador (señales post_save/post_delete, o ``invalidar``
+después de un UPDATE o bulk_create) para que las páginas viejas dejen de
+usarse; expiran solas con LIST_CACHE_TIMEOUT.
+
+Para que varios procesos compartan versiones y páginas, CACHES debe apuntar
+a un backend compartido; con locmem cada proceso tiene su propia caché.
+
+Con réplicas de lectura (biblioteca_virtual/replicas.py) una página hecha en
+una réplica atrasada puede no incluir el cambio que subió la versión. Por
+eso no se guarda si alguno de sus modelos cambió hace menos de
+REPLICA_STICKY_SECONDS, el atraso que se le tolera a una réplica. Los
+clientes con la cookie de escritura reciente no usan la caché: leen de
+default.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import replicas
+
+PREFIJO = 'listados'
+VISTAS = set()
+
+
+def _clave_version(modelo):
+    return f"{PREFIJO}:version:{modelo._meta.label_lower}"
+
+
+def _clave_cambio(modelo):
+    return f"{PREFIJO}:cambio:{modelo._meta.label_lower}"
+
+
+def versiones(*modelos):
+    """Versión actual de cada modelo, en una sola lectura de la caché"""
+    claves = [_clave_version(modelo) for modelo in modelos]
+    actuales = cache.get_many(claves)
+    for clave in claves:
+        if clave not in actuales:
+            # Se arranca desde la hora y no desde 1 para no reutilizar una
+            # versión vieja si el contador se perdió (desalojo o reinicio)
+            cache.add(clave, time.time_ns(), timeout=None)
+            actuales[clave] = cache.get(clave)
+    return [actuales[clave] for clave in claves]
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), timeout=None)
+
+
+def invalidar(*modelos):
+    """
+    Incrementa la versión de ``modelos``. Se incrementa ya y otra vez al
+    confirmar la transacción: una página generada en medio con los datos
+    anteriores queda guardada con una versión que se descarta al confirmar.
+    """
+    claves = [_clave_version(modelo) for modelo in modelos]
+    cambios = [_clave_cambio(modelo) for modelo in modelos]
+
+    def incrementar():
+        for clave in claves:
+            _incrementar(clave)
+        if settings.DATABASE_REPLICAS:
+            cache.set_many({clave: time.time() for clave in cambios}, timeout=settings.REPLICA_STICKY_SECONDS)
+
+    incrementar()
+    transaction.on_commit(incrementar)
+
+
+def _contar(vista, resultado):
+    clave = f"{PREFIJO}:{resultado}:{vista}"
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 1, timeout=None)
+
+
+def estadisticas():
+    """{vista: {'aciertos': n, 'fallos': n}} acumulado en la caché"""
+    claves = {
+        f"{PREFIJO}:{resultado}:{vista}": (vista, resultado)
+        for vista in VISTAS for resultado in ('aciertos', 'fallos')
+    }
+    valores = cache.get_many(claves)
+    datos = {vista: {'aciertos': 0, 'fallos': 0} for vista in VISTAS}
+    for clave, (vista, resultado) in claves.items():
+        datos[vista][resultado] = valores.get(clave, 0)
+    return datos
+
+
+def _leer(request, nombre, modelos):
+    """
+    (claves, respuesta guardada o None) de la petición, o None si la petición
+    no usa la caché (no es GET, tiene mensajes pendientes o el cliente acaba
+    de escribir).
+    """
+    if request.method != 'GET' or get_messages(request) or replicas.COOKIE in request.COOKIES:
+        return None
+
+    ruta = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    version = '.'.join(str(v) for v in versiones(*modelos))
+    clave = f"{PREFIJO}:pagina:{nombre}:{version}:{ruta}"
+    claves = [clave]
+    secreto = request.META.get('CSRF_COOKIE')
+    if secreto:
+        claves.append(f"{clave}:{hashlib.md5(secreto.encode()).hexdigest()}")
+
+    guardadas = cache.get_many(claves)
+    guardada = next((guardadas[c] for c in claves if c in guardadas), None)
+    if guardada is None:
+        _contar(nombre, 'fallos')
+        return claves, None
+
+    _contar(nombre, 'aciertos')
+    contenido, tipo, validadores = guardada
+    response = HttpResponse(contenido, content_type=tipo, headers=validadores)
+    response['X-Cache'] = 'HIT'
+    # Con los validadores guardados se responde 304 sin consultar la base
+    return claves, get_conditional_response(
+        request,
+        etag=validadores.get('ETag'),
+        last_modified=parse_http_date_safe(validadores.get('Last-Modified', '')),
+        response=response,
+    )
+
+
+def _reciente(modelos):
+    """Si alguno de ``modelos`` cambió hace menos de REPLICA_STICKY_SECONDS"""
+    cambios = cache.get_many([_clave_cambio(modelo) for modelo in modelos])
+    return any(time.time() - fecha < settings.REPLICA_STICKY_SECONDS for fecha in cambios.values())
+
+
+def _guardar(request, claves, response, modelos):
+    response['X-Cache'] = 'MISS'
+    if response.status_code != 200 or response.streaming:
+        return
+    # Hecha en una réplica que quizás no vio el último cambio: no se guarda
+    # con la versión nueva
+    if replicas.actual() is not None and _reciente(modelos):
+        return
+
+    # get_token() marca CSRF_COOKIE_NEEDS_UPDATE: la página lleva un token.
+    # Si la cookie se crea o cambia con esta respuesta no hay con qué indexarla.
+    clave = claves[0]
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        secreto = request.META.get('CSRF_COOKIE')
+        if len(claves) < 2 or claves[-1] != f"{clave}:{hashlib.md5(secreto.encode()).hexdigest()}":
+            return
+        clave = claves[-1]
+    validadores = {h: response[h] for h in ('ETag', 'Last-Modified') if response.has_header(h)}
+    cache.set(clave, (response.content, response['Content-Type'], validadores), settings.LIST_CACHE_TIMEOUT)
+
+
+def cachear_listado(*modelos):
+    """
+    Sirve la vista desde la caché mientras no cambie ninguno de ``modelos``.
+    La clave incluye la URL completa (filtros, orden y cursor). Las páginas
+    con un token CSRF se guardan por cookie CSRF. No usan la caché las
+    peticiones con mensajes pendientes, porque los mensajes son de cada
+    usuario, ni las de clientes que acaban de escribir, que leen de default.
+    La respuesta indica X-Cache: HIT o MISS. Si la vista pone ETag o
+    Last-Modified se guardan con la página y los aciertos pueden responder 304.
+    Sirve para vistas sync y async; en las async la caché se usa con
+    sync_to_async porque puede estar en la base de datos.
+    """
+    def decorador(vista):
+        nombre = f"{vista.__module__}.{vista.__name__}"
+        VISTAS.add(nombre)
+
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura_async(request, *args, **kwargs):
+                lectura = await sync_to_async(_leer)(request, nombre, modelos)
+                if lectura is None:
+                    return await vista(request, *args, **kwargs)
+                claves, response = lectura
+                if response is None:
+                    response = await vista(request, *args, **kwargs)
+                    await sync_to_async(_guardar)(request, claves, response, modelos)
+                return response
+
+            return envoltura_async
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            lectura = _leer(request, nombre, modelos)
+            if lectura is None:
+                return vista(request, *args, **kwargs)
+            claves, response = lectura
+            if response is None:
+                response = vista(request, *args, **kwargs)
+                _guardar(request, claves, response, modelos)
+            return response
+
+        return envoltura
+    return decorador
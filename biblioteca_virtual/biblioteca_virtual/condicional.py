@@ -0,0 +1,138 @@
+"""
+GET condicional (ETag / Last-Modified) para los listados y las vistas de detalle.
+
+Los validadores salen de una sola consulta que se hace antes de la vista:
+
+- ``listado(*modelos)``: MAX(updated_at) de cada modelo, que usa el índice
+  de updated_at, y su contador de ``cambios.Borrados`` (una fila por clave),
+  que detecta los borrados y archivados: no cambian el máximo.
+- ``detalle(modelo)``: updated_at del objeto con el ``id`` de la URL.
+
+Si el cliente ya tiene esa versión se responde 304 sin ejecutar la vista. Las
+peticiones con mensajes pendientes no se validan: la página los mostraría.
+
+Con ``csrf=True`` (páginas con ``{% csrf_token %}``) el ETag incluye la
+cookie CSRF de la petición y no se envía Last-Modified: si el token rota
+(al iniciar sesión, por ejemplo) la página se vuelve a generar en lugar de
+responder 304 con un formulario cuyo token ya no vale, como hace
+cache_listados al guardar esas páginas por cookie CSRF. Sin cookie CSRF
+esas páginas no llevan validadores: la respuesta trae un token nuevo.
+"""
+
+import hashlib
+from datetime import timezone as tz
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+
+from cambios.models import Borrados
+
+
+def _fecha(valor):
+    # Con SQL crudo SQLite devuelve texto y sin zona (UTC)
+    if isinstance(valor, str):
+        valor = parse_datetime(valor)
+    if valor is not None and timezone.is_naive(valor):
+        valor = timezone.make_aware(valor, tz.utc)
+    return valor
+
+
+def estado_listado(*modelos):
+    """[(max updated_at, borrados), ...] de cada modelo en una consulta"""
+    connection = connections[router.db_for_read(modelos[0])]
+    borrados = connection.ops.quote_name(Borrados._meta.db_table)
+    partes = []
+    for modelo in modelos:
+        tabla = connection.ops.quote_name(modelo._meta.db_table)
+        partes.append(f"(SELECT MAX(updated_at) FROM {tabla})")
+        partes.append(f"(SELECT cantidad FROM {borrados} WHERE modelo = %s)")
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(partes)}", [modelo._meta.label_lower for modelo in modelos])
+        fila = cursor.fetchone()
+    return [(_fecha(fila[i]), fila[i + 1]) for i in range(0, len(fila), 2)]
+
+
+def _condicional(calcular, csrf=False):
+    """
+    Pone ETag y Last-Modified calculados con ``calcular(request, **kwargs)``,
+    que devuelve (texto para el ETag, última modificación) o None, y responde
+    304 si el cliente ya tiene esa versión; como
+    django.views.decorators.http.condition, pero también para vistas async
+    (el cálculo va por sync_to_async). Con ``csrf`` el ETag depende también
+    de la cookie CSRF y no hay Last-Modified.
+    """
+    def decorador(vista):
+        nombre = f"{vista.__module__}.{vista.__name__}"
+
+        def validadores(request, kwargs):
+            if request.method not in ('GET', 'HEAD') or get_messages(request):
+                return None
+            # Sin cookie la vista genera un token nuevo: no hay versión que validar
+            if csrf and not request.META.get('CSRF_COOKIE'):
+                return None
+            datos = calcular(request, **kwargs)
+            if datos is None:
+                return None
+            texto = f"{nombre}:{datos[0]}"
+            if csrf:
+                texto += f":{request.META['CSRF_COOKIE']}"
+            etag = quote_etag(hashlib.md5(texto.encode()).hexdigest())
+            ultima = int(datos[1].timestamp()) if datos[1] and not csrf else None
+            return etag, ultima
+
+        def completar(response, etag, ultima):
+            if ultima and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(ultima)
+            response.headers.setdefault('ETag', etag)
+            return response
+
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura_async(request, *args, **kwargs):
+                datos = await sync_to_async(validadores)(request, kwargs)
+                if datos is None:
+                    return await vista(request, *args, **kwargs)
+                response = get_conditional_response(request, etag=datos[0], last_modified=datos[1])
+                if response is None:
+                    response = await vista(request, *args, **kwargs)
+                return completar(response, *datos)
+
+            return envoltura_async
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            datos = validadores(request, kwargs)
+            if datos is None:
+                return vista(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=datos[0], last_modified=datos[1])
+            if response is None:
+                response = vista(request, *args, **kwargs)
+            return completar(response, *datos)
+
+        return envoltura
+    return decorador
+
+
+def listado(*modelos, csrf=False):
+    """Validadores de una vista que muestra filas de ``modelos``"""
+    def calcular(request, **kwargs):
+        estado = estado_listado(*modelos)
+        fechas = [fecha for fecha, _ in estado if fecha is not None]
+        return repr(estado), max(fechas, default=None)
+    return _condicional(calcular, csrf)
+
+
+def detalle(modelo, parametro='id', csrf=False):
+    """Validadores de una vista de un solo objeto, tomado del parámetro ``parametro`` de la URL"""
+    def calcular(request, **kwargs):
+        fecha = modelo.objects.filter(pk=kwargs[parametro]).values_list('updated_at', flat=True).first()
+        if fecha is None:
+            return None
+        return f"{kwargs[parametro]}:{fecha.isoformat()}", fecha
+    return _condicional(calcular, csrf)
@@ -0,0 +1,205 @@
+"""
+Vigilancia de consultas por petición para desarrollo y tests.
+
+``VigilanciaConsultasMiddleware`` registra el SQL de cada petición y avisa
+cuando:
+
+- la misma sentencia (mismo SQL, otros parámetros) se repite
+  QUERY_GUARD_REPEATS veces o más: el patrón N+1 de recorrer una relación
+  por fila;
+- la vista hace más consultas que su presupuesto, declarado con
+  ``@presupuesto(n)`` (o QUERY_BUDGET_DEFAULT para las que no declaran uno).
+
+El informe nombra, para cada sentencia, la línea de plantilla y el archivo
+del proyecto desde donde se ejecutó. Con QUERY_GUARD = 'warn' se registra en
+el logger ``biblioteca_virtual.consultas``; con 'raise' se lanza
+``ConsultasExcesivas`` y el test falla; con 'off' el middleware no se carga.
+Por defecto es 'off'; entrypoint.sh la pone en 'warn' en desarrollo.
+
+``VigilanciaConsultasMixin`` activa el modo 'raise' en un TestCase y agrega
+``assertConsultasVigiladas`` para código que no pasa por una vista.
+``VigilanciaTestRunner`` (TEST_RUNNER) usa 'raise' en todo ``manage.py test``
+con cualquier settings, así un N+1 falla también en CI y no solo se registra.
+"""
+
+import logging
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import envolturas
+
+logger = logging.getLogger(__name__)
+
+_registro = ContextVar('consultas', default=None)
+
+
+class ConsultasExcesivas(Exception):
+    pass
+
+
+def presupuesto(maximo):
+    """Declara cuántas consultas puede hacer la vista como máximo"""
+    def decorador(vista):
+        # Los decoradores con functools.wraps copian el atributo hacia afuera
+        vista.presupuesto_consultas = maximo
+        return vista
+    return decorador
+
+
+def _origen():
+    """'plantilla.html:línea' y 'archivo.py:línea' más cercanos a la consulta en curso"""
+    raiz = str(settings.BASE_DIR)
+    plantilla = codigo = None
+    frame = sys._getframe(2)
+    while frame is not None and not (plantilla and codigo):
+        archivo = frame.f_code.co_filename
+        if plantilla is None and frame.f_code.co_name == 'render_annotated':
+            nodo = frame.f_locals.get('self')
+            if getattr(nodo, 'token', None) is not None and getattr(nodo, 'origin', None) is not None:
+                plantilla = f"{nodo.origin.template_name or nodo.origin.name}:{nodo.token.lineno}"
+        elif (
+            codigo is None and archivo.startswith(raiz) and archivo != __file__ and 'site-packages' not in archivo
+            and not envolturas.es_envoltura(frame.f_code)
+        ):
+            codigo = f"{Path(archivo).relative_to(raiz)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return ', '.join(filter(None, (plantilla, codigo))) or "sin origen en el proyecto"
+
+
+def _registrar(execute, sql, params, many, context):
+    consultas = _registro.get()
+    if consultas is not None and not any(tabla in sql for tabla in _tablas_ignoradas()):
+        consultas.append((sql, _origen()))
+    return execute(sql, params, many, context)
+
+
+def _tablas_ignoradas():
+    """La caché en base de datos repite sus consultas por diseño (una por clave)"""
+    return [
+        cache['LOCATION'] for cache in settings.CACHES.values()
+        if cache['BACKEND'].endswith('DatabaseCache') and cache.get('LOCATION')
+    ]
+
+
+envolturas.registrar(_registrar, activa=lambda: settings.QUERY_GUARD != 'off')
+
+
+def informe(consultas, maximo=None):
+    """Texto con los problemas de ``consultas`` [(sql, origen)], o None si no hay"""
+    problemas = []
+    if maximo is not None and len(consultas) > maximo:
+        problemas.append(f"{len(consultas)} consultas, el presupuesto es {maximo}")
+
+    repeticiones = Counter(sql for sql, _ in consultas)
+    for sql, veces in repeticiones.most_common():
+        if veces < settings.QUERY_GUARD_REPEATS:
+            break
+        origenes = Counter(origen for s, origen in consultas if s == sql)
+        donde = '; '.join(f"{origen} x{n}" if n > 1 else origen for origen, n in origenes.most_common())
+        problemas.append(f"posible N+1, {veces} veces: {sql[:200]}\n    desde {donde}")
+    return '\n  '.join(problemas) or None
+
+
+def _reportar(nombre, texto):
+    mensaje = f"{nombre}:\n  {texto}"
+    if settings.QUERY_GUARD == 'raise':
+        raise ConsultasExcesivas(mensaje)
+    logger.warning(mensaje)
+
+
+class VigilanciaConsultasMiddleware:
+    """Registra las consultas de cada petición e informa N+1 y presupuestos excedidos"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.QUERY_GUARD == 'off':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        envolturas.instalar_en_abiertas()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        consultas = []
+        token = _registro.set(consultas)
+        try:
+            response = self.get_response(request)
+        finally:
+            _registro.reset(token)
+        self.revisar(request, consultas)
+        return response
+
+    async def __acall__(self, request):
+        # Igual que en metricas: los hilos de sync_to_async ven la misma lista
+        consultas = []
+        token = _registro.set(consultas)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _registro.reset(token)
+        self.revisar(request, consultas)
+        return response
+
+    def revisar(self, request, consultas):
+        if settings.QUERY_GUARD == 'off':
+            return
+        coincidencia = getattr(request, 'resolver_match', None)
+        maximo = settings.QUERY_BUDGET_DEFAULT
+        if coincidencia is not None:
+            maximo = getattr(coincidencia.func, 'presupuesto_consultas', maximo)
+        texto = informe(consultas, maximo)
+        if texto:
+            nombre = coincidencia.view_name if coincidencia else request.path
+            _reportar(f"{request.method} {nombre}", texto)
+
+
+class VigilanciaConsultasMixin:
+    """Para TestCase: las vistas que repiten consultas o exceden su presupuesto hacen fallar el test"""
+
+    def setUp(self):
+        super().setUp()
+        vigilancia = override_settings(QUERY_GUARD='raise')
+        vigilancia.enable()
+        self.addCleanup(vigilancia.disable)
+
+    @contextmanager
+    def assertConsultasVigiladas(self, maximo=None):
+        """Falla si el bloque repite una consulta (N+1) o hace más de ``maximo`` consultas"""
+        for connection in connections.all():
+            envolturas.instalar(connection)
+        consultas = []
+        token = _registro.set(consultas)
+        try:
+            yield consultas
+        finally:
+            _registro.reset(token)
+        texto = informe(consultas, maximo)
+        if texto:
+            self.fail(texto)
+
+
+class VigilanciaTestRunner(DiscoverRunner):
+    """Corre los tests con QUERY_GUARD = 'raise', sin importar DEBUG ni el entorno"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._vigilancia = override_settings(QUERY_GUARD='raise')
+        self._vigilancia.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._vigilancia.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,53 @@
+"""
+Envolturas de ejecución (execute_wrappers) del proyecto.
+
+metricas, consultas y perfilado miden cada consulta con un execute_wrapper.
+Cada módulo registra el suyo con ``registrar`` junto con una función que
+dice si su función está activa (QUERY_GUARD, PROFILING_ENABLED...). En cada
+conexión se instala una sola envoltura, al abrirse (connection_created) y en
+las que ya estaban abiertas al cargar los middlewares, que en cada consulta
+llama solo a las activas, en el orden en que se registraron.
+"""
+
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_envolturas = []
+
+
+def registrar(envoltura, activa=None):
+    """Agrega ``envoltura``; ``activa()`` se evalúa en cada consulta (None: siempre)"""
+    if all(e is not envoltura for e, _ in _envolturas):
+        _envolturas.append((envoltura, activa))
+
+
+def activas():
+    return [envoltura for envoltura, activa in _envolturas if activa is None or activa()]
+
+
+def ejecutar(execute, sql, params, many, context):
+    """La envoltura instalada en cada conexión: encadena las activas"""
+    for envoltura in reversed(activas()):
+        execute = partial(envoltura, execute)
+    return execute(sql, params, many, context)
+
+
+def es_envoltura(codigo):
+    """Si ``codigo`` es el de una envoltura; para no tomarla como origen de una consulta"""
+    return codigo is ejecutar.__code__ or any(codigo is e.__code__ for e, _ in _envolturas)
+
+
+def instalar(connection, **kwargs):
+    if ejecutar not in connection.execute_wrappers:
+        connection.execute_wrappers.append(ejecutar)
+
+
+def instalar_en_abiertas():
+    """Para las conexiones abiertas antes de cargar los middlewares"""
+    for connection in connections.all(initialized_only=True):
+        instalar(connection)
+
+
+connection_created.connect(instalar)
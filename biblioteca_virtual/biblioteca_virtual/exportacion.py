@@ -0,0 +1,140 @@
+"""
+Exportación completa de libros, usuarios y préstamos en CSV o NDJSON.
+
+Las filas se leen con ``values_list().iterator()`` por bloques (en PostgreSQL
+con un cursor del lado del servidor) y se serializan a medida que se envían,
+así la memoria no crece con la cantidad de filas. Si la base tiene
+DISABLE_SERVER_SIDE_CURSORS (pooler en modo transacción) se piden rangos de
+id de a un bloque, porque iterator() traería todo el resultado de una vez. La primera línea sale antes
+de ejecutar la consulta. Con ``gzip`` la salida se comprime al vuelo.
+"""
+
+import csv
+import json
+import zlib
+
+from django.apps import apps
+from django.db import connections, router
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# nombre -> (modelo, columnas); las columnas con '__' vienen de un JOIN
+EXPORTACIONES = {
+    'libros': ('libros.Libro', ('id', 'titulo', 'autor', 'fecha_publicacion', 'en_prestamo')),
+    'usuarios': ('usuarios.Usuario', ('id', 'nombre', 'correo', 'edad', 'fecha_registro', 'activo')),
+    'prestamos': ('prestamos.Prestamo', (
+        'id', 'fecha_prestamo', 'fecha_devolucion',
+        'usuario_id', 'usuario__nombre', 'usuario__correo',
+        'libro_id', 'libro__titulo', 'libro__autor',
+    )),
+    'prestamos_archivados': ('prestamos.PrestamoArchivado', (
+        'id', 'fecha_prestamo', 'fecha_devolucion',
+        'usuario_id', 'usuario__nombre', 'usuario__correo',
+        'libro_id', 'libro__titulo', 'libro__autor',
+    )),
+}
+
+FILAS_POR_BLOQUE = 2000
+
+
+class _Linea:
+    """Destino de csv.writer que devuelve la línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def encabezados(nombre):
+    return [columna.replace('__', '_') for columna in EXPORTACIONES[nombre][1]]
+
+
+def filas(nombre, using=None, bloque=FILAS_POR_BLOQUE):
+    modelo, columnas = EXPORTACIONES[nombre]
+    queryset = apps.get_model(modelo).objects.using(using).values_list(*columnas).order_by('id')
+    if connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        return _por_rangos(queryset, bloque)
+    return queryset.iterator(chunk_size=bloque)
+
+
+def _por_rangos(queryset, bloque):
+    # La primera columna de cada exportación es el id
+    ultimo = None
+    while True:
+        parte = list((queryset if ultimo is None else queryset.filter(id__gt=ultimo))[:bloque])
+        yield from parte
+        if len(parte) < bloque:
+            return
+        ultimo = parte[-1][0]
+
+
+def serializar(nombre, formato, using=None, bloque=FILAS_POR_BLOQUE):
+    """
+    Texto de la exportación en trozos de hasta ``bloque`` filas. En CSV el
+    encabezado se produce antes de ejecutar la consulta.
+    """
+    columnas = encabezados(nombre)
+    if formato == 'csv':
+        escritor = csv.writer(_Linea())
+        yield escritor.writerow(columnas)
+        convertir = escritor.writerow
+    else:
+        codificador = DjangoJSONEncoder(ensure_ascii=False)
+
+        def convertir(fila):
+            return codificador.encode(dict(zip(columnas, fila))) + '\n'
+
+    trozo = []
+    for fila in filas(nombre, using, bloque):
+        trozo.append(convertir(fila))
+        if len(trozo) >= bloque:
+            yield ''.join(trozo)
+            trozo = []
+    if trozo:
+        yield ''.join(trozo)
+
+
+def codificar(trozos, comprimir=False):
+    """Convierte los trozos a bytes, comprimidos en gzip si se pide"""
+    if not comprimir:
+        for trozo in trozos:
+            if trozo:
+                yield trozo.encode()
+        return
+
+    compresor = zlib.compressobj(wbits=31)
+    for i, trozo in enumerate(trozos):
+        datos = compresor.compress(trozo.encode())
+        # El primer trozo se vacía enseguida para no retrasar el primer byte
+        if i == 0:
+            datos += compresor.flush(zlib.Z_SYNC_FLUSH)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def nombre_archivo(nombre, formato, comprimir=False):
+    return f"{nombre}.{formato}{'.gz' if comprimir else ''}"
+
+
+def respuesta(request, nombre):
+    """
+    StreamingHttpResponse con la exportación ``nombre``. Parámetros GET:
+    ``formato`` (csv o ndjson, csv por defecto) y ``gzip`` (1 para comprimir).
+    """
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return JsonResponse({'error': f"Formato no soportado; use {' o '.join(FORMATOS)}."}, status=400)
+    comprimir = request.GET.get('gzip') in ('1', 'true')
+
+    # La base se elige ahora: las filas se leen después de que la vista termina
+    using = router.db_for_read(apps.get_model(EXPORTACIONES[nombre][0]))
+    contenido = codificar(serializar(nombre, formato, using), comprimir)
+    tipo = 'application/gzip' if comprimir else FORMATOS[formato]
+    response = StreamingHttpResponse(contenido, content_type=tipo)
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo(nombre, formato, comprimir)}"'
+    return response
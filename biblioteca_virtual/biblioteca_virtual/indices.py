@@ -0,0 +1,43 @@
+"""
+Índices que dependen del motor y se declaran igual en Meta.indexes.
+
+``IndicePrefijo`` sirve a la búsqueda por prefijo del autocompletado
+(``campo__istartswith``). La expresión indexada tiene que coincidir con la
+que arma el lookup en cada motor:
+
+- PostgreSQL compara UPPER(columna::text) LIKE UPPER('q%'); con
+  text_pattern_ops el índice recorre solo el rango del prefijo.
+- SQLite aplica la optimización de LIKE solo a índices con COLLATE NOCASE.
+- En el resto es un índice común sobre la columna.
+
+Al estar en el estado del modelo, Django lo vuelve a crear cuando SQLite
+reconstruye la tabla (AddField, AlterField...). Un índice creado con SQL
+propio en una migración se pierde en esa reconstrucción.
+"""
+
+from django.db import models
+from django.db.models.functions import Cast, Collate, Upper
+
+
+class IndicePrefijo(models.Index):
+    """Index(fields=[campo], name=..., condition=...) con la expresión de cada motor"""
+
+    def __init__(self, *, fields, name, condition=None):
+        if len(fields) != 1:
+            raise ValueError("IndicePrefijo indexa un solo campo.")
+        super().__init__(fields=fields, name=name, condition=condition)
+
+    def expresion(self, vendor):
+        campo = models.F(self.fields[0])
+        if vendor == 'postgresql':
+            from django.contrib.postgres.indexes import OpClass
+            return OpClass(Upper(Cast(campo, models.TextField())), name='text_pattern_ops')
+        if vendor == 'sqlite':
+            return Collate(campo, 'NOCASE')
+        return campo
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        indice = models.Index(
+            self.expresion(schema_editor.connection.vendor), name=self.name, condition=self.condition,
+        )
+        return indice.create_sql(model, schema_editor, using=using, **kwargs)
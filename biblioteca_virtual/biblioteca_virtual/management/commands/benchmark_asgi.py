@@ -0,0 +1,115 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+  help = (
+    "Prueba de carga con muchos clientes lentos concurrentes: cada cliente tarda "
+    "--latencia segundos en recibir la respuesta. Compara la aplicación ASGI (un "
+    "solo proceso, --clientes conexiones a la vez) con el manejador WSGI y un "
+    "número fijo de hilos, como un servidor con --hilos workers. Las vistas de "
+    "lectura son async si ASYNC_VIEWS está activo."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--peticiones', type=int, default=1000)
+    parser.add_argument('--clientes', type=int, default=100, help="Clientes concurrentes (por defecto 100)")
+    parser.add_argument('--hilos', type=int, default=8, help="Hilos del modo WSGI (por defecto 8)")
+    parser.add_argument('--latencia', type=float, default=0.05, help="Segundos que cada cliente tarda en leer la respuesta")
+    parser.add_argument('--url', help="Ruta a pedir (por defecto el listado de libros)")
+
+  def handle(self, *args, **options):
+    if min(options['peticiones'], options['clientes'], options['hilos']) < 1 or options['latencia'] < 0:
+      raise CommandError("--peticiones, --clientes y --hilos deben ser mayores que cero")
+
+    url = options['url'] or reverse('libros:libros')
+    self.stdout.write(
+      f"{options['peticiones']} peticiones a {url}, {options['latencia'] * 1000:.0f} ms por cliente, "
+      f"vistas {'async' if settings.ASYNC_VIEWS else 'sync'}"
+    )
+
+    duracion = asyncio.run(self.cargar_asgi(url, options))
+    self.informe(f"ASGI, {options['clientes']} clientes", options['peticiones'], duracion)
+
+    duracion = self.cargar_wsgi(url, options)
+    self.informe(f"WSGI, {options['hilos']} hilos", options['peticiones'], duracion)
+
+  def informe(self, nombre, peticiones, duracion):
+    self.stdout.write(f"{nombre}: {peticiones / duracion:.0f} peticiones/s ({duracion:.2f} s)")
+
+  async def cargar_asgi(self, url, options):
+    aplicacion = get_asgi_application()
+    partes = urlsplit(url)
+    pendientes = iter(range(options['peticiones']))
+
+    async def pedir():
+      scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': partes.path, 'raw_path': partes.path.encode(), 'query_string': partes.query.encode(),
+        'root_path': '', 'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+      }
+      recibido = False
+
+      async def receive():
+        nonlocal recibido
+        if not recibido:
+          recibido = True
+          return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # El cliente no se desconecta
+        await asyncio.Future()
+
+      estados = []
+
+      async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+          estados.append(mensaje['status'])
+        elif not mensaje.get('more_body'):
+          # El cliente lento recibe la respuesta sin ocupar a nadie más
+          await asyncio.sleep(options['latencia'])
+
+      await aplicacion(scope, receive, send)
+      if estados[0] != 200:
+        raise CommandError(f"{url} respondió {estados[0]}")
+
+    async def cliente():
+      for _ in pendientes:
+        await pedir()
+
+    await pedir()
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(options['clientes'])))
+    return time.perf_counter() - inicio
+
+  def cargar_wsgi(self, url, options):
+    handler = WSGIHandler()
+    partes = urlsplit(url)
+
+    def pedir(_):
+      environ = {'PATH_INFO': partes.path, 'QUERY_STRING': partes.query, 'REQUEST_METHOD': 'GET'}
+      setup_testing_defaults(environ)
+      estados = []
+      respuesta = handler(environ, lambda estado, encabezados: estados.append(estado))
+      try:
+        for _ in respuesta:
+          pass
+        # El worker queda ocupado mientras el cliente lento recibe
+        time.sleep(options['latencia'])
+      finally:
+        respuesta.close()
+      if not estados[0].startswith('200'):
+        raise CommandError(f"{url} respondió {estados[0]}")
+
+    pedir(None)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(options['hilos']) as hilos:
+      list(hilos.map(pedir, range(options['peticiones'])))
+    return time.perf_counter() - inicio
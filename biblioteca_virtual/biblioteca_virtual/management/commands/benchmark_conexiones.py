@@ -0,0 +1,73 @@
+import time
+from wsgiref.util import setup_testing_defaults
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+from libros.models import Libro
+
+
+class Command(BaseCommand):
+  help = (
+    "Mide peticiones por segundo abriendo una conexión a PostgreSQL por petición "
+    "y reutilizándola (CONN_MAX_AGE). Las peticiones pasan por el manejador WSGI, "
+    "así que la conexión se cierra o se conserva igual que en el servidor."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--peticiones', type=int, default=500)
+    parser.add_argument('--max-age', type=int, default=60, help="CONN_MAX_AGE del modo persistente (por defecto 60)")
+    parser.add_argument('--url', help="Ruta a pedir (por defecto la edición del primer libro)")
+
+  def handle(self, *args, **options):
+    conexion = connections[DEFAULT_DB_ALIAS]
+    if conexion.vendor != 'postgresql':
+      raise CommandError(f"El benchmark necesita PostgreSQL; la base default es {conexion.vendor}.")
+    if options['peticiones'] < 1:
+      raise CommandError("--peticiones debe ser mayor que cero")
+
+    url = options['url'] or self.url_por_defecto()
+    handler = WSGIHandler()
+    original = conexion.settings_dict['CONN_MAX_AGE']
+    self.stdout.write(
+      f"{options['peticiones']} peticiones a {url} "
+      f"(CONN_HEALTH_CHECKS={conexion.settings_dict['CONN_HEALTH_CHECKS']})"
+    )
+
+    try:
+      for nombre, max_age in (('una conexión por petición', 0), (f"CONN_MAX_AGE={options['max_age']}", options['max_age'])):
+        # close_at se calcula al conectar: se cierra para que tome el valor nuevo
+        conexion.close()
+        conexion.settings_dict['CONN_MAX_AGE'] = max_age
+        self.pedir(handler, url)
+        inicio = time.perf_counter()
+        for _ in range(options['peticiones']):
+          self.pedir(handler, url)
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(
+          f"{nombre}: {options['peticiones'] / duracion:.0f} peticiones/s "
+          f"({duracion / options['peticiones'] * 1000:.2f} ms por petición)"
+        )
+    finally:
+      conexion.close()
+      conexion.settings_dict['CONN_MAX_AGE'] = original
+
+  def url_por_defecto(self):
+    libro_id = Libro.objects.values_list('id', flat=True).first()
+    if libro_id is None:
+      raise CommandError("No hay libros; cargue datos o indique --url")
+    return reverse('libros:editar_libro', args=[libro_id])
+
+  def pedir(self, handler, url):
+    environ = {'PATH_INFO': url, 'REQUEST_METHOD': 'GET'}
+    setup_testing_defaults(environ)
+    estados = []
+    respuesta = handler(environ, lambda estado, encabezados: estados.append(estado))
+    try:
+      for _ in respuesta:
+        pass
+    finally:
+      # Dispara request_finished: ahí Django cierra o conserva la conexión
+      respuesta.close()
+    if not estados[0].startswith('200'):
+      raise CommandError(f"{url} respondió {estados[0]}")
@@ -0,0 +1,85 @@
+import statistics
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+from django.utils import timezone
+from biblioteca_virtual.paginacion import Pagina
+from libros.models import Libro
+from usuarios.models import Usuario
+from prestamos.forms import PrestamoFiltroForm
+from prestamos.models import Prestamo
+
+# Ids lejos de los reales para no pisar fragmentos de filas existentes
+ID_BASE = 10 ** 12
+
+
+class Command(BaseCommand):
+  help = (
+    "Compara el tiempo de render de los listados completos contra el render "
+    "con filas en caché después de editar un solo objeto. No toca la base de datos."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--filas', type=int, default=1000, help="Filas por listado (por defecto 1000)")
+    parser.add_argument('--repeticiones', type=int, default=5)
+
+  def handle(self, *args, **options):
+    if options['filas'] < 1 or options['repeticiones'] < 1:
+      raise CommandError("--filas y --repeticiones deben ser mayores que cero")
+
+    ahora = timezone.now()
+    usuarios, libros, prestamos = self.objetos(options['filas'], ahora)
+    listados = (
+      ('users.html', usuarios, lambda objetos: {'users': objetos}),
+      ('listar_libros.html', libros, lambda objetos: {'libros': objetos, 'pagina': Pagina(objetos), 'orden': 'id'}),
+      ('listar_prestamos.html', prestamos, lambda objetos: {
+        'prestamos': objetos, 'pagina': Pagina(objetos), 'filtro': PrestamoFiltroForm(),
+        # Sin petición no hay token; este valor hace que {% csrf_token %} no emita nada
+        'csrf_token': 'NOTPROVIDED',
+      }),
+    )
+
+    for plantilla, objetos, contexto in listados:
+      with override_settings(LIST_ROW_CACHE_TIMEOUT=0):
+        completo = self.medir(plantilla, contexto(objetos), options['repeticiones'])
+
+      render_to_string(plantilla, contexto(objetos))
+      tiempos = []
+      for i in range(options['repeticiones']):
+        # Cada vuelta edita un objeto distinto: solo esa fila se vuelve a renderizar
+        objetos[i % len(objetos)].updated_at += timedelta(microseconds=1)
+        tiempos.extend(self.medir(plantilla, contexto(objetos), 1))
+
+      self.stdout.write(
+        f"{plantilla} ({len(objetos)} filas): completo {statistics.median(completo):.1f} ms, "
+        f"con filas en caché {statistics.median(tiempos):.1f} ms "
+        f"({statistics.median(completo) / statistics.median(tiempos):.1f}x)"
+      )
+
+  def objetos(self, cantidad, ahora):
+    usuarios = [
+      Usuario(id=ID_BASE + i, nombre=f"Usuario {i}", correo=f"usuario{i}@ejemplo.com", edad=20 + i % 60,
+              fecha_registro=ahora, activo=True, updated_at=ahora)
+      for i in range(cantidad)
+    ]
+    libros = [
+      Libro(id=ID_BASE + i, titulo=f"Libro {i}", autor=f"Autor {i % 97}", fecha_publicacion=date(2000, 1, 1),
+            en_prestamo=i % 2 == 0, updated_at=ahora)
+      for i in range(cantidad)
+    ]
+    prestamos = [
+      Prestamo(id=ID_BASE + i, usuario=usuarios[i], libro=libros[i], fecha_prestamo=ahora,
+               fecha_devolucion=None if i % 2 == 0 else ahora, updated_at=ahora)
+      for i in range(cantidad)
+    ]
+    return usuarios, libros, prestamos
+
+  def medir(self, plantilla, contexto, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+      inicio = time.perf_counter()
+      render_to_string(plantilla, contexto)
+      tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
@@ -0,0 +1,322 @@
+import importlib
+import json
+import math
+import time
+import tracemalloc
+from datetime import timedelta
+from contextlib import ExitStack, contextmanager, nullcontext
+from typing import Callable, NamedTuple, Optional, Union
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from libros.models import Libro
+from usuarios.models import Usuario
+from prestamos.models import Prestamo
+
+APPS = ('libros', 'usuarios', 'prestamos')
+
+
+class Escenario(NamedTuple):
+  nombre: str
+  url: str
+  # Argumentos de la URL, o una función que los crea (dentro de la transacción que se deshace)
+  args: Union[list, Callable[[], list]] = []
+  metodo: str = 'GET'
+  datos: Optional[dict] = None
+  json: bool = False
+  # Las escrituras se miden dentro de una transacción que se deshace
+  escribe: bool = False
+
+
+def escenarios(muestra):
+  """Una petición representativa por URL (y por método cuando la vista acepta POST)"""
+  libro, usuario = muestra['libro'], muestra['usuario']
+  disponibles, abiertos = muestra['disponibles'], muestra['abiertos']
+  palabra = muestra['palabra']
+  datos_libro = {'titulo': "Libro de prueba", 'autor': "Autor de prueba", 'fecha_publicacion': '2020-01-01'}
+  datos_usuario = {'nombre': "Usuario de prueba", 'correo': "benchmark@ejemplo.com", 'edad': 30, 'activo': 'on'}
+
+  # Un mes de hace tres años: con el historial archivado, también lee el archivo
+  hace_tres_anios = timezone.localdate() - timedelta(days=3 * 365)
+  rango = {'desde': hace_tres_anios.isoformat(), 'hasta': (hace_tres_anios + timedelta(days=30)).isoformat()}
+
+  def libro_nuevo():
+    return [Libro.objects.create(**datos_libro).id]
+
+  def usuario_nuevo():
+    return [Usuario.objects.create(nombre="Baja", correo="baja@ejemplo.com", edad=30).id]
+
+  return [
+    Escenario('libros', 'libros:libros'),
+    Escenario('crear_libro', 'libros:crear_libro'),
+    Escenario('crear_libro POST', 'libros:crear_libro', metodo='POST', datos=datos_libro, escribe=True),
+    Escenario('buscar_libros', 'libros:buscar_libros', datos={'q': palabra}),
+    Escenario('autocompletar_libros', 'libros:autocompletar_libros', datos={'q': palabra[:3]}),
+    Escenario('exportar_libros', 'libros:exportar_libros'),
+    Escenario('editar_libro', 'libros:editar_libro', [libro]),
+    Escenario('editar_libro POST', 'libros:editar_libro', [libro], 'POST', datos_libro, escribe=True),
+    Escenario('eliminar_libro', 'libros:eliminar_libro', libro_nuevo, escribe=True),
+    Escenario('usuarios', 'usuarios:usuarios'),
+    Escenario('crear_usuario', 'usuarios:crear_usuario'),
+    Escenario('crear_usuario POST', 'usuarios:crear_usuario', metodo='POST', datos=datos_usuario, escribe=True),
+    Escenario('autocompletar_usuarios', 'usuarios:autocompletar_usuarios', datos={'q': muestra['nombre'][:3]}),
+    Escenario('exportar_usuarios', 'usuarios:exportar_usuarios'),
+    Escenario('editar_usuario', 'usuarios:editar_usuario', [usuario]),
+    Escenario('editar_usuario POST', 'usuarios:editar_usuario', [usuario], 'POST', datos_usuario, escribe=True),
+    Escenario('eliminar_usuario', 'usuarios:eliminar_usuario', usuario_nuevo, escribe=True),
+    Escenario('prestamos', 'prestamos:prestamos'),
+    Escenario('prestamos por fecha', 'prestamos:prestamos', datos=rango),
+    Escenario('prestamos vencidos', 'prestamos:prestamos', datos={'estado': 'vencidos'}),
+    Escenario('crear_prestamo', 'prestamos:crear_prestamo'),
+    Escenario('crear_prestamo POST', 'prestamos:crear_prestamo', metodo='POST',
+              datos={'usuario': usuario, 'libro': disponibles[0]}, escribe=True),
+    Escenario('realizar_devolucion', 'prestamos:realizar_devolucion', [abiertos[0]], 'POST', escribe=True),
+    Escenario('crear_prestamos_lote', 'prestamos:crear_prestamos_lote', metodo='POST',
+              datos={'usuario': usuario, 'libros': disponibles}, json=True, escribe=True),
+    Escenario('realizar_devoluciones_lote', 'prestamos:realizar_devoluciones_lote', metodo='POST',
+              datos={'prestamos': abiertos}, json=True, escribe=True),
+    Escenario('exportar_prestamos', 'prestamos:exportar_prestamos'),
+  ]
+
+
+def urls_sin_escenario(nombres):
+  """Nombres de las URLs de APPS que ningún escenario recorre"""
+  todas = set()
+  for app in APPS:
+    modulo = importlib.import_module(f"{app}.urls")
+    todas.update(f"{modulo.app_name}:{patron.name}" for patron in modulo.urlpatterns)
+  return sorted(todas - set(nombres))
+
+
+def percentil(valores, p):
+  """Percentil por rango más cercano"""
+  ordenados = sorted(valores)
+  return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+@contextmanager
+def pico_de_memoria():
+  """
+  Mide con tracemalloc el pico de memoria que Python asigna dentro del
+  bloque, por encima de lo que ya estaba asignado; el resultado (MB) queda
+  en la lista que devuelve. No incluye la memoria de bibliotecas en C (el
+  driver de la base), pero a diferencia de ru_maxrss es de ese bloque y no
+  el máximo de todo el proceso hasta ahora.
+  """
+  resultado = []
+  activo = tracemalloc.is_tracing()
+  if activo:
+    tracemalloc.reset_peak()
+  else:
+    tracemalloc.start()
+  antes = tracemalloc.get_traced_memory()[0]
+  try:
+    yield resultado
+  finally:
+    pico = tracemalloc.get_traced_memory()[1]
+    if not activo:
+      tracemalloc.stop()
+    resultado.append(round((pico - antes) / (1024 * 1024), 2))
+
+
+class Command(BaseCommand):
+  help = (
+    "Mide cada URL de libros, usuarios y préstamos sobre los datos actuales (ver "
+    "generar_datos): latencia p50/p95, consultas y pico de memoria de una petición "
+    "(tracemalloc, en una petición aparte para no afectar la latencia). Por "
+    "defecto usa el cliente de pruebas en el mismo proceso y las escrituras se "
+    "deshacen; con --servidor pide las vistas de lectura a un servidor en marcha. "
+    "Con --guardar escribe una línea base en JSON y con --comparar la compara."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--calentamiento', type=int, default=2, help="Peticiones previas que no se miden (por defecto 2)")
+    parser.add_argument('--vista', action='append', help="Mide solo los escenarios con este nombre (se puede repetir)")
+    parser.add_argument('--excluir', action='append', default=[], help="Omite los escenarios con este nombre (se puede repetir)")
+    parser.add_argument('--sin-cache', action='store_true', help="Desactiva la caché de listados")
+    parser.add_argument('--servidor', help="URL base de un servidor en marcha, por ejemplo http://localhost:8000")
+    parser.add_argument('--guardar', help="Archivo JSON donde guardar los resultados como línea base")
+    parser.add_argument('--comparar', help="Línea base JSON con la que comparar")
+    parser.add_argument('--umbral', type=float, help="Termina con error si un p95 supera la línea base por este factor o si aumentan las consultas")
+
+  def handle(self, *args, **options):
+    if options['repeticiones'] < 1 or options['calentamiento'] < 0:
+      raise CommandError("--repeticiones debe ser mayor que cero")
+    if options['umbral'] and not options['comparar']:
+      raise CommandError("--umbral necesita --comparar")
+
+    base = None
+    if options['comparar']:
+      try:
+        with open(options['comparar'], encoding='utf-8') as f:
+          base = json.load(f)
+      except (OSError, ValueError) as e:
+        raise CommandError(f"No se pudo leer {options['comparar']}: {e}")
+
+    lista = escenarios(self.muestra())
+    for nombre in urls_sin_escenario(e.url for e in lista):
+      self.stderr.write(f"Sin escenario: {nombre}")
+    if options['vista']:
+      lista = [e for e in lista if e.nombre in options['vista']]
+    lista = [e for e in lista if e.nombre not in options['excluir']]
+    if options['servidor']:
+      omitidos = [e.nombre for e in lista if e.escribe]
+      lista = [e for e in lista if not e.escribe]
+      if omitidos:
+        self.stdout.write(f"Contra un servidor solo se miden las lecturas; se omiten: {', '.join(omitidos)}")
+
+    self.stdout.write(
+      f"{Libro.objects.count()} libros, {Usuario.objects.count()} usuarios, {Prestamo.objects.count()} préstamos "
+      f"({connection.vendor}), {options['repeticiones']} repeticiones"
+    )
+    self.stdout.write(f"{'vista':<28} {'p50 ms':>8} {'p95 ms':>8} {'consultas':>9} {'pico MB':>8}")
+
+    resultados = {}
+    with override_settings(LIST_CACHE_TIMEOUT=0) if options['sin_cache'] else nullcontext():
+      for escenario in lista:
+        if options['servidor']:
+          tiempos, consultas = self.medir_servidor(options['servidor'], escenario, options)
+          memoria = None
+        else:
+          cliente = Client()
+          tiempos, consultas = self.medir(cliente, escenario, options)
+          memoria = self.medir_memoria(cliente, escenario)
+        resultados[escenario.nombre] = {
+          'p50_ms': round(percentil(tiempos, 50), 2),
+          'p95_ms': round(percentil(tiempos, 95), 2),
+          'consultas': consultas,
+          'memoria_pico_mb': memoria,
+        }
+        self.informe(escenario.nombre, resultados[escenario.nombre])
+
+    if options['guardar']:
+      with open(options['guardar'], 'w', encoding='utf-8') as f:
+        json.dump({
+          'fecha': timezone.now().isoformat(),
+          'base_de_datos': connection.vendor,
+          'filas': {'libros': Libro.objects.count(), 'usuarios': Usuario.objects.count(), 'prestamos': Prestamo.objects.count()},
+          'vistas': resultados,
+        }, f, indent=2, ensure_ascii=False)
+      self.stdout.write(f"Línea base guardada en {options['guardar']}")
+
+    if base is not None:
+      self.comparar(base['vistas'], resultados, options['umbral'])
+
+  def muestra(self):
+    """Ids y textos reales para los parámetros de los escenarios"""
+    libro = Libro.objects.order_by('id').first()
+    usuario = Usuario.objects.filter(activo=True).order_by('id').first()
+    disponibles = list(Libro.objects.filter(en_prestamo=False).order_by('id').values_list('id', flat=True)[:10])
+    abiertos = list(Prestamo.objects.filter(fecha_devolucion__isnull=True).order_by('id').values_list('id', flat=True)[:10])
+    if not (libro and usuario and disponibles and abiertos):
+      raise CommandError(
+        "Faltan datos: se necesitan libros disponibles, un usuario activo y préstamos abiertos (ver generar_datos)"
+      )
+    return {
+      'libro': libro.id, 'usuario': usuario.id, 'disponibles': disponibles, 'abiertos': abiertos,
+      'palabra': libro.titulo.split()[0].strip(',').lower(), 'nombre': usuario.nombre,
+    }
+
+  def peticion(self, cliente, escenario, args):
+    url = reverse(escenario.url, args=args)
+    if escenario.metodo == 'GET':
+      response = cliente.get(url, escenario.datos)
+    elif escenario.json:
+      response = cliente.post(url, json.dumps(escenario.datos), content_type='application/json')
+    else:
+      response = cliente.post(url, escenario.datos or {})
+    if response.streaming:
+      for _ in response.streaming_content:
+        pass
+    if response.status_code >= 400:
+      raise CommandError(f"{escenario.nombre}: {url} respondió {response.status_code}")
+
+  def medir(self, cliente, escenario, options):
+    """(milisegundos de cada petición, máximo de consultas de una petición)"""
+    tiempos, maximo = [], 0
+    for i in range(options['calentamiento'] + options['repeticiones']):
+      consultas = [0]
+
+      def contar(execute, sql, params, many, context):
+        consultas[0] += 1
+        return execute(sql, params, many, context)
+
+      with transaction.atomic() if escenario.escribe else nullcontext():
+        args = escenario.args() if callable(escenario.args) else escenario.args
+        with ExitStack() as pila:
+          for alias in connections:
+            pila.enter_context(connections[alias].execute_wrapper(contar))
+          inicio = time.perf_counter()
+          self.peticion(cliente, escenario, args)
+          duracion = (time.perf_counter() - inicio) * 1000
+        if escenario.escribe:
+          transaction.set_rollback(True)
+      if i >= options['calentamiento']:
+        tiempos.append(duracion)
+        maximo = max(maximo, consultas[0])
+    return tiempos, maximo
+
+  def medir_memoria(self, cliente, escenario):
+    """Pico de memoria de Python (MB) de una petición más, ya con la vista en caliente"""
+    with transaction.atomic() if escenario.escribe else nullcontext():
+      args = escenario.args() if callable(escenario.args) else escenario.args
+      with pico_de_memoria() as pico:
+        self.peticion(cliente, escenario, args)
+      if escenario.escribe:
+        transaction.set_rollback(True)
+    return pico[0]
+
+  def medir_servidor(self, servidor, escenario, options):
+    url = servidor.rstrip('/') + reverse(escenario.url, args=escenario.args)
+    if escenario.datos:
+      url += '?' + urlencode(escenario.datos)
+    tiempos = []
+    for i in range(options['calentamiento'] + options['repeticiones']):
+      inicio = time.perf_counter()
+      try:
+        with urlopen(url) as response:
+          response.read()
+      except HTTPError as e:
+        raise CommandError(f"{escenario.nombre}: {url} respondió {e.code}")
+      except OSError as e:
+        raise CommandError(f"No se pudo conectar con {servidor}: {e}")
+      if i >= options['calentamiento']:
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    # Las consultas se ven en /metrics del servidor
+    return tiempos, None
+
+  def informe(self, nombre, resultado):
+    consultas = '-' if resultado['consultas'] is None else resultado['consultas']
+    memoria = '-' if resultado['memoria_pico_mb'] is None else resultado['memoria_pico_mb']
+    self.stdout.write(f"{nombre:<28} {resultado['p50_ms']:>8} {resultado['p95_ms']:>8} {consultas:>9} {memoria:>8}")
+
+  def comparar(self, base, resultados, umbral):
+    self.stdout.write(self.style.MIGRATE_HEADING("Comparación con la línea base"))
+    peores = []
+    for nombre, actual in resultados.items():
+      anterior = base.get(nombre)
+      if anterior is None:
+        self.stdout.write(f"{nombre:<28} sin línea base")
+        continue
+      factor = actual['p95_ms'] / anterior['p95_ms'] if anterior['p95_ms'] else 1
+      consultas = ''
+      if actual['consultas'] is not None and anterior['consultas'] is not None:
+        consultas = f", consultas {anterior['consultas']} -> {actual['consultas']}"
+      linea = f"{nombre:<28} p50 {anterior['p50_ms']} -> {actual['p50_ms']} ms, p95 {anterior['p95_ms']} -> {actual['p95_ms']} ms ({factor:.2f}x){consultas}"
+      empeoro = umbral and (
+        factor > umbral or (consultas and actual['consultas'] > anterior['consultas'])
+      )
+      if empeoro:
+        peores.append(nombre)
+        self.stdout.write(self.style.WARNING(linea))
+      else:
+        self.stdout.write(linea)
+    if peores:
+      raise CommandError(f"Vistas que empeoraron respecto de la línea base: {', '.join(peores)}")
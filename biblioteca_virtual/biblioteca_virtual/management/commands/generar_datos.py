@@ -0,0 +1,171 @@
+import itertools
+import random
+import time
+import unicodedata
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from biblioteca_virtual import cache_listados
+from libros import busqueda
+from libros.models import Libro
+from usuarios.models import Usuario
+from prestamos.models import Prestamo, PrestamoArchivado
+from prestamos.services import vencimiento
+
+NOMBRES = (
+  "Ana", "Luis", "María", "Carlos", "Lucía", "Jorge", "Sofía", "Diego", "Valentina", "Mateo",
+  "Camila", "Javier", "Paula", "Andrés", "Elena", "Tomás", "Julia", "Martín", "Laura", "Pablo",
+)
+APELLIDOS = (
+  "García", "Rodríguez", "López", "Martínez", "González", "Pérez", "Sánchez", "Romero", "Torres", "Díaz",
+  "Álvarez", "Ruiz", "Vargas", "Castro", "Morales", "Ortiz", "Silva", "Rojas", "Medina", "Herrera",
+)
+PALABRAS = (
+  "sombra", "río", "ciudad", "memoria", "noche", "jardín", "viento", "casa", "tiempo", "mar",
+  "silencio", "fuego", "camino", "luz", "historia", "piedra", "espejo", "invierno", "laberinto", "amor",
+  "guerra", "isla", "sueño", "montaña", "carta", "otoño", "ventana", "puerto", "desierto", "biblioteca",
+)
+TITULOS = ("{a} y {b}", "{a} de {b}", "Crónica de {b}", "Los días de {b}", "{a}, {b} y {c}", "{a}")
+
+
+def _popularidad(cantidad):
+  """Pesos acumulados tipo Zipf: pocos elementos muy frecuentes y una cola larga"""
+  return list(itertools.accumulate(1 / (i + 1) for i in range(cantidad)))
+
+
+def _sin_acentos(texto):
+  return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+
+
+class Command(BaseCommand):
+  help = (
+    "Genera datos sintéticos reproducibles (misma --semilla, mismos datos) para medir "
+    "las vistas a escala: libros con autores de popularidad desigual, usuarios y un "
+    "historial de préstamos ordenado por fecha con una parte abierta. Inserta por "
+    "lotes con bulk_create y necesita las tablas vacías."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--libros', type=int, default=100_000)
+    parser.add_argument('--usuarios', type=int, default=50_000)
+    parser.add_argument('--prestamos', type=int, default=5_000_000)
+    parser.add_argument('--abiertos', type=float, default=0.05, help="Fracción de libros con un préstamo abierto (por defecto 0.05)")
+    parser.add_argument('--anios', type=int, default=5, help="Años de historial de préstamos (por defecto 5)")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--lote', type=int, default=5000, help="Filas por lote de inserción (por defecto 5000)")
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    if min(options['libros'], options['usuarios'], options['lote'], options['anios']) < 1 or options['prestamos'] < 0:
+      raise CommandError("--libros, --usuarios, --lote y --anios deben ser mayores que cero")
+    if not 0 <= options['abiertos'] <= 1:
+      raise CommandError("--abiertos debe estar entre 0 y 1")
+
+    self.using = options['database']
+    self.lote = options['lote']
+    self.verbosity = options['verbosity']
+    if any(modelo.objects.using(self.using).exists() for modelo in (Libro, Usuario, Prestamo, PrestamoArchivado)):
+      raise CommandError("La base ya tiene libros, usuarios o préstamos: generar_datos necesita tablas vacías")
+
+    rng = random.Random(options['semilla'])
+    ahora = timezone.now()
+    inicio = time.monotonic()
+
+    libros = self.generar_libros(rng, options['libros'])
+    usuarios = self.generar_usuarios(rng, options['usuarios'])
+    prestamos = self.generar_prestamos(rng, libros, usuarios, options, ahora)
+    cache_listados.invalidar(Libro, Usuario, Prestamo)
+
+    self.stdout.write(self.style.SUCCESS(
+      f"{len(libros)} libros, {len(usuarios)} usuarios y {prestamos} préstamos generados "
+      f"en {time.monotonic() - inicio:.1f}s"
+    ))
+
+  def insertar(self, modelo, objetos, despues=None):
+    """Inserta ``objetos`` (un iterable) por lotes, cada uno en su transacción"""
+    total = 0
+    objetos = iter(objetos)
+    while lote := list(itertools.islice(objetos, self.lote)):
+      with transaction.atomic(using=self.using):
+        modelo.objects.using(self.using).bulk_create(lote)
+        if despues:
+          despues()
+      total += len(lote)
+      if self.verbosity > 1:
+        self.stdout.write(f"  {total} {modelo._meta.verbose_name_plural.lower()}")
+    return total
+
+  def generar_libros(self, rng, cantidad):
+    autores = [f"{n} {a}" for n in NOMBRES for a in APELLIDOS]
+    rng.shuffle(autores)
+    pesos = _popularidad(len(autores))
+    dias = (date(2024, 12, 31) - date(1850, 1, 1)).days
+
+    def libros():
+      for _ in range(cantidad):
+        a, b, c = rng.sample(PALABRAS, 3)
+        yield Libro(
+          titulo=rng.choice(TITULOS).format(a=a.capitalize(), b=b, c=c),
+          autor=rng.choices(autores, cum_weights=pesos)[0],
+          # Más libros recientes que antiguos
+          fecha_publicacion=date(1850, 1, 1) + timedelta(days=max(rng.randrange(dias), rng.randrange(dias))),
+        )
+
+    # bulk_create no emite señales: se indexa lo insertado en cada lote
+    conexion = connections[self.using]
+    indexados = [0]
+
+    def indexar():
+      hasta = Libro.objects.using(self.using).aggregate(maximo=Max('id'))['maximo']
+      busqueda.indexar_rango(indexados[0], hasta, conexion)
+      indexados[0] = hasta
+
+    self.insertar(Libro, libros(), despues=indexar)
+    return list(Libro.objects.using(self.using).order_by('id').values_list('id', flat=True))
+
+  def generar_usuarios(self, rng, cantidad):
+    def usuarios():
+      for i in range(cantidad):
+        nombre, apellido = rng.choice(NOMBRES), rng.choice(APELLIDOS)
+        yield Usuario(
+          nombre=f"{nombre} {apellido}",
+          correo=f"{_sin_acentos(nombre)}.{_sin_acentos(apellido)}{i}@ejemplo.com",
+          edad=rng.randint(16, 85),
+          activo=rng.random() < 0.95,
+        )
+
+    self.insertar(Usuario, usuarios())
+    return list(Usuario.objects.using(self.using).order_by('id').values_list('id', flat=True))
+
+  def generar_prestamos(self, rng, libros, usuarios, options, ahora):
+    cantidad = options['prestamos']
+    abiertos = rng.sample(libros, min(round(len(libros) * options['abiertos']), cantidad))
+    cerrados = cantidad - len(abiertos)
+    # Los libros más populares se prestan mucho más que el resto
+    populares = libros[:]
+    rng.shuffle(populares)
+    pesos = _popularidad(len(populares))
+    desde = ahora - timedelta(days=365 * options['anios'])
+    paso = (ahora - timedelta(days=45) - desde) / max(cerrados, 1)
+
+    def prestamos():
+      # En orden de fecha, como se habrían creado: los ids siguen al tiempo
+      for i in range(cerrados):
+        fecha = desde + paso * i + timedelta(seconds=rng.randrange(3600))
+        yield Prestamo(
+          usuario_id=rng.choice(usuarios),
+          libro_id=rng.choices(populares, cum_weights=pesos)[0],
+          fecha_prestamo=fecha,
+          fecha_devolucion=fecha + timedelta(days=rng.randint(1, 45), seconds=rng.randrange(86400)),
+          fecha_vencimiento=vencimiento(fecha),
+        )
+      fechas = [ahora - timedelta(days=rng.randint(0, 30), seconds=rng.randrange(86400)) for _ in abiertos]
+      for fecha, libro_id in sorted(zip(fechas, abiertos)):
+        yield Prestamo(usuario_id=rng.choice(usuarios), libro_id=libro_id, fecha_prestamo=fecha, fecha_vencimiento=vencimiento(fecha))
+
+    total = self.insertar(Prestamo, prestamos())
+    for inicio in range(0, len(abiertos), self.lote):
+      Libro.objects.using(self.using).filter(id__in=abiertos[inicio:inicio + self.lote]).update(en_prestamo=True)
+    return total
@@ -0,0 +1,58 @@
+import os
+from contextlib import contextmanager
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# Clave del advisory lock de PostgreSQL que serializa las migraciones
+CLAVE_BLOQUEO = 0x62696231
+
+
+class Command(BaseCommand):
+  help = (
+    "Prepara la base al arrancar en producción, en un solo proceso: aplica las "
+    "migraciones y crea la tabla de caché detrás de un bloqueo (con varias réplicas "
+    "solo una migra; las demás esperan y no encuentran nada pendiente) y crea el "
+    "superusuario de DJANGO_SUPERUSER_USERNAME si no existe."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    using = options['database']
+    verbosity = options['verbosity']
+    with self.bloqueo(connections[using]):
+      call_command('migrate', database=using, interactive=False, verbosity=verbosity)
+      call_command('createcachetable', database=using, verbosity=verbosity)
+      self.superusuario(using)
+
+  @contextmanager
+  def bloqueo(self, connection):
+    if connection.vendor != 'postgresql':
+      yield
+      return
+    # Bloqueo de transacción y no de sesión: detrás de PgBouncer en modo
+    # transacción (DB_POOLER) cada sentencia fuera de una transacción puede ir
+    # a otra conexión del servidor, y un pg_advisory_lock quedaría tomado en
+    # una conexión que después atiende a otro cliente. Todo corre en una
+    # transacción (las de cada migración pasan a ser savepoints) y el bloqueo
+    # se libera al confirmarla o deshacerla. Por eso una migración con
+    # atomic = False no puede aplicarse con este comando.
+    with transaction.atomic(using=connection.alias):
+      with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CLAVE_BLOQUEO])
+      yield
+
+  def superusuario(self, using):
+    nombre = os.environ.get('DJANGO_SUPERUSER_USERNAME')
+    if not nombre:
+      return
+    modelo = get_user_model()
+    if modelo.objects.using(using).filter(username=nombre).exists():
+      return
+    modelo.objects.db_manager(using).create_superuser(
+      nombre, os.environ.get('DJANGO_SUPERUSER_EMAIL', ''), os.environ.get('DJANGO_SUPERUSER_PASSWORD'),
+    )
+    self.stdout.write(f"Superusuario creado: {nombre}")
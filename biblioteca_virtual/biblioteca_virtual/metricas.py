@@ -0,0 +1,274 @@
+"""
+Métricas por ruta en formato de texto de Prometheus.
+
+``MetricasMiddleware`` mide cada petición: latencia, cantidad y tiempo de
+consultas a la base (con un execute_wrapper registrado en ``envolturas``) y
+tamaño de la respuesta. Las observaciones se acumulan en
+memoria en cada proceso y cada METRICS_FLUSH_SECONDS un hilo del proceso las
+suma, con un solo INSERT ... ON CONFLICT DO UPDATE, a los contadores de
+cambios.Metrica, así que la vista ``metricas`` (``/metrics``) muestra el
+total de todos los workers sea cual sea el backend de caché. El envío no
+corre dentro de ninguna petición y si la base falla las observaciones
+vuelven a quedar pendientes para el próximo.
+
+Los buckets se guardan sin acumular y se acumulan al exportar; las sumas en
+segundos se guardan en microsegundos porque los contadores son enteros.
+"""
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from cambios.models import Metrica
+
+from . import cache_listados, envolturas
+
+SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# nombre -> (descripción, buckets, escala con la que se guarda la suma)
+HISTOGRAMAS = {
+    'biblioteca_http_request_duration_seconds': (
+        "Latencia de las peticiones por ruta", SEGUNDOS, 1_000_000,
+    ),
+    'biblioteca_db_queries_per_request': (
+        "Consultas a la base por petición", (0, 1, 2, 3, 5, 10, 20, 50, 100), 1,
+    ),
+    'biblioteca_db_duration_seconds': (
+        "Tiempo en la base de datos por petición", SEGUNDOS, 1_000_000,
+    ),
+    'biblioteca_http_response_size_bytes': (
+        "Tamaño de las respuestas no streaming", (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 10_000_000), 1,
+    ),
+}
+PETICIONES = 'biblioteca_http_requests_total'
+
+logger = logging.getLogger(__name__)
+
+# Los métodos desconocidos se agrupan para no crear series a pedido del cliente
+METODOS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_medicion = ContextVar('medicion', default=None)
+
+
+def _medir(execute, sql, params, many, context):
+    """execute_wrapper: suma la consulta a la petición en curso, si hay una"""
+    medicion = _medicion.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion[0] += 1
+        medicion[1] += time.perf_counter() - inicio
+
+
+envolturas.registrar(_medir)
+
+
+class Registro:
+    """Observaciones de un proceso pendientes de sumar a los contadores"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pendientes = {}
+        self.ultimo_envio = time.monotonic()
+
+    def observar(self, ruta, metodo, estado, valores):
+        """``valores``: {histograma: valor} de una petición"""
+        serie = f"{ruta}|{metodo}"
+        with self.lock:
+            self._sumar(f"{PETICIONES}:{serie}|{estado}", 1)
+            for nombre, valor in valores.items():
+                _, buckets, escala = HISTOGRAMAS[nombre]
+                clave = f"{nombre}:{serie}"
+                self._sumar(f"{clave}:{bisect_left(buckets, valor)}", 1)
+                self._sumar(f"{clave}:sum", round(valor * escala))
+                self._sumar(f"{clave}:count", 1)
+
+    def _sumar(self, clave, valor):
+        self.pendientes[clave] = self.pendientes.get(clave, 0) + valor
+
+    def enviar(self, forzar=False):
+        """Suma lo pendiente a los contadores, como mucho cada METRICS_FLUSH_SECONDS salvo con ``forzar``"""
+        with self.lock:
+            if not forzar and time.monotonic() - self.ultimo_envio < settings.METRICS_FLUSH_SECONDS:
+                return
+            pendientes, self.pendientes = self.pendientes, {}
+            self.ultimo_envio = time.monotonic()
+
+        pendientes = {clave: valor for clave, valor in pendientes.items() if valor}
+        if not pendientes:
+            return
+        try:
+            Metrica.sumar(pendientes)
+        except DatabaseError:
+            logger.warning("No se pudieron enviar las métricas; se reintenta en el próximo envío", exc_info=True)
+            with self.lock:
+                for clave, valor in pendientes.items():
+                    self._sumar(clave, valor)
+
+
+registro = Registro()
+
+
+class Envio(threading.Thread):
+    """Hilo que envía ``registro`` cada METRICS_FLUSH_SECONDS, uno por proceso"""
+
+    def __init__(self):
+        super().__init__(daemon=True, name='envio-metricas')
+        self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            try:
+                registro.enviar()
+            finally:
+                # Las conexiones de este hilo no quedan abiertas entre envíos
+                connections.close_all()
+
+
+_envio = None
+_envio_lock = threading.Lock()
+
+
+def iniciar_envio():
+    """Arranca el hilo de envío si este proceso no tiene uno (un fork no hereda el del padre)"""
+    global _envio
+    if _envio is not None and _envio.pid == os.getpid():
+        return
+    with _envio_lock:
+        if _envio is None or _envio.pid != os.getpid():
+            _envio = Envio()
+            _envio.start()
+
+
+def _ruta(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    return coincidencia.view_name if coincidencia else 'sin_ruta'
+
+
+class MetricasMiddleware:
+    """Mide cada petición y la registra por ruta (nombre de la URL) y método"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        envolturas.instalar_en_abiertas()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = [0, 0.0]
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        self.registrar(request, response, time.perf_counter() - inicio, medicion)
+        return response
+
+    async def __acall__(self, request):
+        # Las consultas corren en hilos de sync_to_async con una copia del
+        # contexto: ven la misma lista y la actualizan
+        medicion = [0, 0.0]
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        self.registrar(request, response, time.perf_counter() - inicio, medicion)
+        return response
+
+    def registrar(self, request, response, duracion, medicion):
+        valores = {
+            'biblioteca_http_request_duration_seconds': duracion,
+            'biblioteca_db_queries_per_request': medicion[0],
+            'biblioteca_db_duration_seconds': medicion[1],
+        }
+        if not response.streaming:
+            valores['biblioteca_http_response_size_bytes'] = len(response.content)
+        metodo = request.method if request.method in METODOS else 'OTRO'
+        registro.observar(_ruta(request), metodo, response.status_code, valores)
+        iniciar_envio()
+
+
+def _etiquetas(**etiquetas):
+    valores = (
+        '{}="{}"'.format(nombre, str(valor).replace('\\', '\\\\').replace('"', '\\"'))
+        for nombre, valor in etiquetas.items()
+    )
+    return '{' + ','.join(valores) + '}'
+
+
+def exportar():
+    """Texto de Prometheus con el total de los contadores"""
+    registro.enviar(forzar=True)
+    valores = dict(Metrica.objects.values_list('clave', 'valor'))
+    # Las claves son "<métrica>:<ruta>|<método>|<estado>" para las peticiones
+    # y "<métrica>:<ruta>|<método>:<bucket, sum o count>" para los histogramas;
+    # el nombre de la ruta puede tener ":" pero no "|"
+    peticiones = sorted(
+        clave.split(':', 1)[1].split('|') for clave in valores if clave.startswith(f"{PETICIONES}:")
+    )
+    historicas = sorted({
+        tuple(clave.split(':', 1)[1].rsplit(':', 1)[0].split('|'))
+        for clave in valores if not clave.startswith(f"{PETICIONES}:")
+    })
+
+    lineas = [
+        f"# HELP {PETICIONES} Peticiones atendidas por ruta, método y estado",
+        f"# TYPE {PETICIONES} counter",
+    ]
+    for ruta, metodo, estado in peticiones:
+        total = valores.get(f"{PETICIONES}:{ruta}|{metodo}|{estado}", 0)
+        lineas.append(f"{PETICIONES}{_etiquetas(route=ruta, method=metodo, status=estado)} {total}")
+
+    for nombre, (descripcion, buckets, escala) in HISTOGRAMAS.items():
+        lineas += [f"# HELP {nombre} {descripcion}", f"# TYPE {nombre} histogram"]
+        for ruta, metodo in historicas:
+            clave = f"{nombre}:{ruta}|{metodo}"
+            cantidad = valores.get(f"{clave}:count", 0)
+            if not cantidad:
+                continue
+            acumulado = 0
+            for i, limite in enumerate((*buckets, '+Inf')):
+                acumulado += valores.get(f"{clave}:{i}", 0)
+                lineas.append(f"{nombre}_bucket{_etiquetas(route=ruta, method=metodo, le=limite)} {acumulado}")
+            suma = valores.get(f"{clave}:sum", 0)
+            if escala != 1:
+                suma /= escala
+            lineas.append(f"{nombre}_sum{_etiquetas(route=ruta, method=metodo)} {suma}")
+            lineas.append(f"{nombre}_count{_etiquetas(route=ruta, method=metodo)} {cantidad}")
+
+    lineas += [
+        "# HELP biblioteca_list_cache_requests_total Aciertos y fallos de la caché de listados",
+        "# TYPE biblioteca_list_cache_requests_total counter",
+    ]
+    for vista, datos in sorted(cache_listados.estadisticas().items()):
+        for resultado, total in datos.items():
+            etiquetas = _etiquetas(view=vista, result=resultado)
+            lineas.append(f"biblioteca_list_cache_requests_total{etiquetas} {total}")
+    return '\n'.join(lineas) + '\n'
+
+
+@require_GET
+def metricas(request):
+    """Endpoint para Prometheus"""
+    return HttpResponse(exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
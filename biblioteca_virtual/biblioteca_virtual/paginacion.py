@@ -0,0 +1,171 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de OFFSET, cada página se pide a partir de la última fila vista
+(valor de la columna de orden + id). Con un índice sobre (columna, id) el
+costo de una página es el mismo sin importar cuántas filas haya antes.
+"""
+
+import base64
+import binascii
+import itertools
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class Pagina:
+    def __init__(self, objetos, siguiente=None, anterior=None, request=None, parametro='cursor'):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+        self._request = request
+        self._parametro = parametro
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def url_siguiente(self):
+        return self._url(self.siguiente)
+
+    @property
+    def url_anterior(self):
+        return self._url(self.anterior)
+
+    def _url(self, cursor):
+        if cursor is None or self._request is None:
+            return None
+        params = self._request.GET.copy()
+        params[self._parametro] = cursor
+        return f"?{params.urlencode()}"
+
+
+def codificar_cursor(orden, valores, reversa=False):
+    datos = {'o': orden, 'v': valores, 'r': reversa}
+    crudo = json.dumps(datos, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve (orden, valores, reversa); ValueError si el token no es válido."""
+    try:
+        relleno = '=' * (-len(token) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(token + relleno))
+        return datos['o'], list(datos['v']), bool(datos['r'])
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def _campos(orden):
+    campo = orden.lstrip('-')
+    return [campo] if campo == 'id' else [campo, 'id']
+
+
+def _filtro_keyset(queryset, orden, valores, hacia_atras):
+    descendente = orden.startswith('-') != hacia_atras
+    operador = 'lt' if descendente else 'gt'
+    campos = _campos(orden)
+    modelo = queryset.model
+
+    if len(valores) != len(campos):
+        raise ValueError("Cursor inválido")
+    valores = [
+        modelo._meta.get_field(campo).to_python(valor)
+        for campo, valor in zip(campos, valores)
+    ]
+
+    # (a, id) > (va, vid)  <=>  a > va OR (a = va AND id > vid)
+    filtro = Q()
+    iguales = {}
+    for campo, valor in zip(campos, valores):
+        filtro |= Q(**iguales, **{f"{campo}__{operador}": valor})
+        iguales[campo] = valor
+    return filtro
+
+
+def _ordenamiento(orden, hacia_atras):
+    signo = '-' if orden.startswith('-') != hacia_atras else ''
+    return [f"{signo}{campo}" for campo in _campos(orden)]
+
+
+def _valores(objeto, orden):
+    return [getattr(objeto, campo) for campo in _campos(orden)]
+
+
+def _consulta(request, queryset, orden, tamano):
+    """Queryset de la página pedida (con una fila de más) y la posición del cursor"""
+    cursor = request.GET.get('cursor')
+    valores, hacia_atras = None, False
+
+    if cursor:
+        try:
+            orden_cursor, valores, hacia_atras = decodificar_cursor(cursor)
+            if orden_cursor != orden:
+                raise ValueError("Cursor de otro orden")
+            queryset = queryset.filter(
+                _filtro_keyset(queryset, orden, valores, hacia_atras)
+            )
+        except (ValueError, ValidationError):
+            valores, hacia_atras = None, False
+
+    return queryset.order_by(*_ordenamiento(orden, hacia_atras))[:tamano + 1], valores, hacia_atras
+
+
+def _pagina(request, filas, orden, tamano, valores, hacia_atras):
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+
+    if hacia_atras:
+        filas.reverse()
+        hay_siguiente, hay_anterior = True, hay_mas
+    else:
+        hay_siguiente, hay_anterior = hay_mas, valores is not None
+
+    siguiente = anterior = None
+    if filas and hay_siguiente:
+        siguiente = codificar_cursor(orden, _valores(filas[-1], orden))
+    if filas and hay_anterior:
+        anterior = codificar_cursor(orden, _valores(filas[0], orden), reversa=True)
+
+    return Pagina(filas, siguiente, anterior, request)
+
+
+def _mezclar(partes, orden, tamano, hacia_atras):
+    """Las primeras ``tamano`` + 1 filas de varias consultas ya ordenadas"""
+    if len(partes) == 1:
+        return partes[0]
+    descendente = orden.startswith('-') != hacia_atras
+    filas = sorted(itertools.chain(*partes), key=lambda fila: _valores(fila, orden), reverse=descendente)
+    return filas[:tamano + 1]
+
+
+def paginar(request, queryset, orden='id', tamano=None, otros=()):
+    """
+    Pagina ``queryset`` por ``orden`` (con '-' para descendente) usando el
+    parámetro ``cursor`` de la petición. Se desempata siempre por id.
+    Un cursor inválido o de otro orden se ignora y se muestra la primera página.
+
+    ``otros`` son querysets con los mismos campos de orden que se suman al
+    listado (el archivo de préstamos): se pide la página a cada uno y se
+    mezclan, con una consulta más por cada uno.
+    """
+    tamano = tamano or settings.LIST_PAGE_SIZE
+    consulta, valores, hacia_atras = _consulta(request, queryset, orden, tamano)
+    partes = [list(consulta)] + [list(_consulta(request, otro, orden, tamano)[0]) for otro in otros]
+    return _pagina(request, _mezclar(partes, orden, tamano, hacia_atras), orden, tamano, valores, hacia_atras)
+
+
+async def apaginar(request, queryset, orden='id', tamano=None, otros=()):
+    """Versión async de ``paginar`` para las vistas async"""
+    tamano = tamano or settings.LIST_PAGE_SIZE
+    consulta, valores, hacia_atras = _consulta(request, queryset, orden, tamano)
+    partes = [[fila async for fila in consulta]]
+    for otro in otros:
+        partes.append([fila async for fila in _consulta(request, otro, orden, tamano)[0]])
+    return _pagina(request, _mezclar(partes, orden, tamano, hacia_atras), orden, tamano, valores, hacia_atras)
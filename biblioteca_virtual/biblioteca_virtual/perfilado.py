@@ -0,0 +1,268 @@
+"""
+Perfilado bajo demanda de una petición, para el personal (is_staff).
+
+Una petición con ``?_perfilar=<firma>`` o la cabecera ``X-Perfilar: <firma>``
+de un usuario staff con sesión iniciada se ejecuta bajo cProfile, con un hilo
+que muestrea su pila cada PROFILING_SAMPLE_INTERVAL_MS y con el SQL y el
+tiempo de cada consulta. La firma se obtiene en ``/perfiles/`` (solo staff),
+está ligada al usuario y vence a los PROFILING_TOKEN_MAX_AGE segundos; sin
+firma válida o sin sesión de staff la petición sigue sin perfilar.
+
+Cada perfil se guarda en PROFILING_DIR como ``<id>.pstats`` (para pstats o
+snakeviz), ``<id>.pilas.txt`` (pilas colapsadas para flamegraph.pl o
+speedscope; vacío si la petición duró menos que un intervalo de muestreo) y
+``<id>.sql.json``, y la respuesta indica el id en ``X-Perfil``.
+Para poder dejarlo activo en producción hay límites: un perfil a la vez por
+proceso, PROFILING_MAX_PER_HOUR por hora entre todos los procesos (contador
+en la caché), el muestreo se detiene a los PROFILING_MAX_SECONDS y se
+conservan los últimos PROFILING_KEEP perfiles.
+
+Solo se perfilan peticiones servidas por WSGI: cProfile mide un solo hilo y
+con ASGI las consultas corren en otros.
+"""
+
+import cProfile
+import json
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from . import envolturas
+
+SAL = 'biblioteca_virtual.perfilado'
+PARAMETRO = '_perfilar'
+CABECERA = 'HTTP_X_PERFILAR'
+PREFIJO = 'perfilado'
+ARCHIVO = re.compile(r'^(?P<perfil>[0-9]{14}-[0-9a-f]{8})\.(pstats|pilas\.txt|sql\.json)$')
+
+_consultas = ContextVar('perfilado_consultas', default=None)
+_en_curso = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _almacen(ubicacion):
+    return FileSystemStorage(location=ubicacion)
+
+
+def almacen():
+    return _almacen(settings.PROFILING_DIR)
+
+
+def firma(usuario):
+    """Firma para perfilar peticiones de ``usuario``"""
+    return signing.dumps(usuario.pk, salt=SAL)
+
+
+def _firma_valida(request):
+    valor = request.GET.get(PARAMETRO) or request.META.get(CABECERA)
+    if not valor:
+        return False
+    try:
+        pk = signing.loads(valor, salt=SAL, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    usuario = request.user
+    return usuario.is_active and usuario.is_staff and usuario.pk == pk
+
+
+def _medir(execute, sql, params, many, context):
+    consultas = _consultas.get()
+    if consultas is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        # Sin parámetros: pueden tener datos personales
+        consultas.append({'sql': sql, 'ms': round((time.perf_counter() - inicio) * 1000, 3), 'many': many})
+
+
+envolturas.registrar(_medir, activa=lambda: settings.PROFILING_ENABLED)
+
+
+def _cupo_disponible():
+    """Cuenta el perfil en el cupo de la hora actual, compartido entre procesos"""
+    clave = f"{PREFIJO}:cupo:{int(time.time() // 3600)}"
+    if cache.add(clave, 1, timeout=3600):
+        return True
+    try:
+        return cache.incr(clave) <= settings.PROFILING_MAX_PER_HOUR
+    except ValueError:
+        return cache.add(clave, 1, timeout=3600)
+
+
+class Muestreador(threading.Thread):
+    """Pilas colapsadas del hilo ``hilo``: 'raíz;...;hoja' -> muestras"""
+
+    def __init__(self, hilo):
+        super().__init__(daemon=True)
+        self.hilo = hilo
+        self.pilas = Counter()
+        self.detener = threading.Event()
+
+    def run(self):
+        intervalo = settings.PROFILING_SAMPLE_INTERVAL_MS / 1000
+        fin = time.monotonic() + settings.PROFILING_MAX_SECONDS
+        raiz = str(settings.BASE_DIR)
+        while not self.detener.wait(intervalo) and time.monotonic() < fin:
+            frame = sys._current_frames().get(self.hilo)
+            marcos = []
+            while frame is not None:
+                codigo = frame.f_code
+                archivo = os.path.relpath(codigo.co_filename, raiz) if codigo.co_filename.startswith(raiz) else os.path.basename(codigo.co_filename)
+                marcos.append(f"{codigo.co_name} ({archivo}:{codigo.co_firstlineno})")
+                frame = frame.f_back
+            if marcos:
+                self.pilas[';'.join(reversed(marcos))] += 1
+
+
+def _guardar(perfil, request, perfilador, muestreador, consultas, duracion):
+    # Lo mismo que Profile.dump_stats, sin pasar por un archivo temporal
+    perfilador.create_stats()
+    almacen().save(f"{perfil}.pstats", ContentFile(marshal.dumps(perfilador.stats)))
+    pilas = ''.join(f"{pila} {n}\n" for pila, n in muestreador.pilas.most_common())
+    almacen().save(f"{perfil}.pilas.txt", ContentFile(pilas.encode()))
+    datos = {
+        'id': perfil,
+        'fecha': timezone.now().isoformat(),
+        'usuario': request.user.get_username(),
+        'metodo': request.method,
+        'ruta': request.path,
+        'duracion_ms': round(duracion * 1000, 1),
+        'tiempo_sql_ms': round(sum(c['ms'] for c in consultas), 3),
+        'consultas': consultas,
+    }
+    almacen().save(f"{perfil}.sql.json", ContentFile(json.dumps(datos, ensure_ascii=False, indent=1).encode()))
+    _podar()
+
+
+def _perfiles():
+    """Ids guardados, del más nuevo al más viejo"""
+    try:
+        _, archivos = almacen().listdir('')
+    except FileNotFoundError:
+        return []
+    return sorted((m['perfil'] for m in map(ARCHIVO.match, archivos) if m and m.group(2) == 'sql.json'), reverse=True)
+
+
+def _podar():
+    for perfil in _perfiles()[settings.PROFILING_KEEP:]:
+        for extension in ('pstats', 'pilas.txt', 'sql.json'):
+            almacen().delete(f"{perfil}.{extension}")
+
+
+class PerfiladoMiddleware:
+    """Perfila las peticiones con firma de un usuario staff; va después de AuthenticationMiddleware"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        envolturas.instalar_en_abiertas()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.pedido(request):
+            return self.get_response(request)
+        if not _en_curso.acquire(blocking=False):
+            return self.omitir(self.get_response(request), 'ocupado')
+        try:
+            if not _cupo_disponible():
+                return self.omitir(self.get_response(request), 'limite')
+            return self.perfilar(request)
+        finally:
+            _en_curso.release()
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.solicitado(request) and await sync_to_async(_firma_valida)(request):
+            self.omitir(response, 'asgi')
+        return response
+
+    def solicitado(self, request):
+        return settings.PROFILING_ENABLED and (PARAMETRO in request.GET or CABECERA in request.META)
+
+    def pedido(self, request):
+        return self.solicitado(request) and _firma_valida(request)
+
+    def omitir(self, response, motivo):
+        response['X-Perfil-Omitido'] = motivo
+        return response
+
+    def perfilar(self, request):
+        perfil = f"{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        consultas = []
+        token = _consultas.set(consultas)
+        muestreador = Muestreador(threading.get_ident())
+        perfilador = cProfile.Profile()
+        muestreador.start()
+        inicio = time.perf_counter()
+        try:
+            perfilador.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                perfilador.disable()
+        finally:
+            duracion = time.perf_counter() - inicio
+            muestreador.detener.set()
+            muestreador.join()
+            _consultas.reset(token)
+        _guardar(perfil, request, perfilador, muestreador, consultas, duracion)
+        response['X-Perfil'] = perfil
+        return response
+
+
+@require_GET
+@staff_member_required
+def perfiles(request):
+    """Firma del usuario para perfilar y perfiles guardados con sus archivos"""
+    lista = []
+    for perfil in _perfiles():
+        try:
+            with almacen().open(f"{perfil}.sql.json") as archivo:
+                datos = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+        datos['cantidad_consultas'] = len(datos.pop('consultas'))
+        datos['archivos'] = {
+            extension: reverse('descargar_perfil', args=[f"{perfil}.{extension}"])
+            for extension in ('pstats', 'pilas.txt', 'sql.json')
+        }
+        lista.append(datos)
+    return JsonResponse({
+        'firma': firma(request.user),
+        'uso': f"Agregue ?{PARAMETRO}=<firma> a la URL o envíe la cabecera X-Perfilar: <firma>",
+        'perfiles': lista,
+    })
+
+
+@require_GET
+@staff_member_required
+def descargar(request, archivo):
+    if not ARCHIVO.match(archivo) or not almacen().exists(archivo):
+        raise Http404("Perfil inexistente")
+    return FileResponse(almacen().open(archivo), as_attachment=True, filename=archivo)
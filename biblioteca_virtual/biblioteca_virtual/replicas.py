@@ -0,0 +1,137 @@
+"""
+Réplicas de lectura para las vistas de solo lectura.
+
+Con DB_REPLICAS configurado, settings agrega una base por réplica
+(``replica1``, ``replica2``, ...) y activa ``RouterReplicas``. Solo las vistas
+marcadas con ``@lectura`` leen de una réplica, elegida una vez por petición
+para que todas sus consultas vean el mismo estado. Las escrituras, las
+lecturas dentro de transaction.atomic (préstamos y devoluciones) y el resto
+de las vistas usan ``default``.
+
+Para que cada cliente vea sus propios cambios aunque la réplica esté
+atrasada, ``EscrituraRecienteMiddleware`` deja la cookie ``COOKIE`` durante
+REPLICA_STICKY_SECONDS cuando una petición escribió en la base; mientras
+esté, las vistas de ese cliente leen de ``default``.
+"""
+
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE = 'escritura_reciente'
+
+# Solo se enrutan los modelos de la biblioteca: la caché en base de datos y
+# las sesiones siempre van a default
+APPS = {'usuarios', 'libros', 'prestamos', 'cambios'}
+
+_replica = ContextVar('replica', default=None)
+_escrituras = ContextVar('escrituras', default=None)
+
+
+class RouterReplicas:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is None or model._meta.app_label not in APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        escrituras = _escrituras.get()
+        if escrituras is not None and model._meta.app_label in APPS:
+            escrituras.append(model._meta.label_lower)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Las réplicas reciben el esquema por replicación
+        return db not in settings.DATABASE_REPLICAS
+
+
+def actual():
+    """Alias de la réplica que usa la petición en curso, o None si lee de default"""
+    return _replica.get()
+
+
+def _replica_para(request):
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or request.method not in ('GET', 'HEAD') or COOKIE in request.COOKIES:
+        return None
+    return random.choice(replicas)
+
+
+def lectura(vista):
+    """Marca una vista de solo lectura (sync o async): sus consultas van a una réplica"""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura_async(request, *args, **kwargs):
+            replica = _replica_para(request)
+            if replica is None:
+                return await vista(request, *args, **kwargs)
+            # El ORM async copia el contexto al hilo donde consulta: el router lo ve
+            token = _replica.set(replica)
+            try:
+                return await vista(request, *args, **kwargs)
+            finally:
+                _replica.reset(token)
+
+        return envoltura_async
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        replica = _replica_para(request)
+        if replica is None:
+            return vista(request, *args, **kwargs)
+        token = _replica.set(replica)
+        try:
+            return vista(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+
+    return envoltura
+
+
+class EscrituraRecienteMiddleware:
+    """Deja la cookie de lectura en default a los clientes que acaban de escribir"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        escrituras = []
+        token = _escrituras.set(escrituras)
+        try:
+            response = self.get_response(request)
+        finally:
+            _escrituras.reset(token)
+        return self.marcar(response, escrituras)
+
+    async def __acall__(self, request):
+        escrituras = []
+        token = _escrituras.set(escrituras)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _escrituras.reset(token)
+        return self.marcar(response, escrituras)
+
+    def marcar(self, response, escrituras):
+        if escrituras and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
@@ -43,19 +44,30 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     # Local apps
+    # El paquete del proyecto también es una app: tiene los comandos que no
+    # son de una sola app (exportar, benchmarks, preparar_despliegue)
+    'biblioteca_virtual',
     'usuarios',
     'libros',
-    'prestamos'
+    'prestamos',
+    'cambios'
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir la petición completa
+    'biblioteca_virtual.metricas.MetricasMiddleware',
+    # Solo en desarrollo y tests (QUERY_GUARD)
+    'biblioteca_virtual.consultas.VigilanciaConsultasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Necesita request.user
+    'biblioteca_virtual.perfilado.PerfiladoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'biblioteca_virtual.replicas.EscrituraRecienteMiddleware',
 ]
 
 ROOT_URLCONF = 'biblioteca_virtual.urls'
@@ -72,11 +84,19 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'libraries': {
+                'fragmentos': 'biblioteca_virtual.fragmentos',
+            },
         },
     },
 ]
 
 WSGI_APPLICATION = 'biblioteca_virtual.wsgi.application'
+ASGI_APPLICATION = 'biblioteca_virtual.asgi.application'
+
+# True al servir con ASGI (uvicorn, daphne): los listados, búsquedas y
+# detalles usan sus versiones async (views_async.py de cada app)
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False").lower() in ("1", "true")
 
 
 # Database
@@ -90,9 +110,58 @@ DATABASES = {
         'PASSWORD': os.environ["DB_PASSWORD"],
         'HOST': os.environ["DB_HOST"],
         'PORT': os.environ["DB_PORT"],
+        # Segundos que se reutiliza una conexión entre peticiones (0 = una por
+        # petición, "none" = sin límite); con health checks se verifica antes
+        # de reutilizarla y se reabre si el servidor la cortó
+        'CONN_MAX_AGE': (
+            None if os.environ.get("DB_CONN_MAX_AGE", "0").lower() == "none"
+            else int(os.environ.get("DB_CONN_MAX_AGE", 0))
+        ),
+        'CONN_HEALTH_CHECKS': os.environ.get("DB_CONN_HEALTH_CHECKS", "False").lower() in ("1", "true"),
+        # Con un pooler externo en modo transacción (PgBouncer) un cursor del
+        # lado del servidor no sobrevive entre transacciones
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get("DB_POOLER", "False").lower() in ("1", "true"),
+        # SQLite (desarrollo) no acepta connect_timeout
+        'OPTIONS': (
+            {'timeout': int(os.environ["DB_TIMEOUT"])}
+            if os.environ["DB_ENGINE"] == 'django.db.backends.sqlite3'
+            else {'connect_timeout': os.environ["DB_TIMEOUT"]}
+        ),
+    }
+}
+
+# Réplicas de lectura (opcional): DB_REPLICAS con los hosts separados por
+# comas, que usan el resto de la configuración de default. Con SQLite son
+# rutas de archivos (copias de DB_NAME). Las vistas de listado y búsqueda
+# leen de una réplica; ver biblioteca_virtual/replicas.py
+
+DATABASE_REPLICAS = []
+for numero, destino in enumerate(filter(None, os.environ.get("DB_REPLICAS", "").split(",")), start=1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    replica['NAME' if replica['ENGINE'] == 'django.db.backends.sqlite3' else 'HOST'] = destino.strip()
+    DATABASES[f'replica{numero}'] = replica
+    DATABASE_REPLICAS.append(f'replica{numero}')
+
+DATABASE_ROUTERS = ['biblioteca_virtual.replicas.RouterReplicas'] if DATABASE_REPLICAS else []
+
+# Segundos que un cliente lee de default después de escribir, para ver sus
+# propios cambios aunque la réplica esté atrasada
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Con varios procesos debe ser un backend compartido (p. ej. DatabaseCache o
+# RedisCache) para que las versiones de los listados sean las mismas en todos
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.environ.get("CACHE_LOCATION", ""),
         'OPTIONS': {
-            'connect_timeout': os.environ["DB_TIMEOUT"],
-        }
+            # Una página de listado puede guardar hasta una entrada por fila
+            'MAX_ENTRIES': int(os.environ.get("CACHE_MAX_ENTRIES", 20000)),
+        },
     }
 }
 
@@ -137,3 +206,83 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Listados
+# Cantidad de filas por página en los listados paginados por cursor
+
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", 50))
+
+# Segundos que una página de listado se sirve desde la caché; se descarta
+# antes si cambia alguno de los modelos que muestra
+LIST_CACHE_TIMEOUT = int(os.environ.get("LIST_CACHE_TIMEOUT", 300))
+
+# Segundos que se guarda el HTML de cada fila de los listados (0 desactiva);
+# la clave incluye updated_at, así que una fila editada nunca sale vieja
+LIST_ROW_CACHE_TIMEOUT = int(os.environ.get("LIST_ROW_CACHE_TIMEOUT", 3600))
+
+# Máximo de sugerencias que devuelven los endpoints de autocompletado
+AUTOCOMPLETE_LIMIT = int(os.environ.get("AUTOCOMPLETE_LIMIT", 10))
+
+# Búsqueda difusa por trigramas: puntaje mínimo (0 a 1), máximo de resultados
+# y cada cuántos segundos se reconstruye el índice en memoria (solo SQLite)
+BUSQUEDA_DIFUSA_UMBRAL = float(os.environ.get("BUSQUEDA_DIFUSA_UMBRAL", 0.5))
+BUSQUEDA_DIFUSA_LIMITE = int(os.environ.get("BUSQUEDA_DIFUSA_LIMITE", 20))
+BUSQUEDA_DIFUSA_REFRESCO = int(os.environ.get("BUSQUEDA_DIFUSA_REFRESCO", 300))
+
+
+# Préstamos
+# Máximo de libros o préstamos por petición en los endpoints por lote
+
+PRESTAMOS_LOTE_MAXIMO = int(os.environ.get("PRESTAMOS_LOTE_MAXIMO", 200))
+
+# Días que dura un préstamo: fecha_vencimiento = fecha_prestamo + PRESTAMOS_DIAS
+
+PRESTAMOS_DIAS = int(os.environ.get("PRESTAMOS_DIAS", 14))
+
+# Antigüedad (días desde fecha_prestamo) a partir de la cual archivar_prestamos
+# mueve los préstamos devueltos al archivo, si no se indica --antes-de
+
+PRESTAMOS_ARCHIVO_DIAS = int(os.environ.get("PRESTAMOS_ARCHIVO_DIAS", 730))
+
+
+# Feed de cambios
+# Máximo de filas (y de eliminaciones) por respuesta, y segundos que se espera
+# antes de publicar un cambio para no saltear transacciones lentas
+
+CHANGE_FEED_PAGE_SIZE = int(os.environ.get("CHANGE_FEED_PAGE_SIZE", 500))
+CHANGE_FEED_DELAY = int(os.environ.get("CHANGE_FEED_DELAY", 5))
+
+
+# Métricas
+# Segundos que cada proceso acumula las observaciones antes de sumarlas a los contadores de la base
+
+METRICS_FLUSH_SECONDS = int(os.environ.get("METRICS_FLUSH_SECONDS", 10))
+
+
+# Vigilancia de consultas (biblioteca_virtual/consultas.py)
+# off, warn (registra un aviso) o raise (falla la petición, para tests);
+# repeticiones de una misma sentencia que cuentan como N+1, y presupuesto de
+# consultas para las vistas que no declaran uno (vacío = sin límite).
+# Apagada por defecto, también con DEBUG: recorre la pila en cada consulta.
+# entrypoint.sh la pone en warn en desarrollo y los tests en raise
+
+QUERY_GUARD = os.environ.get("QUERY_GUARD") or "off"
+QUERY_GUARD_REPEATS = int(os.environ.get("QUERY_GUARD_REPEATS", 3))
+QUERY_BUDGET_DEFAULT = int(os.environ["QUERY_BUDGET_DEFAULT"]) if os.environ.get("QUERY_BUDGET_DEFAULT") else None
+
+# manage.py test siempre con QUERY_GUARD = 'raise'
+TEST_RUNNER = 'biblioteca_virtual.consultas.VigilanciaTestRunner'
+
+
+# Perfilado bajo demanda para staff (biblioteca_virtual/perfilado.py)
+# Perfiles por hora entre todos los procesos, segundos máximos de muestreo,
+# milisegundos entre muestras, perfiles que se conservan y vigencia de la firma
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "True").lower() in ("1", "true")
+PROFILING_DIR = os.environ.get("PROFILING_DIR") or os.path.join(tempfile.gettempdir(), "biblioteca_perfiles")
+PROFILING_MAX_PER_HOUR = int(os.environ.get("PROFILING_MAX_PER_HOUR", 20))
+PROFILING_MAX_SECONDS = int(os.environ.get("PROFILING_MAX_SECONDS", 30))
+PROFILING_SAMPLE_INTERVAL_MS = int(os.environ.get("PROFILING_SAMPLE_INTERVAL_MS", 5))
+PROFILING_KEEP = int(os.environ.get("PROFILING_KEEP", 50))
+PROFILING_TOKEN_MAX_AGE = int(os.environ.get("PROFILING_TOKEN_MAX_AGE", 3600))
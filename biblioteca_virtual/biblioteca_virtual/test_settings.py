@@ -7,8 +7,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
-    }
+    },
 }
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = []
 
 # Disable migrations for faster tests
 class DisableMigrations:
@@ -0,0 +1,91 @@
+"""Tests para los comandos generar_datos y benchmark_vistas"""
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase
+from django.urls import reverse
+from libros.models import Libro
+from prestamos.models import Prestamo
+from usuarios.models import Usuario
+
+
+class GenerarDatosTest(TestCase):
+    """Tests para los comandos generar_datos y benchmark_vistas"""
+
+    def generar(self, **opciones):
+        opciones = {'libros': 40, 'usuarios': 20, 'prestamos': 200, 'lote': 30, 'stdout': StringIO(), **opciones}
+        call_command('generar_datos', **opciones)
+
+    def test_genera_datos_consistentes(self):
+        """Test que genera las cantidades pedidas con un préstamo abierto por libro prestado"""
+        self.generar(abiertos=0.25)
+        self.assertEqual(Libro.objects.count(), 40)
+        self.assertEqual(Usuario.objects.count(), 20)
+        self.assertEqual(Prestamo.objects.count(), 200)
+        abiertos = Prestamo.objects.filter(fecha_devolucion__isnull=True)
+        self.assertEqual(abiertos.count(), 10)
+        self.assertEqual(
+            set(abiertos.values_list('libro_id', flat=True)),
+            set(Libro.objects.filter(en_prestamo=True).values_list('id', flat=True)),
+        )
+        self.assertFalse(Prestamo.objects.filter(fecha_devolucion__lt=F('fecha_prestamo')).exists())
+        # Los libros insertados con bulk_create quedan en el índice de búsqueda
+        titulo = Libro.objects.first().titulo.split()[0].strip(',')
+        response = self.client.get(reverse('libros:buscar_libros'), {'q': titulo})
+        self.assertTrue(response.context['libros'])
+
+    def test_reproducible(self):
+        """Test que la misma semilla genera los mismos datos"""
+        def datos():
+            return (
+                list(Libro.objects.order_by('id').values_list('titulo', 'autor', 'fecha_publicacion')),
+                list(Usuario.objects.order_by('id').values_list('nombre', 'correo', 'edad', 'activo')),
+            )
+
+        self.generar(semilla=7)
+        primera = datos()
+        Prestamo.objects.all().delete()
+        Libro.objects.all().delete()
+        Usuario.objects.all().delete()
+        self.generar(semilla=7)
+        self.assertEqual(datos(), primera)
+
+    def test_necesita_tablas_vacias(self):
+        """Test que el comando no mezcla datos generados con datos existentes"""
+        Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        with self.assertRaisesMessage(CommandError, "necesita tablas vacías"):
+            self.generar()
+
+    def test_benchmark_recorre_todas_las_urls(self):
+        """Test que el benchmark mide cada URL, guarda la línea base y compara con ella"""
+        self.generar(abiertos=0.5)
+        ruta = os.path.join(tempfile.mkdtemp(), 'base.json')
+        salida, errores = StringIO(), StringIO()
+        call_command('benchmark_vistas', repeticiones=1, calentamiento=0, guardar=ruta, stdout=salida, stderr=errores)
+        self.assertEqual(errores.getvalue(), "")
+
+        with open(ruta) as f:
+            base = json.load(f)
+        self.assertEqual(base['filas'], {'libros': 40, 'usuarios': 20, 'prestamos': 200})
+        self.assertGreater(base['vistas']['crear_prestamo POST']['consultas'], 0)
+        # La memoria es de cada vista y no el máximo acumulado del proceso
+        memoria = {nombre: vista['memoria_pico_mb'] for nombre, vista in base['vistas'].items()}
+        self.assertTrue(all(valor > 0 for valor in memoria.values()))
+        self.assertLess(memoria['crear_libro'], max(memoria.values()))
+        # Las escrituras se deshacen
+        self.assertEqual(Prestamo.objects.count(), 200)
+        self.assertEqual(Libro.objects.count(), 40)
+
+        # Una línea base imposible de empeorar no falla; una con menos consultas sí
+        for resultado in base['vistas'].values():
+            resultado['p95_ms'] = 10 ** 6
+        base['vistas']['editar_libro']['consultas'] = 0
+        with open(ruta, 'w') as f:
+            json.dump(base, f)
+        with self.assertRaisesMessage(CommandError, "editar_libro"):
+            call_command('benchmark_vistas', repeticiones=1, calentamiento=0, vista=['editar_libro', 'libros'],
+                         comparar=ruta, umbral=2, stdout=StringIO())
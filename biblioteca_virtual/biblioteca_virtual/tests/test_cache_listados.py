@@ -0,0 +1,107 @@
+"""Tests para la caché de listados (biblioteca_virtual/cache_listados.py)"""
+from datetime import date
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import resolve, reverse
+from biblioteca_virtual import cache_listados
+from libros.models import Libro
+from prestamos.services import prestar, devolver
+from usuarios.models import Usuario
+
+
+class CacheListadosTest(TestCase):
+    """Tests para la caché versionada de los listados"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        self.client = Client()
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.libro = Libro.objects.create(titulo="Rayuela", autor="Julio Cortázar", fecha_publicacion=date(1963, 6, 28))
+
+    def test_segunda_visita_sale_de_cache(self):
+        """Test que una página repetida se sirve sin consultas ni render"""
+        url = reverse('libros:libros')
+        primera = self.client.get(url)
+        self.assertEqual(primera['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            segunda = self.client.get(url)
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(self.client.get(url, {'orden': 'titulo'})['X-Cache'], 'MISS')
+
+    def test_senales_invalidan(self):
+        """Test que guardar o eliminar un objeto descarta las páginas de su modelo"""
+        url = reverse('usuarios:usuarios')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        Libro.objects.create(titulo="Otro", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        self.usuario.nombre = "Ana María"
+        self.usuario.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, "Ana María")
+
+    def test_updates_de_servicios_invalidan(self):
+        """Test que los UPDATE sin señales de préstamo y devolución también invalidan"""
+        url = reverse('libros:libros')
+        self.client.get(url)
+        prestamo = prestar(self.usuario, self.libro)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+        self.client.get(url)
+        devolver(prestamo)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.context['libros'][0].en_prestamo, False)
+
+    def test_prestamos_dependen_de_usuario_y_libro(self):
+        """Test que el listado de préstamos cambia si cambia el título del libro"""
+        prestar(self.usuario, self.libro)
+        url = reverse('prestamos:prestamos')
+        self.client.get(url)
+        self.client.get(url)
+
+        self.libro.titulo = "Rayuela (edición crítica)"
+        self.libro.save()
+        self.assertContains(self.client.get(url), "edición crítica")
+
+    def test_csrf_por_cookie(self):
+        """Test que las páginas con token CSRF se guardan por cookie y no se comparten"""
+        url = reverse('prestamos:prestamos')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        otro = Client()
+        self.assertEqual(otro.get(url)['X-Cache'], 'MISS')
+
+    def test_mensajes_pendientes_no_usan_cache(self):
+        """Test que una página con mensajes del usuario no se guarda ni se sirve de la caché"""
+        url = reverse('usuarios:usuarios')
+        self.client.get(url)
+        response = self.client.post(reverse('usuarios:crear_usuario'), {
+            'nombre': 'Luis', 'correo': 'luis@test.com', 'edad': 40, 'activo': True,
+        }, follow=True)
+        self.assertNotIn('X-Cache', response)
+        self.assertContains(response, 'Luis')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_estadisticas(self):
+        """Test que se cuentan aciertos y fallos por vista"""
+        url = reverse('libros:libros')
+        for _ in range(3):
+            self.client.get(url)
+        vista = resolve(url).func
+        datos = cache_listados.estadisticas()[f"{vista.__module__}.{vista.__name__}"]
+        self.assertEqual(datos, {'aciertos': 2, 'fallos': 1})
+
+    def test_contador_perdido(self):
+        """Test que si se pierde la versión no se reutilizan páginas viejas"""
+        url = reverse('libros:libros')
+        self.client.get(url)
+        cache.delete('listados:version:libros.libro')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
@@ -0,0 +1,147 @@
+"""Tests para el GET condicional de listados y detalles (biblioteca_virtual/condicional.py)"""
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from biblioteca_virtual import consultas
+from libros.models import Libro
+from prestamos import archivo
+from prestamos.models import Prestamo
+from prestamos.services import prestar, devolver
+from usuarios.models import Usuario
+
+
+class GetCondicionalTest(TestCase):
+    """Tests para ETag y Last-Modified en listados y detalles"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        self.client = Client()
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.libro = Libro.objects.create(titulo="Rayuela", autor="Julio Cortázar", fecha_publicacion=date(1963, 6, 28))
+
+    def test_listado_304_con_if_none_match(self):
+        """Test que un ETag vigente responde 304 sin consultar la base si la página está en caché"""
+        url = reverse('libros:libros')
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_listado_304_sin_cache_cuesta_una_consulta(self):
+        """Test que sin la página en caché el 304 cuesta solo la consulta de validadores"""
+        url = reverse('usuarios:usuarios')
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_listado_304_con_if_modified_since(self):
+        """Test que If-Modified-Since con la fecha de Last-Modified responde 304"""
+        url = reverse('libros:libros')
+        ultima = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=ultima)
+        self.assertEqual(response.status_code, 304)
+
+    def test_cambios_y_borrados_cambian_el_etag(self):
+        """Test que editar o eliminar una fila invalida el ETag del listado"""
+        url = reverse('libros:libros')
+        etag = self.client.get(url)['ETag']
+
+        self.libro.titulo = "Rayuela (edición crítica)"
+        self.libro.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "edición crítica")
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.libro.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Rayuela")
+
+    def test_validadores_sin_contar_filas(self):
+        """Test que los validadores no recorren las tablas: sin COUNT, con el contador de borrados"""
+        self.client.get(reverse('prestamos:prestamos'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('prestamos:prestamos'))
+        sql = next(c['sql'] for c in consultas.captured_queries if 'MAX(updated_at)' in c['sql'])
+        self.assertNotIn('COUNT', sql.upper())
+        self.assertIn('cambios_borrados', sql)
+
+    def test_archivar_cambia_el_etag_de_prestamos(self):
+        """Test que archivar préstamos, que no los elimina con el ORM, invalida el ETag del listado"""
+        prestamo = prestar(self.usuario, self.libro)
+        devolver(prestamo)
+        Prestamo.objects.filter(id=prestamo.id).update(fecha_prestamo=timezone.now() - timedelta(days=1000))
+        # Un préstamo posterior que queda: MAX(updated_at) no cambia al archivar
+        otro = Libro.objects.create(titulo="Ficciones", autor="Jorge Luis Borges", fecha_publicacion=date(1944, 1, 1))
+        prestar(self.usuario, otro)
+        url = reverse('prestamos:prestamos')
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        archivo.archivar(timezone.now() - timedelta(days=730))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Rayuela")
+
+    def test_prestamos_dependen_de_usuario_y_libro(self):
+        """Test que el ETag de préstamos cambia si cambia un usuario"""
+        prestar(self.usuario, self.libro)
+        url = reverse('prestamos:prestamos')
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.usuario.nombre = "Ana María"
+        self.usuario.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detalle(self):
+        """Test que el detalle responde 304 hasta que se edita el objeto"""
+        url = reverse('libros:editar_libro', args=[self.libro.id])
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.libro.autor = "J. Cortázar"
+        self.libro.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detalle_inexistente(self):
+        """Test que un objeto inexistente sigue respondiendo 404 sin validadores"""
+        response = self.client.get(reverse('usuarios:editar_usuario', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+    def test_formulario_sin_token_viejo(self):
+        """Test que una página con {% csrf_token %} no responde 304 si cambió la cookie CSRF"""
+        url = reverse('usuarios:editar_usuario', args=[self.usuario.id])
+        response = self.client.get(url)
+        self.assertNotIn('ETag', response)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        otro = Client()
+        otro.get(url)
+        response = otro.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'csrfmiddlewaretoken')
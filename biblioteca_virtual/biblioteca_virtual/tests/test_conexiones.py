@@ -0,0 +1,31 @@
+"""Tests para la configuración de conexiones y el comando benchmark_conexiones"""
+from datetime import date
+from io import StringIO
+from unittest import skipIf, skipUnless
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TransactionTestCase
+from libros.models import Libro
+
+
+class BenchmarkConexionesTest(TransactionTestCase):
+    """Tests para el comando benchmark_conexiones"""
+
+    # Sin la transacción de TestCase: el comando cierra la conexión entre modos
+
+    @skipIf(connection.vendor == 'postgresql', "Solo aplica a otras bases")
+    def test_requiere_postgresql(self):
+        """Test que el comando se niega a medir sobre otra base"""
+        with self.assertRaisesMessage(CommandError, "necesita PostgreSQL"):
+            call_command('benchmark_conexiones', peticiones=1, stdout=StringIO())
+
+    @skipUnless(connection.vendor == 'postgresql', "El benchmark necesita PostgreSQL")
+    def test_mide_ambos_modos(self):
+        """Test que mide con una conexión por petición y con conexiones persistentes"""
+        Libro.objects.create(titulo="Rayuela", autor="Julio Cortázar", fecha_publicacion=date(1963, 6, 28))
+        salida = StringIO()
+        call_command('benchmark_conexiones', peticiones=3, max_age=30, stdout=salida)
+        self.assertIn("una conexión por petición:", salida.getvalue())
+        self.assertIn("CONN_MAX_AGE=30:", salida.getvalue())
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 0)
@@ -0,0 +1,111 @@
+"""Tests para la vigilancia de consultas"""
+from datetime import date
+from django.conf import settings
+from django.http import HttpResponse
+from django.template import engines
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import ResolverMatch, resolve, reverse
+from biblioteca_virtual import consultas
+from libros.models import Libro
+from prestamos.models import Prestamo
+from prestamos.services import prestar
+from usuarios.models import Usuario
+
+
+class VigilanciaConsultasTest(consultas.VigilanciaConsultasMixin, TestCase):
+    """Tests para la vigilancia de N+1 y presupuestos de consultas"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        super().setUp()
+        self.factory = RequestFactory()
+        for i in range(4):
+            Usuario.objects.create(nombre=f"Usuario {i}", correo=f"usuario{i}@test.com", edad=30)
+
+    def vista_n_mas_uno(self, request):
+        """Recorre una relación por fila, desde el código y desde una plantilla"""
+        usuarios = list(Usuario.objects.all())
+        for usuario in usuarios:
+            usuario.prestamos.exists()
+        plantilla = engines['django'].from_string("{% for u in usuarios %}\n{{ u.prestamos.count }}{% endfor %}")
+        return HttpResponse(plantilla.render({'usuarios': usuarios}))
+
+    def pedir(self, vista, url_name='vista'):
+        request = self.factory.get('/vista/')
+
+        def get_response(request):
+            request.resolver_match = ResolverMatch(vista, (), {}, url_name=url_name)
+            return vista(request)
+
+        return consultas.VigilanciaConsultasMiddleware(get_response)(request)
+
+    def test_detecta_n_mas_uno_con_su_origen(self):
+        """Test que las sentencias repetidas se informan con la línea de código y de plantilla"""
+        with self.assertRaises(consultas.ConsultasExcesivas) as contexto:
+            self.pedir(self.vista_n_mas_uno)
+        mensaje = str(contexto.exception)
+        self.assertIn("GET vista", mensaje)
+        self.assertIn("posible N+1, 4 veces", mensaje)
+        self.assertIn("biblioteca_virtual/tests/test_consultas.py", mensaje)
+        self.assertIn("vista_n_mas_uno", mensaje)
+        # La consulta de la plantilla indica la línea del nodo que la hizo
+        self.assertIn(":2, biblioteca_virtual/tests/test_consultas.py", mensaje)
+
+    def test_presupuesto_de_la_vista(self):
+        """Test que una vista que supera su presupuesto falla aunque no repita consultas"""
+        @consultas.presupuesto(1)
+        def vista(request):
+            Usuario.objects.count()
+            Libro.objects.count()
+            return HttpResponse()
+
+        with self.assertRaisesMessage(consultas.ConsultasExcesivas, "2 consultas, el presupuesto es 1"):
+            self.pedir(vista)
+
+        vista.presupuesto_consultas = 2
+        self.assertEqual(self.pedir(vista).status_code, 200)
+
+    def test_presupuesto_atraviesa_los_decoradores(self):
+        """Test que el presupuesto declarado llega a la vista que resuelve la URL"""
+        self.assertEqual(resolve(reverse('libros:libros')).func.presupuesto_consultas, 2)
+        self.assertEqual(resolve(reverse('prestamos:crear_prestamos_lote')).func.presupuesto_consultas, 6)
+
+    @override_settings(QUERY_GUARD_REPEATS=10)
+    def test_umbral_de_repeticiones(self):
+        """Test que las repeticiones por debajo del umbral no se informan"""
+        self.assertEqual(self.pedir(self.vista_n_mas_uno).status_code, 200)
+
+    def test_modo_warn(self):
+        """Test que en modo warn se registra un aviso y la respuesta sigue"""
+        with override_settings(QUERY_GUARD='warn'), self.assertLogs('biblioteca_virtual.consultas', 'WARNING') as logs:
+            response = self.pedir(self.vista_n_mas_uno)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("posible N+1", logs.output[0])
+
+    def test_assert_consultas_vigiladas(self):
+        """Test que el mixin vigila bloques de código fuera de una vista"""
+        with self.assertConsultasVigiladas(maximo=1):
+            list(Prestamo.objects.select_related('usuario', 'libro'))
+
+        with self.assertRaisesMessage(AssertionError, "posible N+1"):
+            with self.assertConsultasVigiladas():
+                for usuario in Usuario.objects.all():
+                    list(usuario.prestamos.all())
+
+    def test_vistas_reales_sin_n_mas_uno(self):
+        """Test que los listados con filas relacionadas no repiten consultas"""
+        usuario = Usuario.objects.first()
+        for i in range(5):
+            libro = Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+            prestar(usuario, libro)
+        for url in ('prestamos:prestamos', 'usuarios:usuarios', 'libros:libros'):
+            self.assertEqual(self.client.get(reverse(url)).status_code, 200)
+
+
+class VigilanciaTestRunnerTest(TestCase):
+    """Tests para el modo de vigilancia de manage.py test"""
+
+    def test_tests_corren_en_modo_raise(self):
+        """Test que sin el mixin y con cualquier settings los tests usan QUERY_GUARD = 'raise'"""
+        self.assertEqual(settings.TEST_RUNNER, 'biblioteca_virtual.consultas.VigilanciaTestRunner')
+        self.assertEqual(settings.QUERY_GUARD, 'raise')
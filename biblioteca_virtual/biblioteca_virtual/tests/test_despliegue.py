@@ -0,0 +1,88 @@
+"""Tests para el comando preparar_despliegue"""
+import os
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from cambios.models import Metrica
+
+
+class PrepararDespliegueTest(TestCase):
+    """Tests para el comando preparar_despliegue"""
+
+    def test_migra_y_crea_superusuario(self):
+        """Test que el comando migra, crea la tabla de caché y el superusuario una sola vez"""
+        from django.contrib.auth.models import User
+        entorno = {
+            'DJANGO_SUPERUSER_USERNAME': 'bibliotecario',
+            'DJANGO_SUPERUSER_EMAIL': 'biblio@test.com',
+            'DJANGO_SUPERUSER_PASSWORD': 'secreta123',
+        }
+        with patch.dict(os.environ, entorno), patch('biblioteca_virtual.management.commands.preparar_despliegue.call_command') as llamar:
+            salida = StringIO()
+            call_command('preparar_despliegue', stdout=salida)
+            call_command('preparar_despliegue', stdout=salida)
+
+        self.assertEqual([c.args[0] for c in llamar.call_args_list], ['migrate', 'createcachetable'] * 2)
+        self.assertFalse(llamar.call_args_list[0].kwargs['interactive'])
+        usuario = User.objects.get(username='bibliotecario')
+        self.assertTrue(usuario.is_superuser)
+        self.assertTrue(usuario.check_password('secreta123'))
+        self.assertEqual(salida.getvalue().count("Superusuario creado"), 1)
+
+    def test_sin_superusuario_configurado(self):
+        """Test que sin DJANGO_SUPERUSER_USERNAME no se crea ningún usuario"""
+        from django.contrib.auth.models import User
+        with patch.dict(os.environ, {'DJANGO_SUPERUSER_USERNAME': ''}), \
+                patch('biblioteca_virtual.management.commands.preparar_despliegue.call_command'):
+            call_command('preparar_despliegue', stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+
+class PrepararDespliegueMigracionTest(TransactionTestCase):
+    """Tests para preparar_despliegue con migrate real y el bloqueo de PostgreSQL"""
+
+    @skipUnless(isinstance(settings.MIGRATION_MODULES, dict), "Los settings de test desactivan las migraciones")
+    def test_aplica_migraciones_pendientes(self):
+        """Test que el comando aplica de verdad las migraciones que faltan"""
+        from django.db.migrations.recorder import MigrationRecorder
+        call_command('migrate', 'cambios', '0002', verbosity=0)
+        self.assertNotIn(Metrica._meta.db_table, connection.introspection.table_names())
+        with patch.dict(os.environ, {'DJANGO_SUPERUSER_USERNAME': ''}):
+            call_command('preparar_despliegue', verbosity=0, stdout=StringIO())
+        self.assertIn(Metrica._meta.db_table, connection.introspection.table_names())
+        self.assertTrue(MigrationRecorder.Migration.objects.filter(app='cambios', name='0003_metrica').exists())
+
+    @skipUnless(connection.vendor == 'postgresql', "El bloqueo solo existe en PostgreSQL")
+    def test_bloqueo_de_transaccion(self):
+        """Test que el bloqueo se toma dentro de la transacción y no queda tomado en la conexión"""
+        from biblioteca_virtual.management.commands.preparar_despliegue import CLAVE_BLOQUEO
+        with patch.dict(os.environ, {'DJANGO_SUPERUSER_USERNAME': ''}), \
+                CaptureQueriesContext(connection) as consultas_hechas:
+            call_command('preparar_despliegue', verbosity=0, stdout=StringIO())
+        sentencias = [q['sql'] for q in consultas_hechas.captured_queries]
+        self.assertTrue(any('pg_advisory_xact_lock' in sql for sql in sentencias))
+        self.assertFalse(any('pg_advisory_lock' in sql for sql in sentencias))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+        # Mientras otra conexión tiene el bloqueo, el comando espera
+        otra = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            with otra.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", [CLAVE_BLOQUEO])
+            with connection.cursor() as cursor:
+                cursor.execute("SET lock_timeout = '200ms'")
+            try:
+                with self.assertRaisesMessage(OperationalError, 'lock timeout'):
+                    call_command('preparar_despliegue', verbosity=0, stdout=StringIO())
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute("RESET lock_timeout")
+        finally:
+            otra.close()
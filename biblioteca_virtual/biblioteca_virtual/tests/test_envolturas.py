@@ -0,0 +1,45 @@
+"""Tests para las envolturas de ejecución compartidas (biblioteca_virtual/envolturas.py)"""
+from django.db import connection
+from django.test import TestCase, override_settings
+from biblioteca_virtual import consultas, envolturas, metricas, perfilado
+from libros.models import Libro
+
+
+class EnvolturasTest(TestCase):
+    """Tests para la instalación de los execute_wrappers del proyecto"""
+
+    def test_una_sola_envoltura_por_conexion(self):
+        """Test que cada conexión tiene una envoltura del proyecto aunque se instale varias veces"""
+        envolturas.instalar_en_abiertas()
+        envolturas.instalar(connection)
+        self.assertEqual(connection.execute_wrappers.count(envolturas.ejecutar), 1)
+        for medir in (metricas._medir, consultas._registrar, perfilado._medir):
+            self.assertNotIn(medir, connection.execute_wrappers)
+
+    def test_solo_las_activas(self):
+        """Test que las funciones apagadas no envuelven las consultas"""
+        with override_settings(QUERY_GUARD='off', PROFILING_ENABLED=False):
+            self.assertEqual(envolturas.activas(), [metricas._medir])
+        with override_settings(QUERY_GUARD='warn', PROFILING_ENABLED=True):
+            self.assertEqual(
+                set(envolturas.activas()), {metricas._medir, consultas._registrar, perfilado._medir},
+            )
+
+    def test_la_consulta_pasa_por_las_activas(self):
+        """Test que una consulta pasa por las envolturas activas y no por las apagadas"""
+        llamadas = []
+
+        def activa(execute, sql, params, many, context):
+            llamadas.append('activa')
+            return execute(sql, params, many, context)
+
+        def apagada(execute, sql, params, many, context):
+            llamadas.append('apagada')
+            return execute(sql, params, many, context)
+
+        envolturas.registrar(activa)
+        envolturas.registrar(apagada, activa=lambda: False)
+        self.addCleanup(envolturas._envolturas.remove, (activa, None))
+        self.addCleanup(envolturas._envolturas.remove, envolturas._envolturas[-1])
+        self.assertEqual(Libro.objects.count(), 0)
+        self.assertEqual(llamadas, ['activa'])
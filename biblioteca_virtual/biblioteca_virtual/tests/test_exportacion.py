@@ -0,0 +1,115 @@
+"""Tests para la exportación en streaming (biblioteca_virtual/exportacion.py) y el comando exportar"""
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import date
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, Client
+from django.urls import reverse
+from biblioteca_virtual import exportacion
+from libros.models import Libro
+from prestamos.services import prestar
+from usuarios.models import Usuario
+
+
+class ExportacionTest(TestCase):
+    """Tests para la exportación en streaming y el comando exportar"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = Client()
+        self.usuario = Usuario.objects.create(nombre="Ana, la lectora", correo="ana@test.com", edad=30)
+        self.libros = [
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+            for i in range(5)
+        ]
+        self.prestamo = prestar(self.usuario, self.libros[0])
+
+    def contenido(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_exporta_csv_de_cada_modelo(self):
+        """Test que cada endpoint entrega un CSV con encabezado y todas las filas"""
+        for url, filas in (('libros:exportar_libros', 5), ('usuarios:exportar_usuarios', 1), ('prestamos:exportar_prestamos', 1)):
+            response = self.client.get(reverse(url))
+            self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+            self.assertIn('attachment', response['Content-Disposition'])
+            lineas = list(csv.reader(io.StringIO(self.contenido(response).decode())))
+            self.assertEqual(len(lineas), filas + 1)
+
+    def test_prestamos_incluyen_usuario_y_libro(self):
+        """Test que los préstamos traen las columnas de usuario y libro unidas"""
+        response = self.client.get(reverse('prestamos:exportar_prestamos'), {'formato': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        filas = [json.loads(linea) for linea in self.contenido(response).decode().splitlines()]
+        self.assertEqual(len(filas), 1)
+        self.assertEqual(filas[0]['usuario_nombre'], "Ana, la lectora")
+        self.assertEqual(filas[0]['libro_titulo'], "Libro 0")
+        self.assertEqual(filas[0]['libro_id'], self.libros[0].id)
+        self.assertIsNone(filas[0]['fecha_devolucion'])
+
+    def test_gzip_al_vuelo(self):
+        """Test que con gzip=1 la salida es un gzip válido con el mismo contenido"""
+        plano = self.contenido(self.client.get(reverse('libros:exportar_libros')))
+        response = self.client.get(reverse('libros:exportar_libros'), {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('libros.csv.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(self.contenido(response)), plano)
+
+    def test_primer_trozo_sin_consultar(self):
+        """Test que el encabezado CSV sale antes de ejecutar la consulta"""
+        response = self.client.get(reverse('libros:exportar_libros'), {'gzip': '1'})
+        with self.assertNumQueries(0):
+            primero = next(iter(response.streaming_content))
+        self.assertTrue(primero.startswith(b'\x1f\x8b'))
+
+    def test_lee_por_bloques(self):
+        """Test que las filas se producen en trozos del tamaño del bloque"""
+        trozos = list(exportacion.serializar('libros', 'csv', bloque=2))
+        self.assertEqual(trozos[0], 'id,titulo,autor,fecha_publicacion,en_prestamo\r\n')
+        self.assertEqual([t.count('\n') for t in trozos[1:]], [2, 2, 1])
+
+    def test_sin_cursores_del_servidor_lee_por_rangos(self):
+        """Test que con DISABLE_SERVER_SIDE_CURSORS se pide un rango de ids por bloque"""
+        with patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}):
+            with self.assertNumQueries(3):
+                trozos = list(exportacion.serializar('libros', 'csv', bloque=2))
+        self.assertEqual(''.join(trozos), ''.join(exportacion.serializar('libros', 'csv')))
+
+    def test_formato_invalido(self):
+        """Test que un formato desconocido responde 400"""
+        response = self.client.get(reverse('usuarios:exportar_usuarios'), {'formato': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_comando_exportar(self):
+        """Test que el comando escribe el archivo, comprimido si se pide"""
+        with tempfile.TemporaryDirectory() as directorio:
+            destino = os.path.join(directorio, 'prestamos.ndjson.gz')
+            salida = StringIO()
+            call_command('exportar', 'prestamos', formato='ndjson', gzip=True, salida=destino, stdout=salida)
+            with gzip.open(destino, 'rt', encoding='utf-8') as f:
+                filas = [json.loads(linea) for linea in f]
+        self.assertEqual([f['id'] for f in filas], [self.prestamo.id])
+        self.assertIn('exportados', salida.getvalue())
+
+    def test_comando_exportar_a_stdout(self):
+        """Test que sin --salida el comando escribe en el stdout de call_command"""
+        salida = StringIO()
+        call_command('exportar', 'libros', stdout=salida)
+        filas = list(csv.reader(StringIO(salida.getvalue())))
+        self.assertEqual(filas[1][1], "Libro 0")
+
+        binaria = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        call_command('exportar', 'libros', gzip=True, stdout=binaria)
+        self.assertEqual(gzip.decompress(binaria.buffer.getvalue()).decode(), salida.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('exportar', 'libros', gzip=True, stdout=StringIO())
@@ -0,0 +1,18 @@
+"""Tests para la caché por fila de los listados (biblioteca_virtual/fragmentos.py)"""
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from prestamos.models import Prestamo
+
+
+class BenchmarkFilasTest(TestCase):
+    """Tests para el comando benchmark_filas"""
+
+    def test_compara_render_completo_y_con_cache(self):
+        """Test que el comando mide los tres listados sin tocar la base de datos"""
+        salida = StringIO()
+        with self.assertNumQueries(0):
+            call_command('benchmark_filas', filas=20, repeticiones=2, stdout=salida)
+        for plantilla in ('users.html', 'listar_libros.html', 'listar_prestamos.html'):
+            self.assertIn(f"{plantilla} (20 filas)", salida.getvalue())
+        self.assertFalse(Prestamo.objects.exists())
@@ -0,0 +1,125 @@
+"""Tests para las métricas por ruta y el endpoint /metrics (biblioteca_virtual/metricas.py)"""
+from datetime import date
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from biblioteca_virtual import metricas
+from cambios.models import Metrica
+from libros.models import Libro
+from usuarios.models import Usuario
+
+
+# El hilo de envío del proceso no suma nada mientras corren estos tests
+@override_settings(METRICS_FLUSH_SECONDS=3600)
+class MetricasTest(TestCase):
+    """Tests para las métricas por ruta y el endpoint /metrics"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        metricas.registro = metricas.Registro()
+        # Sin lo que el hilo de envío sumó durante otros tests
+        Metrica.objects.all().delete()
+        self.client = Client()
+        self.usuario = Usuario.objects.create(nombre="Juan", correo="juan@test.com", edad=25)
+        self.libro = Libro.objects.create(titulo="Rayuela", autor="Cortázar", fecha_publicacion=date(1963, 6, 28))
+
+    def exportar(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_registra_latencia_consultas_y_tamano_por_ruta(self):
+        """Test que cada petición suma a los histogramas de su ruta"""
+        self.client.get(reverse('libros:libros'))
+        self.client.get(reverse('libros:libros'))
+        self.client.post(reverse('prestamos:crear_prestamo'), {'usuario': self.usuario.id, 'libro': self.libro.id})
+        texto = self.exportar()
+
+        etiquetas = 'route="libros:libros",method="GET"'
+        self.assertIn(f'biblioteca_http_requests_total{{{etiquetas},status="200"}} 2', texto)
+        self.assertIn(f'biblioteca_http_request_duration_seconds_count{{{etiquetas}}} 2', texto)
+        self.assertIn(f'biblioteca_http_request_duration_seconds_bucket{{{etiquetas},le="+Inf"}} 2', texto)
+        # La primera página hace consultas; la segunda sale de la caché sin ninguna
+        self.assertIn(f'biblioteca_db_queries_per_request_bucket{{{etiquetas},le="0"}} 1', texto)
+        self.assertIn(f'biblioteca_http_response_size_bytes_count{{{etiquetas}}} 2', texto)
+        self.assertIn('route="prestamos:crear_prestamo",method="POST",status="302"', texto)
+        self.assertIn('# TYPE biblioteca_db_duration_seconds histogram', texto)
+        vista = resolve(reverse('libros:libros')).func
+        etiquetas = f'view="{vista.__module__}.{vista.__name__}",result="aciertos"'
+        self.assertIn(f'biblioteca_list_cache_requests_total{{{etiquetas}}} 1', texto)
+
+    def test_cuenta_consultas_de_la_peticion(self):
+        """Test que el execute_wrapper cuenta las consultas de la petición y nada más"""
+        with self.assertNumQueries(2):
+            self.client.get(reverse('libros:libros'))
+        Libro.objects.count()
+        texto = self.exportar()
+        etiquetas = 'route="libros:libros",method="GET"'
+        self.assertIn(f'biblioteca_db_queries_per_request_sum{{{etiquetas}}} 2', texto)
+        self.assertIn(f'biblioteca_db_queries_per_request_bucket{{{etiquetas},le="1"}} 0', texto)
+        self.assertIn(f'biblioteca_db_queries_per_request_bucket{{{etiquetas},le="2"}} 1', texto)
+
+    def test_suma_los_procesos(self):
+        """Test que las observaciones de varios procesos se suman en los mismos contadores"""
+        procesos = [metricas.Registro(), metricas.Registro()]
+        for i, proceso in enumerate(procesos):
+            proceso.observar('libros:libros', 'GET', 200, {'biblioteca_http_request_duration_seconds': 0.02 * (i + 1)})
+            proceso.enviar(forzar=True)
+        texto = metricas.exportar()
+        etiquetas = 'route="libros:libros",method="GET"'
+        self.assertIn(f'biblioteca_http_requests_total{{{etiquetas},status="200"}} 2', texto)
+        self.assertIn(f'biblioteca_http_request_duration_seconds_bucket{{{etiquetas},le="0.025"}} 1', texto)
+        self.assertIn(f'biblioteca_http_request_duration_seconds_bucket{{{etiquetas},le="0.05"}} 2', texto)
+        self.assertIn(f'biblioteca_http_request_duration_seconds_sum{{{etiquetas}}} 0.06', texto)
+
+    def test_envia_por_intervalos(self):
+        """Test que las observaciones se acumulan en el proceso hasta el próximo envío"""
+        self.client.get(reverse('libros:libros'))
+        self.assertFalse(Metrica.objects.exists())
+        self.assertTrue(metricas._envio.is_alive())
+        metricas.registro.enviar(forzar=True)
+        clave = 'biblioteca_http_requests_total:libros:libros|GET|200'
+        self.assertEqual(Metrica.objects.get(clave=clave).valor, 1)
+
+    @override_settings(METRICS_FLUSH_SECONDS=0)
+    def test_la_peticion_no_envia(self):
+        """Test que la petición no escribe los contadores aunque toque un envío"""
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('libros:libros'))
+        self.assertFalse([c for c in consultas.captured_queries if 'cambios_metrica' in c['sql']])
+
+    def test_error_al_enviar(self):
+        """Test que si la base falla al enviar la petición responde igual y los contadores se envían después"""
+        with patch.object(Metrica, 'sumar', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.client.get(reverse('libros:libros')).status_code, 200)
+            with self.assertLogs('biblioteca_virtual.metricas', 'WARNING'):
+                metricas.registro.enviar(forzar=True)
+        self.assertFalse(Metrica.objects.exists())
+        metricas.registro.enviar(forzar=True)
+        clave = 'biblioteca_http_requests_total:libros:libros|GET|200'
+        self.assertEqual(Metrica.objects.get(clave=clave).valor, 1)
+
+    def test_envio_en_una_consulta(self):
+        """Test que un envío suma todos los contadores con una sola consulta"""
+        proceso = metricas.Registro()
+        proceso.observar('libros:libros', 'GET', 200, {'biblioteca_http_request_duration_seconds': 0.02})
+        with CaptureQueriesContext(connection) as consultas:
+            proceso.enviar(forzar=True)
+        self.assertEqual(len([c for c in consultas.captured_queries if 'cambios_metrica' in c['sql']]), 1)
+        proceso.observar('libros:libros', 'GET', 200, {'biblioteca_http_request_duration_seconds': 0.02})
+        proceso.enviar(forzar=True)
+        self.assertEqual(Metrica.objects.get(clave='biblioteca_http_requests_total:libros:libros|GET|200').valor, 2)
+
+    def test_metodo_y_ruta_desconocidos(self):
+        """Test que métodos y URLs arbitrarios no crean series nuevas"""
+        self.client.generic('BORRAR', reverse('libros:libros'))
+        self.client.get('/no-existe/')
+        texto = self.exportar()
+        self.assertIn('route="libros:libros",method="OTRO"', texto)
+        self.assertIn('route="sin_ruta",method="GET",status="404"', texto)
+        self.assertNotIn('BORRAR', texto)
@@ -0,0 +1,158 @@
+"""Tests para el perfilado bajo demanda"""
+import json
+import tempfile
+import time
+from datetime import date
+from unittest.mock import patch
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core import signing
+from django.core.cache import cache
+from django.test import TestCase, AsyncClient, Client, override_settings
+from django.urls import resolve, reverse
+from biblioteca_virtual import perfilado
+from libros.models import Libro
+
+
+class PerfiladoTest(TestCase):
+    """Tests para el perfilado bajo demanda del personal"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        from django.contrib.auth.models import User
+        cache.clear()
+        directorio = tempfile.mkdtemp()
+        ajustes = override_settings(PROFILING_DIR=directorio, PROFILING_SAMPLE_INTERVAL_MS=1)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.staff = User.objects.create_user('bibliotecaria', password='x', is_staff=True)
+        self.lector = User.objects.create_user('lector', password='x')
+        self.client = Client()
+        self.client.force_login(self.staff)
+        self.url = reverse('libros:buscar_libros')
+        Libro.objects.create(titulo="Rayuela", autor="Cortázar", fecha_publicacion=date(1963, 6, 28))
+
+    def perfilar(self, cliente=None, firma=None, **extra):
+        cliente = cliente or self.client
+        return cliente.get(self.url, {'q': 'rayuela', '_perfilar': firma or perfilado.firma(self.staff)}, **extra)
+
+    def test_perfila_la_peticion(self):
+        """Test que una petición firmada de staff guarda pstats, pilas y SQL"""
+        import pstats
+        response = self.perfilar()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['libros']), 1)
+        perfil = response['X-Perfil']
+
+        almacen = perfilado.almacen()
+        estadisticas = pstats.Stats(almacen.path(f"{perfil}.pstats"))
+        vista = resolve(self.url).func
+        if not iscoroutinefunction(vista):
+            # Las vistas async corren en otro hilo, fuera de cProfile
+            self.assertTrue(any(funcion[2] == vista.__name__ for funcion in estadisticas.stats))
+        with almacen.open(f"{perfil}.sql.json") as archivo:
+            datos = json.load(archivo)
+        self.assertEqual(datos['ruta'], self.url)
+        self.assertEqual(datos['usuario'], 'bibliotecaria')
+        self.assertTrue(any('libros_libro' in c['sql'] for c in datos['consultas']))
+        self.assertNotIn('rayuela', json.dumps(datos['consultas']).lower())
+        with almacen.open(f"{perfil}.pilas.txt") as archivo:
+            for linea in archivo.read().decode().splitlines():
+                pila, muestras = linea.rsplit(' ', 1)
+                self.assertTrue(int(muestras) > 0 and ';' in pila)
+
+    def test_cabecera(self):
+        """Test que la firma también se acepta en la cabecera X-Perfilar"""
+        response = self.client.get(self.url, {'q': 'rayuela'}, HTTP_X_PERFILAR=perfilado.firma(self.staff))
+        self.assertIn('X-Perfil', response)
+
+    def test_solo_staff_con_su_firma(self):
+        """Test que sin sesión de staff o con una firma ajena o alterada no se perfila"""
+        lector = Client()
+        lector.force_login(self.lector)
+        anonimo = Client()
+        casos = [
+            self.perfilar(lector, perfilado.firma(self.lector)),
+            self.perfilar(lector, perfilado.firma(self.staff)),
+            self.perfilar(anonimo),
+            self.perfilar(firma=perfilado.firma(self.staff) + 'x'),
+            self.perfilar(firma=perfilado.firma(self.lector)),
+        ]
+        for response in casos:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Perfil', response)
+        self.assertEqual(perfilado._perfiles(), [])
+
+        with override_settings(PROFILING_ENABLED=False):
+            self.assertNotIn('X-Perfil', self.perfilar())
+
+    @override_settings(PROFILING_TOKEN_MAX_AGE=60)
+    def test_firma_vencida(self):
+        """Test que la firma vence"""
+        firma = perfilado.firma(self.staff)
+        with patch('django.core.signing.time.time', return_value=time.time() + 120):
+            self.assertNotIn('X-Perfil', self.perfilar(firma=firma))
+
+    @override_settings(PROFILING_MAX_PER_HOUR=2, PROFILING_KEEP=1)
+    def test_limites(self):
+        """Test que se respeta el cupo por hora y solo se conservan los últimos perfiles"""
+        primero = self.perfilar()['X-Perfil']
+        segundo = self.perfilar()['X-Perfil']
+        tercero = self.perfilar()
+        self.assertNotIn('X-Perfil', tercero)
+        self.assertEqual(tercero['X-Perfil-Omitido'], 'limite')
+        self.assertEqual(perfilado._perfiles(), [max(primero, segundo)])
+
+    def test_un_perfil_a_la_vez(self):
+        """Test que mientras hay un perfil en curso en el proceso los demás se omiten"""
+        with perfilado._en_curso:
+            response = self.perfilar()
+        self.assertEqual(response['X-Perfil-Omitido'], 'ocupado')
+
+    def test_listado_y_descarga(self):
+        """Test que el personal ve su firma y descarga los archivos de cada perfil"""
+        perfil = self.perfilar()['X-Perfil']
+        datos = self.client.get(reverse('perfiles')).json()
+        self.assertEqual(signing.loads(datos['firma'], salt=perfilado.SAL), self.staff.pk)
+        self.assertEqual([p['id'] for p in datos['perfiles']], [perfil])
+        self.assertGreater(datos['perfiles'][0]['cantidad_consultas'], 0)
+
+        # sql.json y no pilas.txt: una petición más corta que el intervalo de
+        # muestreo deja el archivo de pilas vacío
+        response = self.client.get(datos['perfiles'][0]['archivos']['sql.json'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        # Leer el archivo y no response.close(): close() emite request_finished,
+        # que fuera del cliente de test cierra la conexión a la base
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['id'], perfil)
+        self.assertEqual(self.client.get(reverse('descargar_perfil', args=['..settings.py'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('descargar_perfil', args=['20250101000000-00000000.pstats'])).status_code, 404)
+
+        lector = Client()
+        lector.force_login(self.lector)
+        self.assertEqual(lector.get(reverse('perfiles')).status_code, 302)
+        self.assertEqual(lector.get(datos['perfiles'][0]['archivos']['pstats']).status_code, 302)
+
+    async def test_asgi_no_se_perfila(self):
+        """Test que con ASGI la petición sigue sin perfilar e indica el motivo"""
+        cliente = AsyncClient()
+        await sync_to_async(cliente.force_login)(self.staff)
+        firma = await sync_to_async(perfilado.firma)(self.staff)
+        response = await cliente.get(self.url, {'q': 'rayuela', '_perfilar': firma})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Perfil-Omitido'], 'asgi')
+
+    def test_muestreador(self):
+        """Test que el muestreador arma pilas colapsadas del hilo observado"""
+        import threading
+
+        def trabajar(fin):
+            while time.monotonic() < fin:
+                pass
+
+        muestreador = perfilado.Muestreador(threading.get_ident())
+        muestreador.start()
+        trabajar(time.monotonic() + 0.05)
+        muestreador.detener.set()
+        muestreador.join()
+        self.assertTrue(muestreador.pilas)
+        self.assertTrue(any(pila.split(';')[-1].startswith('trabajar (biblioteca_virtual/tests/test_perfilado.py:') for pila in muestreador.pilas))
@@ -0,0 +1,139 @@
+"""Tests para el router de réplicas de lectura (biblioteca_virtual/replicas.py)"""
+from datetime import date
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.test import TransactionTestCase, Client, RequestFactory, override_settings
+from django.urls import reverse
+from biblioteca_virtual import replicas
+from libros.models import Libro
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'],
+    DATABASE_ROUTERS=['biblioteca_virtual.replicas.RouterReplicas'],
+    REPLICA_STICKY_SECONDS=5,
+)
+class ReplicasTest(TransactionTestCase):
+    """Tests para el router de réplicas de lectura (una segunda base de test como réplica)"""
+
+    # Sin la transacción de TestCase: dentro de un atomic el router usa default
+
+    # La réplica no está en DATABASES: la crea la clase con la configuración de
+    # default (otra base :memory: en SQLite, test_<nombre> en PostgreSQL), así
+    # los chequeos del runner no la buscan con ningún settings
+    databases = {'default'}
+
+    @classmethod
+    def setUpClass(cls):
+        """Crea la base de la réplica antes de activar el router, que no la migraría"""
+        principal = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings['replica'] = {**principal, 'TEST': {**principal['TEST'], 'NAME': None, 'MIRROR': None}}
+        cls.nombre_replica = connections['replica'].settings_dict['NAME']
+        connections['replica'].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.databases = {'default', 'replica'}
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._eliminar_replica()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._eliminar_replica()
+
+    @classmethod
+    def _eliminar_replica(cls):
+        connections['replica'].creation.destroy_test_db(cls.nombre_replica, verbosity=0)
+        del connections['replica']
+        del connections.settings['replica']
+        cls.databases = {'default'}
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        self.client = Client()
+        self.primaria = Libro.objects.create(titulo="Solo en primaria", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+        Libro.objects.using('replica').create(titulo="Solo en réplica", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+
+    def tearDown(self):
+        """Borra los libros con el ORM para que las señales limpien los índices de búsqueda"""
+        for alias in self.databases:
+            Libro.objects.using(alias).all().delete()
+
+    def test_listados_leen_de_la_replica(self):
+        """Test que los listados, búsquedas y exportaciones leen de la réplica"""
+        response = self.client.get(reverse('libros:libros'))
+        self.assertContains(response, "Solo en réplica")
+        self.assertNotContains(response, "Solo en primaria")
+
+        response = self.client.get(reverse('libros:buscar_libros'), {'q': 'solo'})
+        self.assertEqual([l.titulo for l in response.context['libros']], ["Solo en réplica"])
+
+        response = self.client.get(reverse('libros:exportar_libros'))
+        contenido = b''.join(response.streaming_content).decode()
+        self.assertIn("Solo en réplica", contenido)
+        self.assertNotIn("Solo en primaria", contenido)
+
+    def test_vistas_sin_marcar_leen_de_default(self):
+        """Test que las vistas de edición leen de la base principal"""
+        response = self.client.get(reverse('libros:editar_libro', args=[self.primaria.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+
+    def test_lee_lo_propio_despues_de_escribir(self):
+        """Test que después de escribir el cliente lee de default durante un tiempo"""
+        response = self.client.post(reverse('libros:crear_libro'), {
+            'titulo': 'Recién creado', 'autor': 'Autor', 'fecha_publicacion': '2001-01-01',
+        })
+        self.assertEqual(response.cookies[replicas.COOKIE]['max-age'], 5)
+
+        response = self.client.get(reverse('libros:libros'))
+        self.assertContains(response, "Recién creado")
+        self.assertContains(response, "Solo en primaria")
+
+        otro = Client()
+        self.assertNotContains(otro.get(reverse('libros:libros')), "Recién creado")
+
+    def test_cache_de_listados_con_replicas(self):
+        """Test que quien acaba de escribir no usa la caché y que no se guardan páginas de una réplica recién cambiada"""
+        url = reverse('libros:libros')
+        response = self.client.post(reverse('libros:crear_libro'), {
+            'titulo': 'Recién creado', 'autor': 'Autor', 'fecha_publicacion': '2001-01-01',
+        })
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertNotIn('X-Cache', response)
+            self.assertContains(response, "Recién creado")
+
+        # La réplica todavía no tiene el libro nuevo: su página no se guarda
+        otro = Client()
+        for _ in range(2):
+            response = otro.get(url)
+            self.assertEqual(response['X-Cache'], 'MISS')
+            self.assertNotContains(response, "Recién creado")
+
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            otro.get(url)
+            self.assertEqual(otro.get(url)['X-Cache'], 'HIT')
+
+    def test_transacciones_leen_de_default(self):
+        """Test que dentro de transaction.atomic se lee de default aunque la vista sea de lectura"""
+        @replicas.lectura
+        def vista(request):
+            fuera = router.db_for_read(Libro)
+            with transaction.atomic():
+                dentro = router.db_for_read(Libro)
+            return fuera, dentro
+
+        self.assertEqual(vista(RequestFactory().get('/')), ('replica', 'default'))
+        self.assertEqual(router.db_for_write(Libro), 'default')
+
+    def test_otros_modelos_no_se_enrutan(self):
+        """Test que las sesiones y la caché en base de datos no van a la réplica"""
+        @replicas.lectura
+        def vista(request):
+            return router.db_for_read(Session)
+
+        self.assertEqual(vista(RequestFactory().get('/')), 'default')
@@ -0,0 +1,110 @@
+"""Tests para las vistas async (ASYNC_VIEWS) y el comando benchmark_asgi"""
+import importlib
+from datetime import date
+from io import StringIO
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from libros.models import Libro
+from prestamos.models import Prestamo
+from prestamos.services import prestar
+from usuarios.models import Usuario
+
+
+def _recargar_urls():
+    """Vuelve a importar los URLconf para que tomen el valor actual de ASYNC_VIEWS"""
+    import biblioteca_virtual.urls
+    import libros.urls
+    import prestamos.urls
+    import usuarios.urls
+    for modulo in (libros.urls, usuarios.urls, prestamos.urls, biblioteca_virtual.urls):
+        importlib.reload(modulo)
+    clear_url_caches()
+
+
+class VistasAsyncTest(TestCase):
+    """Tests para las vistas async de lectura (ASYNC_VIEWS)"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ajustes = override_settings(ASYNC_VIEWS=True)
+        cls.ajustes.enable()
+        _recargar_urls()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ajustes.disable()
+        _recargar_urls()
+        super().tearDownClass()
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.libro = Libro.objects.create(titulo="Rayuela", autor="Julio Cortázar", fecha_publicacion=date(1963, 6, 28))
+        self.prestamo = prestar(self.usuario, self.libro)
+
+    def test_rutas_async(self):
+        """Test que el switch cambia solo las vistas de lectura"""
+        for nombre in ('libros:libros', 'libros:buscar_libros', 'libros:autocompletar_libros',
+                       'usuarios:usuarios', 'usuarios:autocompletar_usuarios', 'prestamos:prestamos'):
+            self.assertTrue(iscoroutinefunction(resolve(reverse(nombre)).func), nombre)
+        self.assertTrue(iscoroutinefunction(resolve(reverse('libros:editar_libro', args=[1])).func))
+        self.assertFalse(iscoroutinefunction(resolve(reverse('libros:crear_libro')).func))
+
+    async def test_listados(self):
+        """Test que los listados async muestran las filas y usan la caché y los validadores"""
+        # El listado de préstamos lleva token CSRF: se guarda recién desde la segunda visita
+        for url, texto, visitas in ((reverse('libros:libros'), "Rayuela", 1), (reverse('usuarios:usuarios'), "Ana", 1),
+                                    (reverse('prestamos:prestamos') + '?estado=activos', "Rayuela", 2)):
+            for _ in range(visitas):
+                response = await self.async_client.get(url)
+                self.assertContains(response, texto)
+                self.assertEqual(response['X-Cache'], 'MISS')
+            self.assertEqual((await self.async_client.get(url))['X-Cache'], 'HIT')
+            response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_busqueda_y_autocompletado(self):
+        """Test que la búsqueda y los autocompletados async devuelven resultados"""
+        response = await self.async_client.get(reverse('usuarios:autocompletar_usuarios'), {'q': 'an'})
+        self.assertEqual(response.json()['resultados'], [{'id': self.usuario.id, 'texto': str(self.usuario)}])
+        await Prestamo.objects.filter(id=self.prestamo.id).aupdate(fecha_devolucion=timezone.now())
+        await Libro.objects.filter(id=self.libro.id).aupdate(en_prestamo=False)
+        response = await self.async_client.get(reverse('libros:autocompletar_libros'), {'q': 'ray'})
+        self.assertEqual([r['id'] for r in response.json()['resultados']], [self.libro.id])
+        response = await self.async_client.get(reverse('libros:buscar_libros'), {'q': 'rayuela'})
+        self.assertEqual([l.titulo for l in response.context['libros']], ["Rayuela"])
+
+    async def test_detalle(self):
+        """Test que el detalle async responde, valida y sigue aceptando el POST de edición"""
+        url = reverse('libros:editar_libro', args=[self.libro.id])
+        response = await self.async_client.get(url)
+        self.assertContains(response, "Rayuela")
+        response = await self.async_client.get(url)
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.post(url, {
+            'titulo': 'Rayuela', 'autor': 'J. Cortázar', 'fecha_publicacion': '1963-06-28', 'en_prestamo': True,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual((await Libro.objects.aget(id=self.libro.id)).autor, "J. Cortázar")
+
+        response = await self.async_client.get(reverse('usuarios:editar_usuario', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class BenchmarkAsgiTest(TestCase):
+    """Tests para el comando benchmark_asgi"""
+
+    def test_compara_asgi_y_wsgi(self):
+        """Test que el comando mide los dos modos"""
+        salida = StringIO()
+        call_command('benchmark_asgi', peticiones=4, clientes=2, hilos=2, latencia=0, stdout=salida)
+        self.assertIn("ASGI, 2 clientes", salida.getvalue())
+        self.assertIn("WSGI, 2 hilos", salida.getvalue())
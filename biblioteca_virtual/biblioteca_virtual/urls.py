@@ -18,11 +18,16 @@ from django.contrib import admin
 from django.urls import path, include
 from usuarios import views
 from django.shortcuts import render
+from biblioteca_virtual import metricas, perfilado
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('admin/', admin.site.urls),
     path('usuarios/', include('usuarios.urls')),
     path('libros/', include('libros.urls')),
-    path('prestamos/', include('prestamos.urls'))
+    path('prestamos/', include('prestamos.urls')),
+    path('cambios/', include('cambios.urls')),
+    path('metrics', metricas.metricas, name='metrics'),
+    path('perfiles/', perfilado.perfiles, name='perfiles'),
+    path('perfiles/<str:archivo>', perfilado.descargar, name='descargar_perfil'),
 ]
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CambiosConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cambios'
+
+    def ready(self):
+        from . import signals
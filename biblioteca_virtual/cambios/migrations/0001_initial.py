@@ -0,0 +1,28 @@
+# Generated by Django 4.2.26 on 2026-10-16 22:33
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Eliminaciones',
+                'indexes': [models.Index(fields=['modelo', 'fecha', 'id'], name='eliminacion_modelo_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-16 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cambios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Borrados',
+            fields=[
+                ('modelo', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('cantidad', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Borrados',
+            },
+        ),
+    ]
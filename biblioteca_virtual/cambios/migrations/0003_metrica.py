@@ -0,0 +1,20 @@
+# Generated by Django 4.2.26 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cambios', '0002_borrados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Metrica',
+            fields=[
+                ('clave', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
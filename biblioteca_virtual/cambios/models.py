@@ -0,0 +1,91 @@
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+class Eliminacion(models.Model):
+  """Marca de un objeto eliminado, para que el feed de cambios avise a los clientes"""
+  modelo = models.CharField(max_length=100)
+  objeto_id = models.BigIntegerField()
+  fecha = models.DateTimeField(default=timezone.now)
+
+  def __str__(self):
+    return f"{self.modelo} {self.objeto_id} ({self.fecha})"
+
+  class Meta:
+    verbose_name_plural = "Eliminaciones"
+    indexes = [
+      models.Index(fields=["modelo", "fecha", "id"], name="eliminacion_modelo_fecha_idx"),
+    ]
+
+
+class Borrados(models.Model):
+  """
+  Cuántas filas de cada modelo se borraron o archivaron. Un borrado no cambia
+  MAX(updated_at); con este contador los validadores de los listados
+  (condicional.estado_listado) lo detectan leyendo una fila por clave.
+  """
+  modelo = models.CharField(max_length=100, primary_key=True)
+  cantidad = models.BigIntegerField(default=0)
+
+  def __str__(self):
+    return f"{self.modelo}: {self.cantidad}"
+
+  class Meta:
+    verbose_name_plural = "Borrados"
+
+  @classmethod
+  def sumar(cls, modelo, cantidad=1, using=DEFAULT_DB_ALIAS):
+    """UPDATE cantidad = cantidad + n del contador de ``modelo``, creándolo la primera vez"""
+    filas = cls.objects.using(using).filter(modelo=modelo._meta.label_lower)
+    if filas.update(cantidad=F('cantidad') + cantidad):
+      return
+    try:
+      with transaction.atomic(using=using):
+        cls.objects.using(using).create(modelo=modelo._meta.label_lower, cantidad=cantidad)
+    except IntegrityError:
+      # Otro proceso lo creó en el medio
+      filas.update(cantidad=F('cantidad') + cantidad)
+
+
+class Metrica(models.Model):
+  """
+  Contadores de /metrics (biblioteca_virtual.metricas), sumados por todos los
+  procesos. Van en su tabla y no en la caché: DatabaseCache suma con un get y
+  un set (dos procesos pierden incrementos) y sus entradas se descartan al
+  llenarse, junto con las de los listados.
+  """
+  clave = models.CharField(max_length=255, primary_key=True)
+  valor = models.BigIntegerField(default=0)
+
+  def __str__(self):
+    return f"{self.clave}: {self.valor}"
+
+  @classmethod
+  def sumar(cls, valores, using=DEFAULT_DB_ALIAS):
+    """Suma ``valores`` ({clave: n}) a los contadores con UPDATE valor = valor + n, creando los que falten"""
+    connection = connections[using]
+    # Siempre en el mismo orden, para que dos procesos no se bloqueen entre sí
+    claves = sorted(valores)
+    # Todo o nada: quien llama vuelve a enviar los valores si esto falla
+    with transaction.atomic(using=using):
+      if connection.vendor not in ('postgresql', 'sqlite'):
+        for clave in claves:
+          filas = cls.objects.using(using).filter(clave=clave)
+          if filas.update(valor=F('valor') + valores[clave]):
+            continue
+          try:
+            with transaction.atomic(using=using):
+              cls.objects.using(using).create(clave=clave, valor=valores[clave])
+          except IntegrityError:
+            filas.update(valor=F('valor') + valores[clave])
+        return
+
+      tabla = connection.ops.quote_name(cls._meta.db_table)
+      with connection.cursor() as cursor:
+        for i in range(0, len(claves), 400):
+          lote = claves[i:i + 400]
+          cursor.execute(
+            f"INSERT INTO {tabla} (clave, valor) VALUES {', '.join(['(%s, %s)'] * len(lote))} "
+            f"ON CONFLICT (clave) DO UPDATE SET valor = {tabla}.valor + excluded.valor",
+            [dato for clave in lote for dato in (clave, valores[clave])],
+          )
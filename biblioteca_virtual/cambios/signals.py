@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete
+from libros.models import Libro
+from usuarios.models import Usuario
+from prestamos.models import Prestamo
+from .models import Borrados, Eliminacion
+
+
+def registrar_eliminacion(sender, instance, using, **kwargs):
+  Eliminacion.objects.using(using).create(modelo=sender._meta.label_lower, objeto_id=instance.pk)
+  Borrados.sumar(sender, using=using)
+
+
+for modelo in (Libro, Usuario, Prestamo):
+  post_delete.connect(registrar_eliminacion, sender=modelo, dispatch_uid=f"eliminacion_{modelo._meta.label_lower}")
@@ -0,0 +1,145 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date, timedelta
+from libros.models import Libro
+from usuarios.models import Usuario
+from prestamos.models import Prestamo
+from prestamos.services import prestar, devolver, marcar_vencidos
+from biblioteca_virtual.paginacion import codificar_cursor
+from .models import Borrados, Eliminacion
+
+
+@override_settings(CHANGE_FEED_DELAY=0)
+class FeedCambiosTest(TestCase):
+    """Tests para el feed de cambios"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = Client()
+        self.url = reverse('cambios:cambios', args=['libros'])
+        self.libros = [
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+            for i in range(5)
+        ]
+
+    def sincronizar(self, url, **params):
+        """Recorre el feed hasta el final y devuelve (cambios, eliminados, cursor)"""
+        cambios, eliminados = [], []
+        while True:
+            datos = self.client.get(url, params).json()
+            cambios.extend(datos['cambios'])
+            eliminados.extend(datos['eliminados'])
+            params['cursor'] = datos['cursor']
+            if not datos['hay_mas']:
+                return cambios, eliminados, datos['cursor']
+
+    def test_primera_sincronizacion_trae_todo(self):
+        """Test que sin cursor se recorren todas las filas por páginas acotadas"""
+        response = self.client.get(self.url, {'limite': 2})
+        datos = response.json()
+        self.assertEqual(len(datos['cambios']), 2)
+        self.assertTrue(datos['hay_mas'])
+
+        cambios, eliminados, _ = self.sincronizar(self.url, limite=2)
+        self.assertEqual([c['id'] for c in cambios], [l.id for l in self.libros])
+        self.assertEqual(eliminados, [])
+        self.assertEqual(cambios[0]['titulo'], "Libro 0")
+
+    def test_solo_cambios_posteriores_al_cursor(self):
+        """Test que con el cursor de la sincronización anterior solo llega lo modificado"""
+        _, _, cursor = self.sincronizar(self.url)
+        datos = self.client.get(self.url, {'cursor': cursor}).json()
+        self.assertEqual(datos['cambios'], [])
+        self.assertEqual(datos['cursor'], cursor)
+
+        self.libros[3].titulo = "Libro 3 (corregido)"
+        self.libros[3].save()
+        cambios, _, _ = self.sincronizar(self.url, cursor=cursor)
+        self.assertEqual([(c['id'], c['titulo']) for c in cambios], [(self.libros[3].id, "Libro 3 (corregido)")])
+
+    def test_updates_de_servicios_aparecen(self):
+        """Test que los préstamos y devoluciones (UPDATE directos) llegan al feed"""
+        usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        _, _, cursor = self.sincronizar(self.url)
+        prestamo = prestar(usuario, self.libros[1])
+
+        cambios, _, cursor = self.sincronizar(self.url, cursor=cursor)
+        self.assertEqual([(c['id'], c['en_prestamo']) for c in cambios], [(self.libros[1].id, True)])
+
+        url = reverse('cambios:cambios', args=['prestamos'])
+        _, _, cursor_prestamos = self.sincronizar(url)
+        devolver(prestamo)
+        cambios, _, _ = self.sincronizar(url, cursor=cursor_prestamos)
+        self.assertEqual(len(cambios), 1)
+        self.assertIsNotNone(cambios[0]['fecha_devolucion'])
+
+    def test_marca_de_vencido_aparece(self):
+        """Test que el feed envía la marca que deja marcar_vencidos junto con el vencimiento"""
+        usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        prestamo = prestar(usuario, self.libros[1])
+        url = reverse('cambios:cambios', args=['prestamos'])
+        cambios, _, cursor = self.sincronizar(url)
+        self.assertIsNone(cambios[0]['marcado_vencido'])
+        self.assertIsNotNone(cambios[0]['fecha_vencimiento'])
+
+        self.assertEqual(marcar_vencidos(prestamo.fecha_vencimiento + timedelta(days=1)), 1)
+        cambios, _, _ = self.sincronizar(url, cursor=cursor)
+        self.assertEqual([c['id'] for c in cambios], [prestamo.id])
+        self.assertIsNotNone(cambios[0]['marcado_vencido'])
+
+    def test_eliminaciones(self):
+        """Test que las vistas de eliminación dejan una marca que llega al feed"""
+        _, _, cursor = self.sincronizar(self.url)
+        self.client.get(reverse('libros:eliminar_libro', args=[self.libros[0].id]))
+        cambios, eliminados, _ = self.sincronizar(self.url, cursor=cursor)
+        self.assertEqual(cambios, [])
+        self.assertEqual([e['id'] for e in eliminados], [self.libros[0].id])
+
+        usuario = Usuario.objects.create(nombre="Luis", correo="luis@test.com", edad=40)
+        url = reverse('cambios:cambios', args=['usuarios'])
+        _, _, cursor = self.sincronizar(url)
+        self.client.get(reverse('usuarios:eliminar_usuario', args=[usuario.id]))
+        _, eliminados, _ = self.sincronizar(url, cursor=cursor)
+        self.assertEqual([e['id'] for e in eliminados], [usuario.id])
+        self.assertEqual(Eliminacion.objects.filter(modelo='libros.libro').count(), 1)
+        self.assertEqual(
+            dict(Borrados.objects.values_list('modelo', 'cantidad')),
+            {'libros.libro': 1, 'usuarios.usuario': 1},
+        )
+
+    def test_fechas_iguales_no_se_pierden(self):
+        """Test que las filas con el mismo updated_at se desempatan por id entre páginas"""
+        ahora = timezone.now() - timedelta(seconds=1)
+        Libro.objects.update(updated_at=ahora)
+        cambios, _, _ = self.sincronizar(self.url, limite=2)
+        self.assertEqual([c['id'] for c in cambios], [l.id for l in self.libros])
+
+    @override_settings(CHANGE_FEED_DELAY=60)
+    def test_margen_retiene_cambios_recientes(self):
+        """Test que los cambios más nuevos que el margen se publican después"""
+        datos = self.client.get(self.url).json()
+        self.assertEqual(datos['cambios'], [])
+
+    @override_settings(CHANGE_FEED_PAGE_SIZE=3)
+    def test_limite_acotado(self):
+        """Test que el límite pedido no supera el máximo configurado"""
+        datos = self.client.get(self.url, {'limite': 1000}).json()
+        self.assertEqual(len(datos['cambios']), 3)
+
+    def test_cursor_invalido(self):
+        """Test que un cursor inválido o de otro recurso responde 400"""
+        self.assertEqual(self.client.get(self.url, {'cursor': 'no-es-un-cursor'}).status_code, 400)
+        otro = codificar_cursor('usuarios', [None, None, None, None])
+        self.assertEqual(self.client.get(self.url, {'cursor': otro}).status_code, 400)
+
+    def test_recurso_desconocido(self):
+        """Test que un recurso que no existe responde 404"""
+        response = self.client.get(reverse('cambios:cambios', args=['autores']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_consultas_acotadas(self):
+        """Test que cada página cuesta dos consultas sin importar la cantidad de filas"""
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'limite': 2})
+        self.assertFalse(Prestamo.objects.exists())
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'cambios'
+
+urlpatterns = [
+    path('<str:recurso>/', views.cambios, name='cambios'),
+]
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from biblioteca_virtual.paginacion import codificar_cursor, decodificar_cursor
+from .models import Eliminacion
+
+# recurso -> (modelo, columnas que se envían)
+RECURSOS = {
+  'libros': ('libros.Libro', ('id', 'titulo', 'autor', 'fecha_publicacion', 'en_prestamo', 'updated_at')),
+  'usuarios': ('usuarios.Usuario', ('id', 'nombre', 'correo', 'edad', 'fecha_registro', 'activo', 'updated_at')),
+  'prestamos': ('prestamos.Prestamo', (
+    'id', 'usuario_id', 'libro_id', 'fecha_prestamo', 'fecha_devolucion',
+    'fecha_vencimiento', 'marcado_vencido', 'updated_at',
+  )),
+}
+
+_FECHA = models.DateTimeField()
+
+
+def _posicion(valores):
+  """(fecha, id) del último elemento enviado de una lista, o None si todavía no se envió ninguno"""
+  fecha, id = valores
+  if fecha is None:
+    return None
+  return _FECHA.to_python(fecha), int(id)
+
+
+def _leer(queryset, campo, posicion, hasta, limite):
+  """Hasta ``limite`` filas posteriores a ``posicion`` por (campo, id), sobre el índice de ``campo``"""
+  queryset = queryset.filter(**{f"{campo}__lte": hasta})
+  if posicion is not None:
+    fecha, id = posicion
+    queryset = queryset.filter(Q(**{f"{campo}__gt": fecha}) | Q(**{campo: fecha, 'id__gt': id}))
+  filas = list(queryset.order_by(campo, 'id')[:limite + 1])
+  return filas[:limite], len(filas) > limite
+
+
+@require_GET
+def cambios(request, recurso):
+  """
+  Feed de cambios para sincronizar clientes. Devuelve las filas modificadas y
+  los ids eliminados después del ``cursor`` (opaco, el de la respuesta
+  anterior; sin cursor se empieza desde el principio), hasta ``limite`` de
+  cada tipo. El cliente repite con el nuevo cursor mientras ``hay_mas``.
+  """
+  if recurso not in RECURSOS:
+    raise Http404("Recurso desconocido")
+  nombre_modelo, columnas = RECURSOS[recurso]
+  modelo = apps.get_model(nombre_modelo)
+
+  maximo = settings.CHANGE_FEED_PAGE_SIZE
+  try:
+    limite = min(max(int(request.GET.get('limite', maximo)), 1), maximo)
+  except ValueError:
+    limite = maximo
+
+  posicion_cambios = posicion_eliminados = None
+  cursor = request.GET.get('cursor')
+  if cursor:
+    try:
+      nombre, valores, _ = decodificar_cursor(cursor)
+      if nombre != recurso or len(valores) != 4:
+        raise ValueError("Cursor de otro recurso")
+      posicion_cambios, posicion_eliminados = _posicion(valores[:2]), _posicion(valores[2:])
+    except (ValueError, TypeError, ValidationError):
+      return JsonResponse({'error': "Cursor inválido."}, status=400)
+
+  # Lo más nuevo que el margen queda para la próxima consulta: una transacción
+  # que todavía no confirmó puede tener filas con fecha anterior a las ya visibles
+  hasta = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_DELAY)
+
+  filas, mas_filas = _leer(modelo.objects.values(*columnas), 'updated_at', posicion_cambios, hasta, limite)
+  eliminadas = Eliminacion.objects.filter(modelo=modelo._meta.label_lower).values('id', 'objeto_id', 'fecha')
+  eliminadas, mas_eliminadas = _leer(eliminadas, 'fecha', posicion_eliminados, hasta, limite)
+
+  if filas:
+    posicion_cambios = (filas[-1]['updated_at'], filas[-1]['id'])
+  if eliminadas:
+    posicion_eliminados = (eliminadas[-1]['fecha'], eliminadas[-1]['id'])
+  valores = [*(posicion_cambios or (None, None)), *(posicion_eliminados or (None, None))]
+
+  return JsonResponse({
+    'cambios': filas,
+    'eliminados': [{'id': e['objeto_id'], 'fecha': e['fecha']} for e in eliminadas],
+    'cursor': codificar_cursor(recurso, valores),
+    'hay_mas': mas_filas or mas_eliminadas,
+  })
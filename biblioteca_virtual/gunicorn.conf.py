@@ -0,0 +1,36 @@
+# Configuración de gunicorn para el modo producción del entrypoint
+# (BOOT_MODE=production). Se puede ajustar con variables de entorno.
+import os
+
+
+def cpus_disponibles():
+    """CPUs que puede usar el contenedor: afinidad y cuota de cgroup v2"""
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            cuota, periodo = f.read().split()
+        if cuota != 'max':
+            cpus = min(cpus, max(1, int(cuota) // int(periodo)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+asincronas = os.environ.get("ASYNC_VIEWS", "False").lower() in ("1", "true")
+
+wsgi_app = "biblioteca_virtual.asgi:application" if asincronas else "biblioteca_virtual.wsgi:application"
+worker_class = "uvicorn.workers.UvicornWorker" if asincronas else "sync"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * cpus_disponibles() + 1))
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# La aplicación se importa una vez en el proceso principal y los workers la
+# heredan al hacer fork: arrancan más rápido y comparten memoria
+preload_app = True
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # Ninguna conexión abierta durante la precarga se comparte entre procesos
+    from django.db import connections
+    connections.close_all()
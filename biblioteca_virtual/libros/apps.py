@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LibrosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'libros'
+
+    def ready(self):
+        from . import signals
+        # Con las migraciones desactivadas (tests) la estructura de búsqueda
+        # no la crea su migración; post_migrate se emite en ambos casos.
+        post_migrate.connect(signals.crear_estructura_busqueda, sender=self)
@@ -0,0 +1,159 @@
+"""
+Búsqueda de texto completo sobre título y autor de los libros.
+
+- PostgreSQL: columna tsvector ``busqueda`` en libros_libro con índice GIN.
+- SQLite: tabla virtual FTS5 ``libros_libro_fts`` cuyo rowid es el id del libro.
+
+Ni la columna ni la tabla forman parte del modelo (el esquema de los tests se
+crea sin migraciones y cada motor necesita algo distinto); se crean con la
+migración y en post_migrate, y se mantienen al guardar/eliminar un Libro.
+"""
+
+import re
+
+from django.db import connection as default_connection
+from django.db.models import Q
+
+from .models import Libro
+
+TABLA = 'libros_libro'
+TABLA_FTS = 'libros_libro_fts'
+CONFIGURACION = 'spanish'
+COLUMNAS = ('id', 'titulo', 'autor', 'fecha_publicacion', 'en_prestamo')
+
+VECTOR = (
+  f"setweight(to_tsvector('{CONFIGURACION}', coalesce(titulo, '')), 'A') || "
+  f"setweight(to_tsvector('{CONFIGURACION}', coalesce(autor, '')), 'B')"
+)
+
+
+def soportada(connection):
+  return connection.vendor in ('postgresql', 'sqlite')
+
+
+def crear_estructura(connection):
+  """Crea la columna/tabla de búsqueda si no existe (idempotente)"""
+  with connection.cursor() as cursor:
+    if connection.vendor == 'postgresql':
+      cursor.execute(f"ALTER TABLE {TABLA} ADD COLUMN IF NOT EXISTS busqueda tsvector")
+      cursor.execute(f"CREATE INDEX IF NOT EXISTS libro_busqueda_gin ON {TABLA} USING gin (busqueda)")
+    elif connection.vendor == 'sqlite':
+      cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} "
+        "USING fts5(titulo, autor, tokenize = 'unicode61 remove_diacritics 2')"
+      )
+
+
+def eliminar_estructura(connection):
+  with connection.cursor() as cursor:
+    if connection.vendor == 'postgresql':
+      cursor.execute("DROP INDEX IF EXISTS libro_busqueda_gin")
+      cursor.execute(f"ALTER TABLE {TABLA} DROP COLUMN IF EXISTS busqueda")
+    elif connection.vendor == 'sqlite':
+      cursor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+def indexar(ids, connection=default_connection):
+  """Actualiza el índice de los libros ``ids`` con una sentencia por conjunto"""
+  ids = list(ids)
+  if not ids or not soportada(connection):
+    return
+  marcadores = ', '.join(['%s'] * len(ids))
+  with connection.cursor() as cursor:
+    if connection.vendor == 'postgresql':
+      cursor.execute(f"UPDATE {TABLA} SET busqueda = {VECTOR} WHERE id IN ({marcadores})", ids)
+    else:
+      cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcadores})", ids)
+      cursor.execute(
+        f"INSERT INTO {TABLA_FTS} (rowid, titulo, autor) "
+        f"SELECT id, titulo, autor FROM {TABLA} WHERE id IN ({marcadores})",
+        ids,
+      )
+
+
+def desindexar(ids, connection=default_connection):
+  ids = list(ids)
+  # En PostgreSQL el vector vive en la misma fila, se va con ella
+  if not ids or connection.vendor != 'sqlite':
+    return
+  marcadores = ', '.join(['%s'] * len(ids))
+  with connection.cursor() as cursor:
+    cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcadores})", ids)
+
+
+def indexar_rango(desde_id, hasta_id, connection=default_connection):
+  """Indexa los libros con desde_id < id <= hasta_id"""
+  if not soportada(connection):
+    return
+  with connection.cursor() as cursor:
+    if connection.vendor == 'postgresql':
+      cursor.execute(f"UPDATE {TABLA} SET busqueda = {VECTOR} WHERE id > %s AND id <= %s", [desde_id, hasta_id])
+    else:
+      cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid > %s AND rowid <= %s", [desde_id, hasta_id])
+      cursor.execute(
+        f"INSERT INTO {TABLA_FTS} (rowid, titulo, autor) "
+        f"SELECT id, titulo, autor FROM {TABLA} WHERE id > %s AND id <= %s",
+        [desde_id, hasta_id],
+      )
+
+
+def reconstruir(lote=10000, connection=default_connection, progreso=None):
+  """
+  Reindexa todo el catálogo por rangos de id de ``lote`` filas, para no
+  mantener una transacción enorme. Devuelve el id máximo indexado.
+  """
+  if not soportada(connection):
+    return 0
+  with connection.cursor() as cursor:
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {TABLA}")
+    maximo = cursor.fetchone()[0]
+    if connection.vendor == 'sqlite':
+      cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid > %s", [maximo])
+
+  desde = 0
+  while desde < maximo:
+    hasta = min(desde + lote, maximo)
+    indexar_rango(desde, hasta, connection)
+    if progreso:
+      progreso(hasta, maximo)
+    desde = hasta
+  return maximo
+
+
+def _terminos(q):
+  return re.findall(r'\w+', q.lower())[:10]
+
+
+def buscar(q, limite, desplazamiento=0, connection=default_connection):
+  """
+  Libros que coinciden con ``q`` ordenados por relevancia y luego por id.
+  Cada palabra se busca como prefijo y deben aparecer todas.
+  """
+  terminos = _terminos(q)
+  if not terminos:
+    return []
+
+  columnas = ', '.join(f"l.{c}" for c in COLUMNAS)
+  if connection.vendor == 'postgresql':
+    consulta = ' & '.join(f"{t}:*" for t in terminos)
+    sql = (
+      f"SELECT {columnas} FROM {TABLA} l, to_tsquery('{CONFIGURACION}', %s) consulta "
+      "WHERE l.busqueda @@ consulta "
+      "ORDER BY ts_rank(l.busqueda, consulta) DESC, l.id LIMIT %s OFFSET %s"
+    )
+  elif connection.vendor == 'sqlite':
+    consulta = ' '.join(f'"{t}"*' for t in terminos)
+    # bm25 es menor cuanto más relevante; el título pesa más que el autor
+    sql = (
+      f"SELECT {columnas} FROM {TABLA_FTS} f JOIN {TABLA} l ON l.id = f.rowid "
+      f"WHERE {TABLA_FTS} MATCH %s "
+      f"ORDER BY bm25({TABLA_FTS}, 10.0, 5.0), l.id LIMIT %s OFFSET %s"
+    )
+  else:
+    filtro = Q()
+    for termino in terminos:
+      filtro &= Q(titulo__icontains=termino) | Q(autor__icontains=termino)
+    queryset = Libro.objects.db_manager(connection.alias).only(*COLUMNAS).filter(filtro).order_by('id')
+    return list(queryset[desplazamiento:desplazamiento + limite])
+
+  return list(Libro.objects.db_manager(connection.alias).raw(sql, [consulta, limite, desplazamiento]))
@@ -0,0 +1,137 @@
+import itertools
+import random
+import statistics
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from libros import busqueda, trigramas
+from libros.models import Libro
+
+PALABRAS = (
+  "amor guerra sombra ciudad noche río memoria silencio tiempo casa jardín "
+  "viaje historia secreto mar montaña camino fuego luz invierno verano sueño "
+  "corazón hija padre isla desierto reino espejo laberinto ciego perro lobo "
+  "canción última primera lejana perdida oscura dorada extraña infinita breve "
+  "crónica muerte vida libro biblioteca ventana puerta otoño piedra viento"
+).split()
+NOMBRES = (
+  "Gabriel Isabel Jorge Julio Mario Octavio Elena Rosario Juan Carmen Alfonsina "
+  "Pablo Rómulo Teresa Ernesto Clarice Horacio Silvina Miguel Ana Laura Andrés"
+).split()
+APELLIDOS = (
+  "García Márquez Allende Borges Cortázar Vargas Paz Garro Castellanos Rulfo "
+  "Martín Storni Neruda Gallegos Parra Sábato Lispector Quiroga Ocampo Bioy "
+  "Casares Arlt Onetti Benedetti Fuentes Mistral Ibarbourou Carpentier Lezama"
+).split()
+SILABAS = "ba be ca co da de el en fa fi ga la le li lo ma me mi mo na ne no pa pe ra re ri ro sa se so ta te to va vi".split()
+
+
+class Command(BaseCommand):
+  help = (
+    "Mide la latencia de la búsqueda difusa sobre un catálogo sintético. "
+    "Los libros se insertan dentro de una transacción que se revierte al final."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--cantidad', type=int, default=500000, help="Libros a sembrar (por defecto 500000)")
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--lote', type=int, default=5000)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--conservar', action='store_true', help="No revertir los libros sembrados")
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    connection = connections[options['database']]
+    if not trigramas.soportada(connection):
+      raise CommandError(f"La búsqueda difusa no está disponible para {connection.vendor}")
+    if options['cantidad'] < 1 or options['consultas'] < 1:
+      raise CommandError("--cantidad y --consultas deben ser mayores que cero")
+
+    azar = random.Random(options['semilla'])
+    # Vocabulario con frecuencias tipo Zipf: unas pocas palabras muy comunes
+    # y una cola larga de palabras raras, como en un catálogo real
+    self.vocabulario = PALABRAS + sorted({
+      ''.join(azar.choices(SILABAS, k=azar.randint(2, 4))) for _ in range(20000)
+    })
+    self.pesos = list(itertools.accumulate(1 / rango for rango in range(1, len(self.vocabulario) + 1)))
+    with transaction.atomic(using=connection.alias):
+      sembrados = self.sembrar(connection, azar, options['cantidad'], options['lote'])
+      self.medir(connection, azar, sembrados, options['consultas'])
+      if not options['conservar']:
+        transaction.set_rollback(True, using=connection.alias)
+
+    if options['conservar']:
+      busqueda.indexar_rango(sembrados[0] - 1, sembrados[-1], connection)
+    # El índice en memoria puede tener libros que ya no existen
+    trigramas.descartar(connection)
+
+  def sembrar(self, connection, azar, cantidad, lote):
+    desde = Libro.objects.using(connection.alias).aggregate(maximo=Max('id'))['maximo'] or 0
+    inicio = time.monotonic()
+    for base in range(0, cantidad, lote):
+      Libro.objects.using(connection.alias).bulk_create([
+        Libro(
+          titulo=self.titulo(azar),
+          autor=f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}",
+          fecha_publicacion=date(azar.randint(1900, 2024), 1, 1),
+        )
+        for _ in range(min(lote, cantidad - base))
+      ])
+    ids = list(Libro.objects.using(connection.alias).filter(id__gt=desde).order_by('id').values_list('id', flat=True))
+    self.stdout.write(f"Sembrados {len(ids)} libros en {time.monotonic() - inicio:.1f}s")
+
+    inicio = time.monotonic()
+    if connection.vendor == 'postgresql':
+      with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {trigramas.TABLA}")
+      self.stdout.write(f"ANALYZE en {time.monotonic() - inicio:.1f}s")
+    else:
+      trigramas.descartar(connection)
+      indice = trigramas.indice(connection)
+      self.stdout.write(f"Índice en memoria: {len(indice)} libros en {time.monotonic() - inicio:.1f}s")
+    return ids
+
+  def titulo(self, azar):
+    palabras = azar.choices(self.vocabulario, cum_weights=self.pesos, k=azar.randint(2, 5))
+    return ' '.join(palabras).capitalize()
+
+  def medir(self, connection, azar, ids, cantidad):
+    muestra = Libro.objects.using(connection.alias).filter(id__in=azar.sample(ids, min(cantidad, len(ids))))
+    tiempos, aciertos = [], 0
+    for libro in muestra.only('id', 'titulo', 'autor'):
+      consulta = self.con_error(azar, azar.choice([libro.titulo, libro.autor]))
+      inicio = time.perf_counter()
+      resultados = trigramas.buscar(consulta, connection=connection)
+      tiempos.append((time.perf_counter() - inicio) * 1000)
+      aciertos += any(r.pk == libro.pk for r in resultados)
+
+    tiempos.sort()
+    p95 = tiempos[min(len(tiempos) - 1, int(0.95 * len(tiempos)))]
+    p99 = tiempos[min(len(tiempos) - 1, int(0.99 * len(tiempos)))]
+    self.stdout.write(self.style.SUCCESS(
+      f"{len(tiempos)} consultas: p50 {statistics.median(tiempos):.1f} ms, "
+      f"p95 {p95:.1f} ms, p99 {p99:.1f} ms, máx {tiempos[-1]:.1f} ms"
+    ))
+    # Con un catálogo sintético muchos libros comparten palabras, así que el
+    # original puede quedar fuera del tope de resultados aunque la búsqueda
+    # funcione; esto sirve para comparar corridas, no como precisión absoluta.
+    self.stdout.write(f"Libro original entre los resultados: {aciertos}/{len(tiempos)}")
+
+  def con_error(self, azar, texto):
+    """Un error de tipeo (borrar, duplicar o intercambiar una letra) en una palabra"""
+    palabras = texto.split()
+    largas = [i for i, p in enumerate(palabras) if len(p) >= 4] or [0]
+    i = azar.choice(largas)
+    palabra = palabras[i]
+    j = azar.randrange(1, max(len(palabra) - 1, 2))
+    operacion = azar.choice(('borrar', 'duplicar', 'intercambiar'))
+    if operacion == 'borrar':
+      palabra = palabra[:j] + palabra[j + 1:]
+    elif operacion == 'duplicar':
+      palabra = palabra[:j] + palabra[j] + palabra[j:]
+    else:
+      palabra = palabra[:j - 1] + palabra[j:j + 1] + palabra[j - 1:j] + palabra[j + 1:]
+    palabras[i] = palabra
+    return ' '.join(palabras)
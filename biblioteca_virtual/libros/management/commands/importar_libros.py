@@ -0,0 +1,145 @@
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from biblioteca_virtual import cache_listados
+from libros import busqueda
+from libros.forms import LibroForm
+from libros.models import Libro
+
+FORMATOS = ('csv', 'ndjson')
+CAMPOS = LibroForm._meta.fields
+
+
+class Command(BaseCommand):
+  help = (
+    "Importa libros desde un archivo CSV o NDJSON (o la entrada estándar con '-'). "
+    "Cada fila se valida con LibroForm y se inserta por lotes, con COPY en PostgreSQL."
+  )
+  stealth_options = ('stdin',)
+
+  def add_arguments(self, parser):
+    parser.add_argument('archivo', help="Ruta del archivo o '-' para leer la entrada estándar")
+    parser.add_argument('--formato', choices=FORMATOS, help="Por defecto según la extensión del archivo; csv para la entrada estándar")
+    parser.add_argument('--lote', type=int, default=5000, help="Filas por lote de inserción (por defecto 5000)")
+    parser.add_argument('--rechazados', help="Archivo NDJSON donde escribir las filas rechazadas con sus errores")
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    connection = connections[options['database']]
+    if options['lote'] < 1:
+      raise CommandError("--lote debe ser mayor que cero")
+
+    archivo = options['archivo']
+    formato = options['formato'] or ('ndjson' if archivo.endswith(('.ndjson', '.jsonl')) else 'csv')
+    if archivo == '-':
+      stdin = options.get('stdin', sys.stdin)
+      entrada = io.TextIOWrapper(stdin.buffer, encoding='utf-8-sig', newline='') if hasattr(stdin, 'buffer') else stdin
+    else:
+      try:
+        entrada = open(archivo, encoding='utf-8-sig', newline='')
+      except OSError as e:
+        raise CommandError(f"No se pudo abrir {archivo}: {e}")
+
+    rechazados = open(options['rechazados'], 'w', encoding='utf-8') if options['rechazados'] else None
+    try:
+      self.importar(connection, self.filas(entrada, formato), options['lote'], rechazados, options['verbosity'])
+    finally:
+      if archivo != '-':
+        entrada.close()
+      if rechazados:
+        rechazados.close()
+
+  def filas(self, entrada, formato):
+    """(número de línea, fila) sin cargar el archivo completo"""
+    if formato == 'csv':
+      lector = csv.DictReader(entrada)
+      if lector.fieldnames is None or not set(CAMPOS) <= set(lector.fieldnames):
+        raise CommandError(f"El CSV debe tener las columnas: {', '.join(CAMPOS)}")
+      for fila in lector:
+        yield lector.line_num, fila
+      return
+
+    for numero, linea in enumerate(entrada, start=1):
+      if not linea.strip():
+        continue
+      try:
+        fila = json.loads(linea)
+      except ValueError:
+        yield numero, None
+        continue
+      yield numero, fila if isinstance(fila, dict) else None
+
+  def importar(self, connection, filas, lote, rechazados, verbosity):
+    insertados = rechazos = 0
+    desde = Libro.objects.using(connection.alias).aggregate(maximo=Max('id'))['maximo'] or 0
+    inicio = time.monotonic()
+
+    while True:
+      libros, leidas = [], 0
+      for numero, fila in itertools.islice(filas, lote):
+        leidas += 1
+        datos, errores = self.validar(fila)
+        if errores:
+          rechazos += 1
+          self.rechazar(numero, fila, errores, rechazados, mostrar=verbosity > 1 or rechazos <= 20)
+        else:
+          libros.append(datos)
+
+      if libros:
+        with transaction.atomic(using=connection.alias):
+          self.insertar(connection, libros)
+          # bulk_create y COPY no emiten señales: se indexa el rango insertado
+          hasta = Libro.objects.using(connection.alias).aggregate(maximo=Max('id'))['maximo']
+          busqueda.indexar_rango(desde, hasta, connection)
+          cache_listados.invalidar(Libro)
+        desde = hasta
+        insertados += len(libros)
+        if verbosity > 1:
+          self.stdout.write(f"  {insertados} libros insertados")
+      if leidas < lote:
+        break
+
+    duracion = time.monotonic() - inicio
+    self.stdout.write(self.style.SUCCESS(
+      f"{insertados} libros importados en {duracion:.1f}s "
+      f"({insertados / duracion if duracion else insertados:.0f} filas/s), {rechazos} rechazados"
+    ))
+
+  def validar(self, fila):
+    """(datos limpios, None) si la fila es válida según LibroForm; si no (None, errores)"""
+    if fila is None:
+      return None, {'__all__': ["La línea no es un objeto JSON."]}
+    form = LibroForm({campo: fila.get(campo) for campo in CAMPOS})
+    if not form.is_valid():
+      return None, {campo: list(mensajes) for campo, mensajes in form.errors.items()}
+    return form.cleaned_data, None
+
+  def rechazar(self, numero, fila, errores, rechazados, mostrar):
+    if rechazados:
+      rechazados.write(json.dumps({'linea': numero, 'fila': fila, 'errores': errores}, ensure_ascii=False, default=str) + '\n')
+    if mostrar:
+      detalle = '; '.join(f"{campo}: {' '.join(mensajes)}" for campo, mensajes in errores.items())
+      self.stderr.write(f"Línea {numero} rechazada: {detalle}")
+
+  def insertar(self, connection, libros):
+    if connection.vendor == 'postgresql':
+      ahora = timezone.now().isoformat()
+      buffer = io.StringIO()
+      escritor = csv.writer(buffer)
+      for libro in libros:
+        escritor.writerow([libro['titulo'], libro['autor'], libro['fecha_publicacion'].isoformat(), 'f', ahora])
+      buffer.seek(0)
+      with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+          f"COPY {Libro._meta.db_table} (titulo, autor, fecha_publicacion, en_prestamo, updated_at) FROM STDIN WITH (FORMAT csv)",
+          buffer,
+        )
+    else:
+      Libro.objects.using(connection.alias).bulk_create([Libro(**libro) for libro in libros])
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from libros import busqueda
+
+
+class Command(BaseCommand):
+  help = "Reconstruye el índice de búsqueda de texto completo del catálogo por lotes"
+
+  def add_arguments(self, parser):
+    parser.add_argument('--lote', type=int, default=10000, help="Cantidad de ids por lote (por defecto 10000)")
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    connection = connections[options['database']]
+    if not busqueda.soportada(connection):
+      raise CommandError(f"La búsqueda de texto completo no está disponible para {connection.vendor}")
+    if options['lote'] < 1:
+      raise CommandError("--lote debe ser mayor que cero")
+
+    def progreso(hasta, maximo):
+      self.stdout.write(f"  {hasta}/{maximo}")
+
+    inicio = time.monotonic()
+    busqueda.crear_estructura(connection)
+    maximo = busqueda.reconstruir(options['lote'], connection, progreso if options['verbosity'] > 1 else None)
+    self.stdout.write(self.style.SUCCESS(
+      f"Índice de búsqueda reconstruido hasta el id {maximo} en {time.monotonic() - inicio:.1f}s"
+    ))
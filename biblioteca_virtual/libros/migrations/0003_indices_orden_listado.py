@@ -0,0 +1,25 @@
+# Generated by Django 4.2.26 on 2026-10-16 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0002_libro_en_prestamo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['titulo', 'id'], name='libro_titulo_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['autor', 'id'], name='libro_autor_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['fecha_publicacion', 'id'], name='libro_fecha_pub_id_idx'),
+        ),
+    ]
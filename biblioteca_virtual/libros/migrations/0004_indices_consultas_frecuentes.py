@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0003_indices_orden_listado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(condition=models.Q(('en_prestamo', False)), fields=['id'], name='libro_disponible_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Índices para la búsqueda por prefijo del autocompletado (istartswith) sobre
+# libros disponibles. Dependen del motor, por eso no se declaran en Meta.indexes:
+# - PostgreSQL compara UPPER(columna::text) LIKE UPPER('q%'); text_pattern_ops
+#   permite recorrer solo el rango del prefijo.
+# - SQLite aplica la optimización de LIKE solo a índices con COLLATE NOCASE.
+INDICES = {
+    'postgresql': [
+        "CREATE INDEX IF NOT EXISTS libro_titulo_prefijo_idx ON libros_libro (UPPER(titulo::text) text_pattern_ops) WHERE NOT en_prestamo",
+        "CREATE INDEX IF NOT EXISTS libro_autor_prefijo_idx ON libros_libro (UPPER(autor::text) text_pattern_ops) WHERE NOT en_prestamo",
+    ],
+    'sqlite': [
+        "CREATE INDEX IF NOT EXISTS libro_titulo_prefijo_idx ON libros_libro (titulo COLLATE NOCASE) WHERE NOT en_prestamo",
+        "CREATE INDEX IF NOT EXISTS libro_autor_prefijo_idx ON libros_libro (autor COLLATE NOCASE) WHERE NOT en_prestamo",
+    ],
+}
+
+
+def crear_indices(apps, schema_editor):
+    for sql in INDICES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor in INDICES:
+        schema_editor.execute("DROP INDEX IF EXISTS libro_titulo_prefijo_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS libro_autor_prefijo_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0004_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
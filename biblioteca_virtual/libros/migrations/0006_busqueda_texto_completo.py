@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# SQL copiado de libros.busqueda al escribir la migración: si el módulo cambia,
+# esta migración tiene que seguir haciendo lo mismo.
+
+
+def crear_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE libros_libro ADD COLUMN IF NOT EXISTS busqueda tsvector")
+        schema_editor.execute("CREATE INDEX IF NOT EXISTS libro_busqueda_gin ON libros_libro USING gin (busqueda)")
+        schema_editor.execute(
+            "UPDATE libros_libro SET busqueda = "
+            "setweight(to_tsvector('spanish', coalesce(titulo, '')), 'A') || "
+            "setweight(to_tsvector('spanish', coalesce(autor, '')), 'B')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS libros_libro_fts "
+            "USING fts5(titulo, autor, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute("DELETE FROM libros_libro_fts")
+        schema_editor.execute(
+            "INSERT INTO libros_libro_fts (rowid, titulo, autor) SELECT id, titulo, autor FROM libros_libro"
+        )
+
+
+def eliminar_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS libro_busqueda_gin")
+        schema_editor.execute("ALTER TABLE libros_libro DROP COLUMN IF EXISTS busqueda")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS libros_libro_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0005_indices_prefijo'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_busqueda, eliminar_busqueda),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# SQL de libros.trigramas al escribir la migración; 0010 reemplaza estos
+# índices por los de la expresión sin acentos.
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("CREATE INDEX IF NOT EXISTS libro_titulo_trgm ON libros_libro USING gin (titulo gin_trgm_ops)")
+    schema_editor.execute("CREATE INDEX IF NOT EXISTS libro_autor_trgm ON libros_libro USING gin (autor gin_trgm_ops)")
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS libro_titulo_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS libro_autor_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0006_busqueda_texto_completo'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.26 on 2026-10-16 21:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0007_indices_trigramas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-16 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0008_libro_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['updated_at'], name='libro_updated_at_idx'),
+        ),
+    ]
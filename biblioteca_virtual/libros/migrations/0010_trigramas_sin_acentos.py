@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# SQL de libros.trigramas al escribir la migración.
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Los índices sobre las columnas con acentos los reemplazan los de la expresión sin acentos
+    schema_editor.execute("DROP INDEX IF EXISTS libro_titulo_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS libro_autor_trgm")
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    # unaccent() no es IMMUTABLE y no sirve en un índice de expresión; el
+    # envoltorio fija el diccionario con su esquema para no depender del search_path
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT n.nspname FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace "
+            "WHERE e.extname = 'unaccent'"
+        )
+        esquema = schema_editor.quote_name(cursor.fetchone()[0])
+    schema_editor.execute(
+        "CREATE OR REPLACE FUNCTION libros_sin_acentos(text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE "
+        f"AS $$ SELECT {esquema}.unaccent('{esquema}.unaccent'::regdictionary, $1) $$"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS libro_titulo_sin_acentos_trgm ON libros_libro "
+        "USING gin (libros_sin_acentos(titulo) gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS libro_autor_sin_acentos_trgm ON libros_libro "
+        "USING gin (libros_sin_acentos(autor) gin_trgm_ops)"
+    )
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS libro_titulo_sin_acentos_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS libro_autor_sin_acentos_trgm")
+    schema_editor.execute("DROP FUNCTION IF EXISTS libros_sin_acentos(text)")
+    # Los índices de 0007
+    schema_editor.execute("CREATE INDEX IF NOT EXISTS libro_titulo_trgm ON libros_libro USING gin (titulo gin_trgm_ops)")
+    schema_editor.execute("CREATE INDEX IF NOT EXISTS libro_autor_trgm ON libros_libro USING gin (autor gin_trgm_ops)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0009_indice_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,33 @@
+import biblioteca_virtual.indices
+from django.db import migrations, models
+
+# Los índices de 0005_indices_prefijo pasan al estado del modelo
+# para que SQLite los vuelva a crear al reconstruir la tabla (el AddField
+# de 0008 los había perdido). Donde siguen existiendo no se tocan.
+INDICES = [
+    biblioteca_virtual.indices.IndicePrefijo(condition=models.Q(('en_prestamo', False)), fields=['titulo'], name='libro_titulo_prefijo_idx'),
+    biblioteca_virtual.indices.IndicePrefijo(condition=models.Q(('en_prestamo', False)), fields=['autor'], name='libro_autor_prefijo_idx'),
+]
+
+
+def crear_faltantes(apps, schema_editor):
+    Libro = apps.get_model('libros', 'Libro')
+    with schema_editor.connection.cursor() as cursor:
+        existentes = schema_editor.connection.introspection.get_constraints(cursor, Libro._meta.db_table)
+    for indice in INDICES:
+        if indice.name not in existentes:
+            schema_editor.add_index(Libro, indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0010_trigramas_sin_acentos'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(crear_faltantes, migrations.RunPython.noop)],
+            state_operations=[migrations.AddIndex(model_name='libro', index=indice) for indice in INDICES],
+        ),
+    ]
@@ -1,13 +1,25 @@
 from django.db import models
+from biblioteca_virtual.indices import IndicePrefijo
 
 class Libro(models.Model):
   titulo = models.CharField(max_length=200, null=False)
   autor = models.CharField(max_length=200, null=False)
   fecha_publicacion = models.DateField(null=False)
   en_prestamo = models.BooleanField(default=False)
+  updated_at = models.DateTimeField(auto_now=True)
 
   def __str__(self):
     return f"{self.titulo} - ({self.autor})"
 
   class Meta:
-    verbose_name_plural = "Libros"
\ No newline at end of file
+    verbose_name_plural = "Libros"
+    indexes = [
+      models.Index(fields=["titulo", "id"], name="libro_titulo_id_idx"),
+      models.Index(fields=["autor", "id"], name="libro_autor_id_idx"),
+      models.Index(fields=["fecha_publicacion", "id"], name="libro_fecha_pub_id_idx"),
+      models.Index(fields=["id"], condition=models.Q(en_prestamo=False), name="libro_disponible_idx"),
+      models.Index(fields=["updated_at"], name="libro_updated_at_idx"),
+      # Autocompletado por prefijo (istartswith) de los libros disponibles
+      IndicePrefijo(fields=["titulo"], condition=models.Q(en_prestamo=False), name="libro_titulo_prefijo_idx"),
+      IndicePrefijo(fields=["autor"], condition=models.Q(en_prestamo=False), name="libro_autor_prefijo_idx"),
+    ]
\ No newline at end of file
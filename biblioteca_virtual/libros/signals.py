@@ -0,0 +1,32 @@
+from django.db import connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from biblioteca_virtual import cache_listados
+from . import busqueda, trigramas
+from .models import Libro
+
+CAMPOS_BUSQUEDA = {'titulo', 'autor'}
+
+
+@receiver(post_save, sender=Libro)
+def indexar_libro(sender, instance, using, update_fields=None, **kwargs):
+  if update_fields is not None and not CAMPOS_BUSQUEDA & set(update_fields):
+    return
+  busqueda.indexar([instance.pk], connections[using])
+  trigramas.actualizar(instance, connections[using])
+
+
+@receiver(post_delete, sender=Libro)
+def desindexar_libro(sender, instance, using, **kwargs):
+  busqueda.desindexar([instance.pk], connections[using])
+  trigramas.quitar(instance.pk, connections[using])
+
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+def invalidar_listados(sender, **kwargs):
+  cache_listados.invalidar(Libro)
+
+
+def crear_estructura_busqueda(using, **kwargs):
+  busqueda.crear_estructura(connections[using])
@@ -1,9 +1,22 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.messages import get_messages
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.template.backends.django import Template as DjangoTemplate
+from biblioteca_virtual import fragmentos
 from .models import Libro
 from .forms import LibroForm
+from . import busqueda, trigramas
 from datetime import date
+from django.db import connection
+import copy
+from io import StringIO
+import json
+import os
+import tempfile
+from unittest.mock import patch
 
 
 class LibroModelTest(TestCase):
@@ -251,3 +264,453 @@ class LibroViewTest(TestCase):
         self.assertIn(self.libro2, en_prestamo)
         self.assertEqual(disponibles.count(), 1)
         self.assertEqual(en_prestamo.count(), 1)
+
+
+@override_settings(LIST_PAGE_SIZE=2)
+class LibroPaginacionTest(TestCase):
+    """Tests para la paginación por cursor del listado de libros"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = Client()
+        self.libros = [
+            Libro.objects.create(titulo="Libro C", autor="Borges", fecha_publicacion=date(1944, 1, 1)),
+            Libro.objects.create(titulo="Libro A", autor="Allende", fecha_publicacion=date(1982, 1, 1)),
+            Libro.objects.create(titulo="Libro B", autor="Borges", fecha_publicacion=date(1949, 1, 1)),
+            Libro.objects.create(titulo="Libro D", autor="Cortázar", fecha_publicacion=date(1963, 1, 1)),
+            Libro.objects.create(titulo="Libro E", autor="Allende", fecha_publicacion=date(1985, 1, 1)),
+        ]
+
+    def recorrer(self, orden):
+        """Recorre todas las páginas siguiendo el enlace 'siguiente'"""
+        vistos = []
+        url = reverse('libros:libros') + f'?orden={orden}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            vistos.extend(response.context['libros'])
+            siguiente = response.context['pagina'].url_siguiente
+            url = reverse('libros:libros') + siguiente if siguiente else None
+        return vistos
+
+    def test_primera_pagina(self):
+        """Test que la primera página tiene el tamaño configurado y sin enlace anterior"""
+        response = self.client.get(reverse('libros:libros'))
+        pagina = response.context['pagina']
+
+        self.assertEqual(list(response.context['libros']), self.libros[:2])
+        self.assertIsNone(pagina.url_anterior)
+        self.assertIsNotNone(pagina.url_siguiente)
+
+    def test_recorrido_por_id(self):
+        """Test que recorrer las páginas devuelve todos los libros una sola vez"""
+        self.assertEqual(self.recorrer('id'), self.libros)
+
+    def test_recorrido_por_autor_desempata_por_id(self):
+        """Test del orden por autor con empates resueltos por id"""
+        esperado = sorted(self.libros, key=lambda libro: (libro.autor, libro.id))
+        self.assertEqual(self.recorrer('autor'), esperado)
+
+    def test_recorrido_por_fecha_descendente(self):
+        """Test del orden por fecha de publicación más reciente primero"""
+        esperado = sorted(self.libros, key=lambda libro: libro.fecha_publicacion, reverse=True)
+        self.assertEqual(self.recorrer('fecha_publicacion'), esperado)
+
+    def test_enlace_anterior(self):
+        """Test que el enlace anterior vuelve a la página previa"""
+        primera = self.client.get(reverse('libros:libros'))
+        segunda = self.client.get(reverse('libros:libros') + primera.context['pagina'].url_siguiente)
+        self.assertEqual(list(segunda.context['libros']), self.libros[2:4])
+
+        anterior = self.client.get(reverse('libros:libros') + segunda.context['pagina'].url_anterior)
+        self.assertEqual(list(anterior.context['libros']), self.libros[:2])
+
+    def test_cursor_invalido_muestra_primera_pagina(self):
+        """Test que un cursor corrupto no genera error"""
+        response = self.client.get(reverse('libros:libros') + '?cursor=no-es-un-cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['libros']), self.libros[:2])
+
+    def test_orden_invalido(self):
+        """Test que un orden desconocido vuelve al orden por id"""
+        response = self.client.get(reverse('libros:libros') + '?orden=en_prestamo')
+        self.assertEqual(response.context['orden'], 'id')
+
+    def test_una_consulta_por_pagina(self):
+        """Test que cada página cuesta una sola consulta además de la de validadores"""
+        primera = self.client.get(reverse('libros:libros'))
+        url = reverse('libros:libros') + primera.context['pagina'].url_siguiente
+        # Validadores de ETag/Last-Modified + la página
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+
+class AutocompletarLibrosTest(TestCase):
+    """Tests para el endpoint de autocompletado de libros disponibles"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.rayuela = Libro.objects.create(titulo="Rayuela", autor="Julio Cortázar", fecha_publicacion=date(1963, 6, 28))
+        self.ficciones = Libro.objects.create(titulo="Ficciones", autor="Jorge Luis Borges", fecha_publicacion=date(1944, 1, 1))
+        self.prestado = Libro.objects.create(titulo="Juntacadáveres", autor="Juan Carlos Onetti", fecha_publicacion=date(1964, 1, 1), en_prestamo=True)
+
+    def buscar(self, q):
+        response = self.client.get(reverse('libros:autocompletar_libros'), {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [r['id'] for r in response.json()['resultados']]
+
+    def test_prefijo_titulo_y_autor(self):
+        """Test que busca por prefijo de título o autor"""
+        self.assertEqual(self.buscar('ray'), [self.rayuela.id])
+        self.assertEqual(self.buscar('jo'), [self.ficciones.id])
+
+    def test_excluye_libros_prestados(self):
+        """Test que solo sugiere libros disponibles"""
+        self.assertEqual(self.buscar('ju'), [self.rayuela.id])
+
+    def test_caracteres_comodin(self):
+        """Test que los comodines de LIKE se tratan como texto"""
+        self.assertEqual(self.buscar('%'), [])
+
+
+class IndicesPrefijoTest(TransactionTestCase):
+    """Tests para los índices de prefijo del autocompletado"""
+
+    # Sin la transacción de TestCase: SQLite no reconstruye tablas dentro de un atomic
+
+    def test_indices_de_prefijo_sobreviven_a_reconstruir_la_tabla(self):
+        """Test que los índices de prefijo se recrean cuando el motor reconstruye la tabla"""
+        def indices():
+            with connection.cursor() as cursor:
+                return set(connection.introspection.get_constraints(cursor, Libro._meta.db_table))
+
+        nombres = {'libro_titulo_prefijo_idx', 'libro_autor_prefijo_idx'}
+        self.assertLessEqual(nombres, indices())
+        # En SQLite cambiar un campo copia la tabla y recrea sus índices
+        anterior = Libro._meta.get_field('autor')
+        nuevo = copy.deepcopy(anterior)
+        nuevo.max_length = 250
+        with connection.schema_editor() as editor:
+            editor.alter_field(Libro, anterior, nuevo)
+            editor.alter_field(Libro, nuevo, anterior)
+        self.assertLessEqual(nombres, indices())
+
+
+class BusquedaLibrosTest(TestCase):
+    """Tests para la búsqueda de texto completo del catálogo"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = Client()
+        self.url = reverse('libros:buscar_libros')
+        self.cien = Libro.objects.create(titulo="Cien años de soledad", autor="Gabriel García Márquez", fecha_publicacion=date(1967, 5, 30))
+        self.amor = Libro.objects.create(titulo="El amor en los tiempos del cólera", autor="Gabriel García Márquez", fecha_publicacion=date(1985, 1, 1))
+        self.soledad = Libro.objects.create(titulo="El laberinto de la soledad", autor="Octavio Paz", fecha_publicacion=date(1950, 1, 1))
+
+    def buscar(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [libro.id for libro in response.context['libros']]
+
+    def exactos(self, q):
+        return [libro.id for libro in busqueda.buscar(q, 10)]
+
+    def test_busca_en_titulo_y_autor(self):
+        """Test que encuentra coincidencias en título y en autor"""
+        self.assertEqual(self.buscar('laberinto'), [self.soledad.id])
+        self.assertEqual(sorted(self.buscar('gabriel')), [self.cien.id, self.amor.id])
+
+    def test_titulo_pesa_mas_que_autor(self):
+        """Test que una coincidencia en el título se ordena antes"""
+        paz = Libro.objects.create(titulo="Poemas", autor="Soledad Paz", fecha_publicacion=date(1990, 1, 1))
+        resultados = self.buscar('soledad')
+        self.assertEqual(resultados[-1], paz.id)
+        self.assertEqual(sorted(resultados[:2]), [self.cien.id, self.soledad.id])
+
+    def test_prefijo_y_todas_las_palabras(self):
+        """Test que cada palabra se busca como prefijo y deben coincidir todas"""
+        self.assertEqual(self.buscar('cien sol'), [self.cien.id])
+        self.assertEqual(self.exactos('laberinto gabriel'), [])
+
+    def test_ignora_acentos(self):
+        """Test que la búsqueda no distingue acentos"""
+        self.assertEqual(self.buscar('colera'), [self.amor.id])
+        self.assertEqual(self.buscar('AÑOS'), [self.cien.id])
+
+    def test_sintaxis_de_consulta_se_trata_como_texto(self):
+        """Test que los operadores de la consulta no provocan errores"""
+        self.assertEqual(self.exactos('"soledad* OR NOT ('), [])
+        self.assertEqual(self.buscar('---'), [])
+
+    def test_consulta_vacia(self):
+        """Test que sin consulta no se ejecuta la búsqueda"""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.buscar(''), [])
+
+    def test_indice_se_actualiza_al_editar_y_eliminar(self):
+        """Test que el índice sigue los cambios de los libros"""
+        self.soledad.titulo = "Posdata"
+        self.soledad.save()
+        self.assertEqual(self.exactos('laberinto'), [])
+        self.assertEqual(self.buscar('posdata'), [self.soledad.id])
+
+        self.cien.delete()
+        self.assertEqual(self.exactos('cien'), [])
+
+    def test_paginacion_por_numero(self):
+        """Test que los resultados se paginan con el parámetro pagina"""
+        with override_settings(LIST_PAGE_SIZE=1):
+            response = self.client.get(self.url, {'q': 'gabriel'})
+            pagina = response.context['pagina']
+            self.assertEqual(len(pagina), 1)
+            self.assertIsNone(pagina.url_anterior)
+            self.assertIn('pagina=2', pagina.url_siguiente)
+
+            response = self.client.get(self.url, {'q': 'gabriel', 'pagina': 2})
+            pagina = response.context['pagina']
+            self.assertIsNone(pagina.url_siguiente)
+            self.assertIn('pagina=1', pagina.url_anterior)
+            self.assertEqual(
+                sorted([self.buscar('gabriel', pagina=1)[0], pagina.objetos[0].id]),
+                [self.cien.id, self.amor.id],
+            )
+
+    def test_pagina_invalida(self):
+        """Test que un número de página inválido muestra la primera"""
+        self.assertEqual(self.buscar('laberinto', pagina='x'), [self.soledad.id])
+
+
+class ReconstruirBusquedaTest(TestCase):
+    """Tests para el comando reconstruir_busqueda"""
+
+    def test_reconstruye_indice(self):
+        """Test que el comando reindexa libros insertados sin señales"""
+        Libro.objects.bulk_create([
+            Libro(titulo=f"Crónica {i}", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+            for i in range(5)
+        ])
+        self.assertEqual(busqueda.buscar('cronica', 10), [])
+
+        salida = StringIO()
+        call_command('reconstruir_busqueda', lote=2, stdout=salida)
+        self.assertEqual(len(busqueda.buscar('cronica', 10)), 5)
+        self.assertIn('reconstruido', salida.getvalue())
+
+
+class BusquedaDifusaTest(TestCase):
+    """Tests para la búsqueda difusa por trigramas"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        trigramas.descartar()
+        self.addCleanup(trigramas.descartar)
+        self.client = Client()
+        self.url = reverse('libros:buscar_libros')
+        self.cien = Libro.objects.create(titulo="Cien años de soledad", autor="Gabriel García Márquez", fecha_publicacion=date(1967, 5, 30))
+        self.rayuela = Libro.objects.create(titulo="Rayuela", autor="Julio Cortázar", fecha_publicacion=date(1963, 6, 28))
+        self.ficciones = Libro.objects.create(titulo="Ficciones", autor="Jorge Luis Borges", fecha_publicacion=date(1944, 1, 1))
+
+    def ids(self, q, **kwargs):
+        return [libro.id for libro in trigramas.buscar(q, **kwargs)]
+
+    def test_tolera_errores_de_tipeo(self):
+        """Test que encuentra autores y títulos mal escritos"""
+        self.assertEqual(self.ids('cortazr'), [self.rayuela.id])
+        self.assertEqual(self.ids('Borjes'), [self.ficciones.id])
+        self.assertEqual(self.ids('marqes'), [self.cien.id])
+        self.assertEqual(self.ids('rayeula'), [self.rayuela.id])
+
+    def test_puntaje_ordena_resultados(self):
+        """Test que el resultado más parecido va primero y tiene puntaje"""
+        otro = Libro.objects.create(titulo="Crónica", autor="Julia Cortés", fecha_publicacion=date(2000, 1, 1))
+        resultados = trigramas.buscar('julio cortazar', umbral=0.3)
+        self.assertEqual([r.id for r in resultados], [self.rayuela.id, otro.id])
+        self.assertEqual(resultados[0].puntaje, 1)
+        self.assertLess(resultados[1].puntaje, 1)
+
+    def test_resultados_limitados(self):
+        """Test que la cantidad de resultados tiene un tope"""
+        Libro.objects.bulk_create([
+            Libro(titulo=f"Rayuela {i}", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+            for i in range(10)
+        ])
+        self.assertEqual(len(self.ids('rayuela', limite=3)), 3)
+        with override_settings(BUSQUEDA_DIFUSA_LIMITE=5):
+            self.assertEqual(len(self.ids('rayuela', limite=50)), 5)
+
+    def test_indice_incorpora_cambios(self):
+        """Test que el índice en memoria sigue altas, ediciones y bajas"""
+        self.assertEqual(self.ids('borjes'), [self.ficciones.id])
+
+        self.ficciones.autor = "Adolfo Bioy Casares"
+        self.ficciones.save()
+        self.assertEqual(self.ids('borjes'), [])
+        self.assertEqual(self.ids('casaers'), [self.ficciones.id])
+
+        self.rayuela.delete()
+        self.assertEqual(self.ids('cortazr'), [])
+
+        # Los inserts masivos no emiten señales; se recogen por id
+        nuevo = Libro.objects.bulk_create([Libro(titulo="Pedro Páramo", autor="Juan Rulfo", fecha_publicacion=date(1955, 1, 1))])[0]
+        self.assertEqual(self.ids('paramo pedor'), [nuevo.id])
+
+    def test_indice_filtrado_por_prefijo(self):
+        """Test que el filtrado por prefijo no cambia los candidatos"""
+        indice = trigramas.IndiceTrigramas()
+        textos = ["amor y guerra", "la guerra del fin del mundo", "amor en guerra", "guerrero"]
+        for i, texto in enumerate(textos, start=1):
+            indice.agregar(i, texto)
+
+        consulta = trigramas.trigramas("amor de guerra")
+        esperados = sorted(
+            i for i, texto in enumerate(textos, start=1)
+            if trigramas.puntaje(consulta, texto)[0] >= 0.5
+        )
+        self.assertEqual(sorted(i for i, _ in indice.candidatos("amor de guerra", 10, 0.5)), esperados)
+
+    def test_vista_modo_difusa(self):
+        """Test que la vista busca parecidos explícitamente o sin coincidencias exactas"""
+        response = self.client.get(self.url, {'q': 'borges', 'modo': 'difusa'})
+        self.assertTrue(response.context['difusa'])
+        self.assertEqual([l.id for l in response.context['libros']], [self.ficciones.id])
+
+        response = self.client.get(self.url, {'q': 'borjes'})
+        self.assertTrue(response.context['difusa'])
+        self.assertContains(response, 'Resultados parecidos')
+        self.assertEqual([l.id for l in response.context['libros']], [self.ficciones.id])
+
+        response = self.client.get(self.url, {'q': 'borges'})
+        self.assertNotIn('difusa', response.context)
+
+    def test_benchmark(self):
+        """Test que el benchmark corre y revierte los libros sembrados"""
+        salida = StringIO()
+        call_command('benchmark_busqueda_difusa', cantidad=300, consultas=20, lote=100, stdout=salida)
+        self.assertIn('p95', salida.getvalue())
+        self.assertEqual(Libro.objects.count(), 3)
+
+
+class ImportarLibrosTest(TestCase):
+    """Tests para el comando importar_libros"""
+
+    def importar(self, *args, entrada=None, **kwargs):
+        salida, errores = StringIO(), StringIO()
+        if entrada is not None:
+            kwargs['stdin'] = StringIO(entrada)
+        call_command('importar_libros', *args, stdout=salida, stderr=errores, **kwargs)
+        return salida.getvalue(), errores.getvalue()
+
+    def test_importa_csv_por_lotes(self):
+        """Test que las filas válidas se insertan por lotes y quedan indexadas"""
+        entrada = "titulo,autor,fecha_publicacion\n" + "".join(
+            f"Crónica {i},Autor {i},2000-01-0{i}\n" for i in range(1, 6)
+        )
+        salida, _ = self.importar('-', entrada=entrada, lote=2)
+        self.assertEqual(Libro.objects.count(), 5)
+        self.assertFalse(Libro.objects.filter(en_prestamo=True).exists())
+        self.assertEqual(len(busqueda.buscar('cronica', 10)), 5)
+        self.assertIn('5 libros importados', salida)
+        self.assertIn('filas/s', salida)
+
+    def test_rechaza_filas_invalidas(self):
+        """Test que las filas que LibroForm no acepta se reportan y no se insertan"""
+        entrada = (
+            "titulo,autor,fecha_publicacion\n"
+            "Rayuela,Julio Cortázar,1963-06-28\n"
+            ",Sin título,2000-01-01\n"
+            "Ficciones,Jorge Luis Borges,no es fecha\n"
+            f"{'x' * 201},Autor,2000-01-01\n"
+        )
+        salida, errores = self.importar('-', entrada=entrada, lote=2)
+        self.assertEqual(list(Libro.objects.values_list('titulo', flat=True)), ["Rayuela"])
+        self.assertIn('3 rechazados', salida)
+        self.assertIn('Línea 3 rechazada: titulo', errores)
+        self.assertIn('Línea 4 rechazada: fecha_publicacion', errores)
+
+    def test_importa_ndjson_y_escribe_rechazados(self):
+        """Test que se lee NDJSON desde archivo y los rechazos van a su propio archivo"""
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = os.path.join(directorio, 'libros.ndjson')
+            rechazados = os.path.join(directorio, 'rechazados.ndjson')
+            with open(archivo, 'w', encoding='utf-8') as f:
+                f.write('{"titulo": "Pedro Páramo", "autor": "Juan Rulfo", "fecha_publicacion": "1955-03-19"}\n')
+                f.write('\n')
+                f.write('no es json\n')
+                f.write('{"titulo": "Sin autor", "fecha_publicacion": "1955-03-19"}\n')
+
+            salida, _ = self.importar(archivo, rechazados=rechazados)
+            with open(rechazados, encoding='utf-8') as f:
+                lineas = [json.loads(linea) for linea in f]
+
+        self.assertEqual(Libro.objects.get().autor, "Juan Rulfo")
+        self.assertIn('1 libros importados', salida)
+        self.assertEqual([l['linea'] for l in lineas], [3, 4])
+        self.assertIn('autor', lineas[1]['errores'])
+
+    def test_csv_sin_columnas(self):
+        """Test que un CSV sin las columnas del formulario se rechaza completo"""
+        with self.assertRaises(CommandError):
+            self.importar('-', entrada="nombre,apellido\nAna,Pérez\n")
+        with self.assertRaises(CommandError):
+            self.importar('-', entrada="", lote=0)
+
+
+class FilasEnCacheTest(TestCase):
+    """Tests para la caché por fila de los listados"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        self.libros = [
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date(2000, 1, 1))
+            for i in range(3)
+        ]
+
+    def renderizar(self):
+        renders = []
+        original = DjangoTemplate.render
+
+        def contar(plantilla, context=None, request=None):
+            renders.append(context['libro'].pk)
+            return original(plantilla, context, request)
+
+        with patch.object(DjangoTemplate, 'render', contar):
+            html = fragmentos.renderizar_filas(list(Libro.objects.order_by('id')), 'fila_libro.html', 'libro')
+        return html, renders
+
+    def test_solo_se_renderiza_la_fila_editada(self):
+        """Test que tras editar un libro solo su fila se vuelve a renderizar"""
+        _, renders = self.renderizar()
+        self.assertEqual(len(renders), 3)
+
+        libro = self.libros[1]
+        libro.titulo = "Editado"
+        libro.save()
+        html, renders = self.renderizar()
+        self.assertEqual(renders, [libro.pk])
+        self.assertIn("Editado", html)
+
+    def test_mismo_html_que_sin_cache(self):
+        """Test que las filas en caché producen el mismo HTML que el render completo"""
+        self.renderizar()
+        html, renders = self.renderizar()
+        self.assertEqual(renders, [])
+        with override_settings(LIST_ROW_CACHE_TIMEOUT=0):
+            self.assertEqual(self.renderizar()[0], html)
+
+    def test_update_marca_updated_at(self):
+        """Test que auto_now actualiza updated_at al guardar"""
+        antes = self.libros[0].updated_at
+        self.libros[0].autor = "Otro"
+        self.libros[0].save()
+        self.assertGreater(self.libros[0].updated_at, antes)
+
+    def test_listado_muestra_cambios(self):
+        """Test que el listado refleja la edición de un libro con las filas en caché"""
+        url = reverse('libros:libros')
+        self.client.get(url)
+        self.libros[2].titulo = "Título nuevo"
+        self.libros[2].save()
+        response = self.client.get(url)
+        self.assertContains(response, "Título nuevo")
+        self.assertContains(response, "Libro 0")
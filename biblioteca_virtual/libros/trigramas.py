@@ -0,0 +1,302 @@
+"""
+Búsqueda difusa (tolerante a errores de tipeo) por título y autor.
+
+- PostgreSQL: extensión pg_trgm con índices GIN ``gin_trgm_ops`` sobre
+  titulo y autor sin acentos (``SIN_ACENTOS``, un envoltorio inmutable de
+  ``unaccent``); el operador ``<%`` propone los candidatos.
+- SQLite: índice invertido de trigramas en memoria del proceso, construido
+  desde el catálogo la primera vez que se usa y mantenido con las señales
+  de Libro. Los libros nuevos de otros procesos se incorporan por id en cada
+  consulta y el índice se reconstruye completo cada BUSQUEDA_DIFUSA_REFRESCO
+  segundos para recoger ediciones y borrados hechos fuera del proceso.
+
+En ambos motores el puntaje final es la fracción de trigramas de la consulta
+presentes en el texto sin acentos (0 a 1) y se calcula aquí, así los dos
+ordenan igual. ``word_similarity`` mide contra el mejor tramo del texto y da
+valores menores, por eso en PostgreSQL el umbral de candidatos es
+``umbral * FACTOR_CANDIDATOS``.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+
+from .models import Libro
+
+TABLA = 'libros_libro'
+COLUMNAS = ('id', 'titulo', 'autor', 'fecha_publicacion', 'en_prestamo')
+VACIA = array('I')
+SIN_ACENTOS = 'libros_sin_acentos'
+FACTOR_CANDIDATOS = 0.5
+
+
+def soportada(connection):
+  return connection.vendor in ('postgresql', 'sqlite')
+
+
+def crear_estructura(connection):
+  if connection.vendor != 'postgresql':
+    return
+  with connection.cursor() as cursor:
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    # unaccent() no es IMMUTABLE y no sirve en un índice de expresión; el
+    # envoltorio fija el diccionario con su esquema para no depender del search_path
+    cursor.execute(
+      "SELECT n.nspname FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace "
+      "WHERE e.extname = 'unaccent'"
+    )
+    esquema = connection.ops.quote_name(cursor.fetchone()[0])
+    cursor.execute(
+      f"CREATE OR REPLACE FUNCTION {SIN_ACENTOS}(text) RETURNS text "
+      "LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE "
+      f"AS $$ SELECT {esquema}.unaccent('{esquema}.unaccent'::regdictionary, $1) $$"
+    )
+    cursor.execute(
+      f"CREATE INDEX IF NOT EXISTS libro_titulo_sin_acentos_trgm ON {TABLA} "
+      f"USING gin ({SIN_ACENTOS}(titulo) gin_trgm_ops)"
+    )
+    cursor.execute(
+      f"CREATE INDEX IF NOT EXISTS libro_autor_sin_acentos_trgm ON {TABLA} "
+      f"USING gin ({SIN_ACENTOS}(autor) gin_trgm_ops)"
+    )
+
+
+def eliminar_estructura(connection):
+  if connection.vendor != 'postgresql':
+    return
+  with connection.cursor() as cursor:
+    cursor.execute("DROP INDEX IF EXISTS libro_titulo_sin_acentos_trgm")
+    cursor.execute("DROP INDEX IF EXISTS libro_autor_sin_acentos_trgm")
+    cursor.execute(f"DROP FUNCTION IF EXISTS {SIN_ACENTOS}(text)")
+
+
+def normalizar(texto):
+  texto = unicodedata.normalize('NFKD', texto.lower())
+  return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def trigramas(texto):
+  """Trigramas al estilo pg_trgm: cada palabra con dos espacios antes y uno después"""
+  conjunto = set()
+  for palabra in re.findall(r'[^\W_]+', normalizar(texto)):
+    palabra = f"  {palabra} "
+    for i in range(len(palabra) - 2):
+      conjunto.add(palabra[i:i + 3])
+  return conjunto
+
+
+def puntaje(consulta, texto):
+  """(cobertura, similitud) de los trigramas ``consulta`` contra ``texto``"""
+  objetivo = trigramas(texto)
+  comunes = len(consulta & objetivo)
+  return comunes / len(consulta), comunes / (len(consulta) + len(objetivo) - comunes)
+
+
+class IndiceTrigramas:
+  """
+  Índice invertido trigrama -> ranuras. Cada texto distinto (un título o un
+  autor, que suele repetirse entre libros) ocupa una ranura con el conjunto
+  de libros que lo usan. Las ranuras se numeran en orden, así las listas
+  quedan ordenadas y se pueden recorrer con bisect. Cuando un texto deja de
+  usarse su ranura queda vacía (muerta) en lugar de quitarla de las listas.
+  """
+
+  def __init__(self):
+    self._listas = {}
+    self._textos = {}
+    self._libros = []
+    self._tamanos = array('H')
+    self._ranuras = {}
+    self.muertas = 0
+    self.maximo = 0
+    self.construido = time.monotonic()
+
+  def __len__(self):
+    return len(self._ranuras)
+
+  def agregar(self, libro_id, *textos):
+    self.quitar(libro_id)
+    ranuras = set()
+    for texto in textos:
+      clave = normalizar(texto or '').strip()
+      ranura = self._textos.get(clave)
+      if ranura is None:
+        conjunto = trigramas(clave)
+        if not conjunto:
+          continue
+        ranura = self._textos[clave] = len(self._libros)
+        self._libros.append(set())
+        self._tamanos.append(min(len(conjunto), 0xFFFF))
+        for trigrama in conjunto:
+          lista = self._listas.get(trigrama)
+          if lista is None:
+            lista = self._listas[trigrama] = array('I')
+          lista.append(ranura)
+      elif not self._libros[ranura]:
+        self.muertas -= 1
+      self._libros[ranura].add(libro_id)
+      ranuras.add(ranura)
+    self._ranuras[libro_id] = tuple(ranuras)
+    self.maximo = max(self.maximo, libro_id)
+
+  def quitar(self, libro_id):
+    for ranura in self._ranuras.pop(libro_id, ()):
+      libros = self._libros[ranura]
+      libros.discard(libro_id)
+      if not libros:
+        self.muertas += 1
+
+  def candidatos(self, q, limite, umbral):
+    """
+    Hasta ``limite`` pares (libro_id, cobertura) con cobertura >= umbral,
+    de mayor a menor. Un texto que alcance el umbral tiene que contener al
+    menos ``minimo`` trigramas de la consulta, por lo que basta con contar
+    sobre las n - minimo + 1 listas más cortas y luego verificar el resto
+    con búsqueda binaria (filtrado por prefijo).
+    """
+    consulta = trigramas(q)
+    if not consulta:
+      return []
+    listas = sorted((self._listas.get(t, VACIA) for t in consulta), key=len)
+    n = len(listas)
+    minimo = max(1, math.ceil(umbral * n))
+    prefijo = n - minimo + 1
+
+    cuentas = Counter()
+    for lista in listas[:prefijo]:
+      cuentas.update(lista)
+
+    for i, lista in enumerate(listas[prefijo:], start=prefijo):
+      faltan = n - i
+      nuevas = {}
+      for ranura, cuenta in cuentas.items():
+        if cuenta + faltan < minimo:
+          continue
+        j = bisect_left(lista, ranura)
+        nuevas[ranura] = cuenta + (j < len(lista) and lista[j] == ranura)
+      cuentas = nuevas
+
+    puntuadas = sorted(
+      (
+        (cuenta / n, cuenta / (n + self._tamanos[ranura] - cuenta), ranura)
+        for ranura, cuenta in cuentas.items()
+        if cuenta >= minimo and self._libros[ranura]
+      ),
+      reverse=True,
+    )
+    mejores = {}
+    for cobertura, _, ranura in puntuadas:
+      for libro_id in sorted(self._libros[ranura]):
+        mejores.setdefault(libro_id, cobertura)
+        if len(mejores) >= limite:
+          return list(mejores.items())
+    return list(mejores.items())
+
+
+_indices = {}
+_candado = threading.Lock()
+
+
+def _construir(alias):
+  indice = IndiceTrigramas()
+  filas = Libro.objects.using(alias).values_list('id', 'titulo', 'autor').order_by('id')
+  for libro_id, titulo, autor in filas.iterator(chunk_size=5000):
+    indice.agregar(libro_id, titulo, autor)
+  return indice
+
+
+def indice(connection=default_connection):
+  """Índice en memoria de la base ``connection``, al día con los ids nuevos"""
+  alias = connection.alias
+  with _candado:
+    actual = _indices.get(alias)
+    vencido = actual is not None and (
+      time.monotonic() - actual.construido > settings.BUSQUEDA_DIFUSA_REFRESCO
+      or actual.muertas > len(actual)
+    )
+    if actual is None or vencido:
+      actual = _indices[alias] = _construir(alias)
+    else:
+      nuevos = Libro.objects.using(alias).filter(id__gt=actual.maximo).values_list('id', 'titulo', 'autor')
+      for libro_id, titulo, autor in nuevos.order_by('id'):
+        actual.agregar(libro_id, titulo, autor)
+    return actual
+
+
+def actualizar(libro, connection=default_connection):
+  """Refleja ``libro`` en el índice del proceso, si ya fue construido"""
+  with _candado:
+    actual = _indices.get(connection.alias)
+    if actual is not None:
+      actual.agregar(libro.pk, libro.titulo, libro.autor)
+
+
+def quitar(libro_id, connection=default_connection):
+  with _candado:
+    actual = _indices.get(connection.alias)
+    if actual is not None:
+      actual.quitar(libro_id)
+
+
+def descartar(connection=default_connection):
+  """Olvida el índice en memoria; se reconstruye en la próxima búsqueda"""
+  with _candado:
+    _indices.pop(connection.alias, None)
+
+
+def buscar(q, limite=None, umbral=None, connection=default_connection):
+  """
+  Libros parecidos a ``q`` en título o autor, con el atributo ``puntaje``,
+  de mayor a menor puntaje y luego por id. Como máximo BUSQUEDA_DIFUSA_LIMITE.
+  """
+  maximo = settings.BUSQUEDA_DIFUSA_LIMITE
+  limite = min(limite or maximo, maximo)
+  umbral = settings.BUSQUEDA_DIFUSA_UMBRAL if umbral is None else umbral
+  q = q.strip()[:200]
+  if not q or not soportada(connection):
+    return []
+
+  # El índice solo propone candidatos; el puntaje final se calcula sobre el
+  # texto actual de la base, así una entrada desactualizada no se cuela.
+  if connection.vendor == 'postgresql':
+    libros = {libro.pk: libro for libro in _candidatos_postgresql(q, limite * 2, umbral, connection)}
+  else:
+    candidatos = indice(connection).candidatos(q, limite * 2, umbral)
+    libros = Libro.objects.using(connection.alias).only(*COLUMNAS).in_bulk([c[0] for c in candidatos])
+  consulta = trigramas(q)
+  resultados = []
+  for libro in libros.values():
+    libro.puntaje, similitud = max(puntaje(consulta, libro.titulo), puntaje(consulta, libro.autor))
+    if libro.puntaje >= umbral:
+      resultados.append((-libro.puntaje, -similitud, libro.pk, libro))
+  resultados.sort(key=lambda r: r[:3])
+  return [r[3] for r in resultados[:limite]]
+
+
+def _candidatos_postgresql(q, limite, umbral, connection):
+  columnas = ', '.join(COLUMNAS)
+  titulo, autor = f"{SIN_ACENTOS}(titulo)", f"{SIN_ACENTOS}(autor)"
+  # <% usa los índices GIN y filtra por pg_trgm.word_similarity_threshold,
+  # que se fija solo para esta transacción
+  sql = (
+    f"SELECT {columnas} FROM {TABLA}, {SIN_ACENTOS}(%s) consulta "
+    f"WHERE consulta <%% {titulo} OR consulta <%% {autor} "
+    f"ORDER BY GREATEST(word_similarity(consulta, {titulo}), word_similarity(consulta, {autor})) DESC, id "
+    "LIMIT %s"
+  )
+  with transaction.atomic(using=connection.alias):
+    with connection.cursor() as cursor:
+      cursor.execute(
+        "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+        [str(umbral * FACTOR_CANDIDATOS)],
+      )
+    return list(Libro.objects.db_manager(connection.alias).raw(sql, [q, limite]))
@@ -1,11 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
+
+# Con ASYNC_VIEWS las vistas de lectura son las async (servidor ASGI)
+lectura = views_async if settings.ASYNC_VIEWS else views
 
 app_name = 'libros'
 
 urlpatterns = [
-    path('', views.libros, name='libros'),
+    path('', lectura.libros, name='libros'),
     path('create/', views.create_libro, name='crear_libro'),
-    path('<int:id>/', views.edit_libro, name='editar_libro'),
+    path('buscar/', lectura.buscar_libros, name='buscar_libros'),
+    path('autocompletar/', lectura.autocompletar_libros, name='autocompletar_libros'),
+    path('exportar/', views.exportar_libros, name='exportar_libros'),
+    path('<int:id>/', lectura.edit_libro, name='editar_libro'),
     path('delete/<int:id>/', views.delete_libro, name='eliminar_libro')
 ]
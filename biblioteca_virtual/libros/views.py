@@ -1,10 +1,104 @@
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from django.db import connections, router
+from biblioteca_virtual import cache_listados, condicional, consultas, exportacion, replicas
+from biblioteca_virtual.paginacion import Pagina, paginar
+from . import busqueda, trigramas
 from .models import Libro
 from .forms import LibroForm
 
+ORDENES = {
+  'id': 'id',
+  'titulo': 'titulo',
+  'autor': 'autor',
+  'fecha_publicacion': '-fecha_publicacion',
+}
+
+COLUMNAS_LISTADO = ('id', 'titulo', 'autor', 'fecha_publicacion', 'en_prestamo', 'updated_at')
+
+# Las consultas de las vistas de lectura se arman en estas funciones, que
+# comparten las vistas sync y las async (views_async.py): cada una solo
+# cambia cómo las recorre.
+
+def listado(request):
+  """(queryset, clave de orden) del listado de libros"""
+  orden = request.GET.get('orden', 'id')
+  if orden not in ORDENES:
+    orden = 'id'
+  return Libro.objects.only(*COLUMNAS_LISTADO), orden
+
+def consultas_autocompletado(request):
+  """
+  Consultas del autocompletado (ninguna sin término): solo libros
+  disponibles y una por columna sobre su índice de prefijo
+  """
+  q = request.GET.get('q', '').strip()[:100]
+  if not q:
+    return []
+  limite = settings.AUTOCOMPLETE_LIMIT
+  disponibles = Libro.objects.filter(en_prestamo=False).only('id', 'titulo', 'autor')
+  return [disponibles.filter(**filtro)[:limite] for filtro in ({'titulo__istartswith': q}, {'autor__istartswith': q})]
+
+def respuesta_autocompletado(encontrados):
+  """JSON con los libros de consultas_autocompletado, sin repetir y en orden de título"""
+  libros = sorted({l.id: l for l in encontrados}.values(), key=lambda l: (l.titulo.lower(), l.id))
+  return JsonResponse({'resultados': [{'id': l.id, 'texto': str(l)} for l in libros[:settings.AUTOCOMPLETE_LIMIT]]})
+
+@replicas.lectura
+@cache_listados.cachear_listado(Libro)
+@condicional.listado(Libro)
+@consultas.presupuesto(2)
 def libros(request):
-  return render(request, 'listar_libros.html', {'libros': Libro.objects.all().order_by("id")})
+  queryset, orden = listado(request)
+  pagina = paginar(request, queryset, ORDENES[orden])
+  return render(request, 'listar_libros.html', {'libros': pagina.objetos, 'pagina': pagina, 'orden': orden})
+
+@replicas.lectura
+def buscar_libros(request):
+  return render(request, 'buscar_libros.html', contexto_busqueda(request))
+
+def contexto_busqueda(request):
+  # La búsqueda es SQL crudo (FTS/tsvector, trigramas): la vista async la llama con sync_to_async
+  q = request.GET.get('q', '').strip()[:200]
+  try:
+    numero = max(int(request.GET.get('pagina', 1)), 1)
+  except ValueError:
+    numero = 1
+
+  difusa = request.GET.get('modo') == 'difusa'
+
+  tamano = settings.LIST_PAGE_SIZE
+  conexion = connections[router.db_for_read(Libro)]
+  resultados = []
+  if q and not difusa:
+    resultados = busqueda.buscar(q, tamano + 1, (numero - 1) * tamano, conexion)
+    # Sin coincidencias exactas se ofrecen las parecidas (errores de tipeo)
+    difusa = not resultados and numero == 1
+
+  if q and difusa:
+    libros = trigramas.buscar(q, connection=conexion)
+    return {'libros': libros, 'pagina': Pagina(libros), 'q': q, 'difusa': True}
+
+  pagina = Pagina(
+    resultados[:tamano],
+    numero + 1 if len(resultados) > tamano else None,
+    numero - 1 if numero > 1 else None,
+    request,
+    parametro='pagina',
+  )
+  return {'libros': pagina.objetos, 'pagina': pagina, 'q': q}
+
+@replicas.lectura
+def autocompletar_libros(request):
+  consultas_hechas = consultas_autocompletado(request)
+  return respuesta_autocompletado(libro for consulta in consultas_hechas for libro in consulta)
+
+@replicas.lectura
+@condicional.listado(Libro)
+def exportar_libros(request):
+  return exportacion.respuesta(request, 'libros')
 
 def create_libro(request):
   if request.method == "POST":
@@ -18,6 +112,7 @@ def create_libro(request):
 
   return render(request, "create_libro.html", {"form": form})
 
+@condicional.detalle(Libro, csrf=True)
 def edit_libro(request, id):
   libro = get_object_or_404(Libro, id=id)
   
@@ -0,0 +1,47 @@
+"""
+Versiones async de las vistas de lectura de libros, para servir con ASGI
+(ASYNC_VIEWS=True). Las consultas usan el ORM async; el render va por
+sync_to_async porque las filas de los listados se leen de la caché, que
+puede estar en la base. Los POST de edición los resuelve la vista sync.
+
+Las consultas las arman las funciones de views.py; acá solo cambia cómo se
+recorren.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+from biblioteca_virtual import cache_listados, condicional, consultas, replicas
+from biblioteca_virtual.paginacion import apaginar
+from . import views
+from .forms import LibroForm
+from .models import Libro
+
+@replicas.lectura
+@cache_listados.cachear_listado(Libro)
+@condicional.listado(Libro)
+@consultas.presupuesto(2)
+async def libros(request):
+  queryset, orden = views.listado(request)
+  pagina = await apaginar(request, queryset, views.ORDENES[orden])
+  return await sync_to_async(render)(request, 'listar_libros.html', {'libros': pagina.objetos, 'pagina': pagina, 'orden': orden})
+
+@replicas.lectura
+async def buscar_libros(request):
+  # FTS y trigramas son SQL crudo, que no tiene API async
+  contexto = await sync_to_async(views.contexto_busqueda)(request)
+  return await sync_to_async(render)(request, 'buscar_libros.html', contexto)
+
+@replicas.lectura
+async def autocompletar_libros(request):
+  encontrados = [libro for consulta in views.consultas_autocompletado(request) async for libro in consulta]
+  return views.respuesta_autocompletado(encontrados)
+
+@condicional.detalle(Libro, csrf=True)
+async def edit_libro(request, id):
+  if request.method != 'GET':
+    return await sync_to_async(views.edit_libro)(request, id)
+  try:
+    libro = await Libro.objects.aget(id=id)
+  except Libro.DoesNotExist:
+    raise Http404("No existe el libro")
+  return await sync_to_async(render)(request, 'edit_libro.html', {'libro': libro, 'form': LibroForm(instance=libro)})
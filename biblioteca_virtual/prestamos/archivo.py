@@ -0,0 +1,126 @@
+"""
+Archivo del historial de préstamos.
+
+Prestamo nunca se borra (on_delete=RESTRICT), así que la tabla crece sin
+límite. ``archivar`` mueve a PrestamoArchivado los préstamos devueltos con
+fecha_prestamo anterior a un corte, por lotes: cada lote se copia y se borra
+en la misma transacción, así que el proceso puede cortarse y volver a correr
+sin perder ni duplicar filas. En prestamos_prestamo quedan los abiertos y el
+historial reciente.
+
+En PostgreSQL el archivo es una tabla particionada por rango de
+fecha_prestamo, con una partición por año que se crea antes de insertar en
+ella: una consulta por fechas solo lee las particiones del rango y un año
+viejo se puede desprender con DETACH PARTITION. En los demás motores es una
+tabla común. Como con la búsqueda de texto completo, la tabla particionada
+la crea la migración; el esquema de los tests sale del modelo.
+
+El listado de préstamos suma el archivo solo cuando el rango de fechas pedido
+empieza antes de ``limite()``, la fecha del préstamo archivado más reciente.
+Se guarda en la caché con la versión de PrestamoArchivado de cache_listados
+en la clave, así que cambia con el archivo igual que las páginas del
+listado, y con su mismo vencimiento (LIST_CACHE_TIMEOUT): con locmem un
+worker que no archivó no ve la versión nueva, pero tampoco guarda el límite
+viejo para siempre.
+"""
+
+from datetime import timezone as tz
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+
+from biblioteca_virtual import cache_listados
+from cambios.models import Borrados
+from .models import Prestamo, PrestamoArchivado
+
+TABLA = PrestamoArchivado._meta.db_table
+COLUMNAS = (
+  'id', 'usuario_id', 'libro_id', 'fecha_prestamo', 'fecha_devolucion',
+  'fecha_vencimiento', 'marcado_vencido', 'updated_at',
+)
+CLAVE_LIMITE = 'prestamos:archivo:limite'
+
+_SIN_CALCULAR = object()
+
+
+def asegurar_particiones(connection, anios):
+  """Crea las particiones de los ``anios`` (UTC) que falten; solo PostgreSQL"""
+  if connection.vendor != 'postgresql':
+    return
+  with connection.cursor() as cursor:
+    for anio in sorted(anios):
+      cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {TABLA}_{anio} PARTITION OF {TABLA} "
+        f"FOR VALUES FROM ('{anio}-01-01 00:00:00+00') TO ('{anio + 1}-01-01 00:00:00+00')"
+      )
+
+
+def particiones(connection):
+  """[(nombre, filas estimadas)] de las particiones del archivo; solo PostgreSQL"""
+  if connection.vendor != 'postgresql':
+    return []
+  with connection.cursor() as cursor:
+    cursor.execute(
+      "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i "
+      "JOIN pg_class c ON c.oid = i.inhrelid "
+      "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+      [TABLA],
+    )
+    return cursor.fetchall()
+
+
+def pendientes(corte, using=DEFAULT_DB_ALIAS):
+  """Préstamos devueltos con fecha_prestamo anterior a ``corte``"""
+  return Prestamo.objects.using(using).filter(fecha_devolucion__isnull=False, fecha_prestamo__lt=corte)
+
+
+def archivar(corte, lote=5000, using=DEFAULT_DB_ALIAS, max_lotes=None, progreso=None):
+  """
+  Mueve al archivo los préstamos de ``pendientes(corte)`` de a ``lote`` filas,
+  en orden de id y cada lote en su transacción; con ``max_lotes`` se detiene
+  antes y la próxima ejecución sigue desde ahí. Devuelve cuántos movió.
+  """
+  connection = connections[using]
+  tabla = connection.ops.quote_name(Prestamo._meta.db_table)
+  consulta = pendientes(corte, using).order_by('id').select_for_update().values_list(*COLUMNAS)
+  anios = set()
+  total = lotes = 0
+
+  while max_lotes is None or lotes < max_lotes:
+    with transaction.atomic(using=using):
+      filas = list(consulta[:lote])
+      if not filas:
+        break
+      nuevos = {fila[3].astimezone(tz.utc).year for fila in filas} - anios
+      asegurar_particiones(connection, nuevos)
+      anios |= nuevos
+
+      PrestamoArchivado.objects.using(using).bulk_create(
+        PrestamoArchivado(**dict(zip(COLUMNAS, fila))) for fila in filas
+      )
+      # Sin Prestamo.delete(): archivar no es eliminar y el feed de cambios
+      # no debe informarlo como una eliminación
+      ids = [fila[0] for fila in filas]
+      with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabla} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+      # Pero sí cambia los listados: sin esto sus ETag seguirían iguales
+      Borrados.sumar(Prestamo, len(ids), using)
+      cache_listados.invalidar(Prestamo, PrestamoArchivado)
+
+    total += len(filas)
+    lotes += 1
+    if progreso:
+      progreso(total)
+  return total
+
+
+def limite():
+  """fecha_prestamo del préstamo archivado más reciente (None con el archivo vacío)"""
+  clave = f"{CLAVE_LIMITE}:{cache_listados.versiones(PrestamoArchivado)[0]}"
+  valor = cache.get(clave, _SIN_CALCULAR)
+  if valor is _SIN_CALCULAR:
+    valor = PrestamoArchivado.objects.aggregate(limite=Max('fecha_prestamo'))['limite']
+    cache.set(clave, valor, timeout=settings.LIST_CACHE_TIMEOUT)
+  return valor
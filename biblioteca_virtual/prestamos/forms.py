@@ -1,5 +1,10 @@
+from datetime import datetime, time, timedelta
 from django import forms
+from django.conf import settings
+from django.utils import timezone
+from . import archivo
 from .models import Prestamo
+from .widgets import AutocompletarWidget
 from usuarios.models import Usuario
 from libros.models import Libro
 
@@ -8,11 +13,97 @@ class PrestamoForm(forms.ModelForm):
         model = Prestamo
         fields = ['usuario', 'libro']
         widgets = {
-            'usuario': forms.Select(attrs={'class': 'form-control'}),
-            'libro': forms.Select(attrs={'class': 'form-control'}),
+            'usuario': AutocompletarWidget('usuarios:autocompletar_usuarios', attrs={'class': 'form-control', 'placeholder': 'Nombre o correo'}),
+            'libro': AutocompletarWidget('libros:autocompletar_libros', attrs={'class': 'form-control', 'placeholder': 'Título o autor'}),
         }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['usuario'].queryset = Usuario.objects.filter(activo=True)
-        self.fields['libro'].queryset = Libro.objects.filter(en_prestamo=False)
\ No newline at end of file
+        self.fields['libro'].queryset = Libro.objects.filter(en_prestamo=False)
+
+    def _get_validation_exclusions(self):
+        # Los ModelChoiceField ya cargaron usuario y libro; sin esto full_clean()
+        # repite una consulta por llave foránea. Que el libro no tenga otro
+        # préstamo abierto lo garantiza la restricción en la base de datos.
+        exclude = super()._get_validation_exclusions()
+        exclude.update({'usuario', 'libro'})
+        return exclude
+
+class ListaIdsField(forms.Field):
+    default_error_messages = {
+        'invalid': 'Debe ser una lista de ids enteros positivos.',
+        'max_length': 'Se permiten como máximo %(maximo)d elementos por lote.',
+    }
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return []
+        if not isinstance(value, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool) and i > 0 for i in value
+        ):
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+        return value
+
+    def validate(self, value):
+        super().validate(value)
+        maximo = settings.PRESTAMOS_LOTE_MAXIMO
+        if len(value) > maximo:
+            raise forms.ValidationError(
+                self.error_messages['max_length'], code='max_length', params={'maximo': maximo}
+            )
+
+class PrestamoLoteForm(forms.Form):
+    usuario = forms.ModelChoiceField(queryset=Usuario.objects.filter(activo=True))
+    libros = ListaIdsField()
+
+class DevolucionLoteForm(forms.Form):
+    prestamos = ListaIdsField()
+
+class PrestamoFiltroForm(forms.Form):
+    ESTADOS = [
+        ('', 'Todos'),
+        ('activos', 'Activos'),
+        ('devueltos', 'Devueltos'),
+        ('vencidos', 'Vencidos'),
+    ]
+
+    estado = forms.ChoiceField(choices=ESTADOS, required=False)
+    usuario = forms.IntegerField(required=False, min_value=1)
+    libro = forms.IntegerField(required=False, min_value=1)
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def filtrar(self, queryset):
+        """Aplica los filtros válidos sobre un queryset de Prestamo"""
+        datos = self.cleaned_data
+        if datos.get('estado') == 'activos':
+            queryset = queryset.filter(fecha_devolucion__isnull=True)
+        elif datos.get('estado') == 'devueltos':
+            queryset = queryset.filter(fecha_devolucion__isnull=False)
+        elif datos.get('estado') == 'vencidos':
+            # Los que marcó el barrido (comando vencidos --marcar): la marca
+            # cambia updated_at, así el listado en caché no queda desactualizado
+            queryset = queryset.filter(fecha_devolucion__isnull=True, marcado_vencido__isnull=False)
+        if datos.get('usuario'):
+            queryset = queryset.filter(usuario_id=datos['usuario'])
+        if datos.get('libro'):
+            queryset = queryset.filter(libro_id=datos['libro'])
+        # Rangos sobre la columna cruda (sin __date) para que puedan usar índices
+        if datos.get('desde'):
+            queryset = queryset.filter(fecha_prestamo__gte=_inicio_del_dia(datos['desde']))
+        if datos.get('hasta'):
+            queryset = queryset.filter(fecha_prestamo__lt=_inicio_del_dia(datos['hasta'] + timedelta(days=1)))
+        return queryset
+
+    def incluye_archivo(self):
+        """Si el rango de fechas pedido llega a los préstamos archivados"""
+        datos = self.cleaned_data
+        if datos.get('estado') in ('activos', 'vencidos') or not (datos.get('desde') or datos.get('hasta')):
+            return False
+        limite = archivo.limite()
+        return limite is not None and (not datos.get('desde') or _inicio_del_dia(datos['desde']) <= limite)
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
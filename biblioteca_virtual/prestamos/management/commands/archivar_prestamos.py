@@ -0,0 +1,58 @@
+import time
+from datetime import date, datetime, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+from prestamos import archivo
+
+
+def _fecha(valor):
+  try:
+    return date.fromisoformat(valor)
+  except ValueError as e:
+    raise CommandError(f"Fecha inválida: {valor} (se espera AAAA-MM-DD)") from e
+
+
+class Command(BaseCommand):
+  help = (
+    "Mueve al archivo los préstamos devueltos con fecha de préstamo anterior al "
+    "corte, por lotes y cada lote en su transacción: se puede interrumpir y "
+    "volver a correr, sigue con lo que falta. En PostgreSQL crea las particiones "
+    "anuales del archivo que hagan falta."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--antes-de', type=_fecha, help="Fecha de corte AAAA-MM-DD (por defecto hoy menos PRESTAMOS_ARCHIVO_DIAS)")
+    parser.add_argument('--lote', type=int, default=5000, help="Préstamos por lote (por defecto 5000)")
+    parser.add_argument('--max-lotes', type=int, help="Detenerse después de esta cantidad de lotes")
+    parser.add_argument('--simular', action='store_true', help="Solo contar los préstamos que se archivarían")
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    if options['lote'] < 1 or (options['max_lotes'] is not None and options['max_lotes'] < 1):
+      raise CommandError("--lote y --max-lotes deben ser mayores que cero")
+
+    dia = options['antes_de'] or timezone.localdate() - timedelta(days=settings.PRESTAMOS_ARCHIVO_DIAS)
+    corte = timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+    using = options['database']
+
+    if options['simular']:
+      cantidad = archivo.pendientes(corte, using).count()
+      self.stdout.write(f"{cantidad} préstamos devueltos antes del {dia} se archivarían")
+      return
+
+    def progreso(total):
+      if options['verbosity'] > 1:
+        self.stdout.write(f"  {total} archivados")
+
+    inicio = time.monotonic()
+    total = archivo.archivar(corte, options['lote'], using, options['max_lotes'], progreso)
+    restantes = archivo.pendientes(corte, using).exists()
+    self.stdout.write(self.style.SUCCESS(
+      f"{total} préstamos devueltos antes del {dia} archivados en {time.monotonic() - inicio:.1f}s"
+      + (" (quedan pendientes: vuelva a ejecutar el comando)" if restantes else "")
+    ))
+    if options['verbosity'] > 1:
+      for nombre, filas in archivo.particiones(connections[using]):
+        self.stdout.write(f"  {nombre}: ~{filas} filas")
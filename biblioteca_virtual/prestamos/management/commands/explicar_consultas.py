@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from libros.models import Libro
+from usuarios.models import Usuario
+from prestamos.models import Prestamo
+from prestamos.services import vencidos
+
+
+def consultas_frecuentes():
+  """(descripción, queryset, índice esperado) de cada consulta caliente"""
+  usuario_id = Usuario.objects.values_list('id', flat=True).first() or 1
+  libro_id = Libro.objects.values_list('id', flat=True).first() or 1
+  abiertos = Prestamo.objects.filter(fecha_devolucion__isnull=True)
+  return [
+    ("Libros disponibles (PrestamoForm)",
+     Libro.objects.filter(en_prestamo=False).order_by('id')[:50], 'libro_disponible_idx'),
+    ("Usuarios activos (PrestamoForm)",
+     Usuario.objects.filter(activo=True).order_by('id')[:50], 'usuario_activo_idx'),
+    ("Préstamos abiertos",
+     abiertos.order_by('id')[:50], 'prestamo_abierto_idx'),
+    ("Préstamos abiertos por usuario",
+     abiertos.filter(usuario_id=usuario_id).order_by('id')[:50], 'prestamo_abierto_usuario_idx'),
+    ("Préstamo abierto por libro",
+     abiertos.filter(libro_id=libro_id), 'prestamo_abierto_por_libro'),
+    ("Préstamos vencidos (comando vencidos)",
+     vencidos().values_list('fecha_vencimiento', 'id')[:1000], 'prestamo_abierto_vence_idx'),
+    ("Libros ordenados por autor",
+     Libro.objects.order_by('autor', 'id')[:50], 'libro_autor_id_idx'),
+  ]
+
+
+class Command(BaseCommand):
+  help = "Muestra el plan de ejecución (EXPLAIN) de las consultas más frecuentes y si usan su índice"
+
+  def add_arguments(self, parser):
+    parser.add_argument('--analyze', action='store_true', help="Ejecuta las consultas (EXPLAIN ANALYZE, solo PostgreSQL)")
+    parser.add_argument('--estricto', action='store_true', help="Termina con error si alguna consulta no usa su índice")
+
+  def handle(self, *args, **options):
+    opciones = {}
+    if options['analyze']:
+      if connection.vendor != 'postgresql':
+        raise CommandError("--analyze solo está disponible en PostgreSQL")
+      opciones['analyze'] = True
+
+    sin_indice = []
+    for descripcion, queryset, indice in consultas_frecuentes():
+      plan = queryset.explain(**opciones)
+      usa_indice = indice in plan
+      if not usa_indice:
+        sin_indice.append(descripcion)
+
+      self.stdout.write(self.style.MIGRATE_HEADING(descripcion))
+      self.stdout.write(plan)
+      if usa_indice:
+        self.stdout.write(self.style.SUCCESS(f"Usa {indice}"))
+      else:
+        self.stdout.write(self.style.WARNING(f"No usa {indice}"))
+      self.stdout.write("")
+
+    if sin_indice and options['estricto']:
+      raise CommandError(f"Consultas sin su índice: {', '.join(sin_indice)}")
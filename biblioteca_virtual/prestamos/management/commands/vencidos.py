@@ -0,0 +1,58 @@
+import csv
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from prestamos.services import marcar_vencidos, vencidos
+
+COLUMNAS = (
+  'id', 'usuario_id', 'usuario__nombre', 'usuario__correo', 'libro_id', 'libro__titulo',
+  'fecha_prestamo', 'fecha_vencimiento', 'marcado_vencido',
+)
+
+
+class Command(BaseCommand):
+  help = (
+    "Lista en CSV los préstamos abiertos cuya fecha de vencimiento ya pasó, en orden "
+    "de vencimiento, o con --marcar les pone la fecha actual en marcado_vencido "
+    "(los que ya estaban marcados no cambian). Ambos recorren el índice parcial de "
+    "préstamos abiertos por vencimiento, sin revisar los que no vencieron."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--marcar', action='store_true', help="Marcar los vencidos en lugar de listarlos")
+    parser.add_argument('--sin-marcar', action='store_true', help="Listar solo los que todavía no se marcaron")
+    parser.add_argument('--lote', type=int, default=10000, help="Filas por lectura o por UPDATE (por defecto 10000)")
+    parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+  def handle(self, *args, **options):
+    if options['lote'] < 1:
+      raise CommandError("--lote debe ser mayor que cero")
+
+    ahora = timezone.now()
+    inicio = time.monotonic()
+    if options['marcar']:
+      def progreso(total):
+        if options['verbosity'] > 1:
+          self.stdout.write(f"  {total} marcados")
+
+      marcados = marcar_vencidos(ahora, options['lote'], options['database'], progreso)
+      self.stdout.write(self.style.SUCCESS(
+        f"{marcados} préstamos vencidos marcados en {time.monotonic() - inicio:.1f}s"
+      ))
+      return
+
+    consulta = vencidos(ahora, options['database'])
+    if options['sin_marcar']:
+      consulta = consulta.filter(marcado_vencido__isnull=True)
+    # La salida es el CSV; el resumen va a stderr para poder redirigirla
+    escritor = csv.writer(self.stdout, lineterminator='\n')
+    escritor.writerow([columna.replace('__', '_') for columna in COLUMNAS] + ['dias_vencido'])
+    total = 0
+    for fila in consulta.values_list(*COLUMNAS).iterator(chunk_size=options['lote']):
+      dias = (ahora - fila[COLUMNAS.index('fecha_vencimiento')]).days
+      escritor.writerow([
+        valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in fila
+      ] + [dias])
+      total += 1
+    self.stderr.write(f"{total} préstamos vencidos en {time.monotonic() - inicio:.1f}s")
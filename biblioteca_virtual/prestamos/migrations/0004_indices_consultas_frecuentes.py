@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prestamos', '0003_alter_prestamo_libro_alter_prestamo_usuario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('fecha_devolucion__isnull', True)), fields=['id'], name='prestamo_abierto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('fecha_devolucion__isnull', True)), fields=['usuario', 'id'], name='prestamo_abierto_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('fecha_devolucion__isnull', True)), fields=['libro'], name='prestamo_abierto_libro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['fecha_prestamo', 'id'], name='prestamo_fecha_prestamo_idx'),
+        ),
+    ]
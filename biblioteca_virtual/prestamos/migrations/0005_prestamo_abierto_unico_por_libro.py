@@ -0,0 +1,43 @@
+# Generated by Django 4.2.26 on 2026-10-16 20:48
+
+from django.db import migrations, models
+
+
+def verificar_duplicados(apps, schema_editor):
+    """Falla con la lista de libros que tienen más de un préstamo abierto"""
+    Prestamo = apps.get_model('prestamos', 'Prestamo')
+    abiertos = Prestamo.objects.using(schema_editor.connection.alias).filter(fecha_devolucion__isnull=True)
+    duplicados = (
+        abiertos.values('libro_id').annotate(cantidad=models.Count('id'))
+        .filter(cantidad__gt=1).order_by('libro_id').values_list('libro_id', flat=True)
+    )
+    detalle = []
+    for libro_id in duplicados[:50]:
+        ids = abiertos.filter(libro_id=libro_id).order_by('id').values_list('id', flat=True)
+        detalle.append(f"libro {libro_id}: préstamos {', '.join(map(str, ids))}")
+    if detalle:
+        # Cuál de los préstamos es el real no se puede deducir: lo decide quien opera la base
+        raise RuntimeError(
+            "No se puede crear la restricción prestamo_abierto_por_libro: hay libros con más de un "
+            "préstamo abierto. Cierre los que sobran (fecha_devolucion) y vuelva a ejecutar migrate.\n"
+            + "\n".join(detalle)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prestamos', '0004_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='prestamo',
+            name='prestamo_abierto_libro_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='prestamo',
+            constraint=models.UniqueConstraint(condition=models.Q(('fecha_devolucion__isnull', True)), fields=('libro',), name='prestamo_abierto_por_libro', violation_error_message='El libro ya tiene un préstamo abierto.'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.26 on 2026-10-16 21:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prestamos', '0005_prestamo_abierto_unico_por_libro'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestamo',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        # Con la fila más ancha el planificador de SQLite prefería el índice
+        # de la FK usuario al parcial (usuario, id); el parcial pasa a ser
+        # solo (usuario), que conserva el orden por rowid
+        migrations.RemoveIndex(
+            model_name='prestamo',
+            name='prestamo_abierto_usuario_idx',
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('fecha_devolucion__isnull', True)), fields=['usuario'], name='prestamo_abierto_usuario_idx'),
+        ),
+    ]
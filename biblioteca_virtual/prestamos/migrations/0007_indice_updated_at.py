@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-16 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prestamos', '0006_prestamo_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['updated_at'], name='prestamo_updated_at_idx'),
+        ),
+    ]
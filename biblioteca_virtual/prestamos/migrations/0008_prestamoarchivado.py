@@ -0,0 +1,68 @@
+# Generated by Django 4.2.26 on 2026-10-16 23:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def crear_archivo(apps, schema_editor):
+    """Particionada por rango de fecha_prestamo en PostgreSQL, común en el resto"""
+    modelo = apps.get_model('prestamos', 'PrestamoArchivado')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(modelo)
+        return
+    # Las particiones anuales las crea prestamos.archivo al archivar
+    schema_editor.execute(
+        "CREATE TABLE prestamos_prestamoarchivado ("
+        "id bigint NOT NULL, "
+        "usuario_id bigint NOT NULL REFERENCES usuarios_usuario (id) DEFERRABLE INITIALLY DEFERRED, "
+        "libro_id bigint NOT NULL REFERENCES libros_libro (id) DEFERRABLE INITIALLY DEFERRED, "
+        "fecha_prestamo timestamp with time zone NOT NULL, "
+        "fecha_devolucion timestamp with time zone NOT NULL, "
+        "updated_at timestamp with time zone NOT NULL, "
+        # La clave de una tabla particionada tiene que incluir la columna de
+        # partición; que el id no se repita lo asegura la secuencia de Prestamo
+        "PRIMARY KEY (id, fecha_prestamo)"
+        ") PARTITION BY RANGE (fecha_prestamo)"
+    )
+    # Los índices del padre se crean también en cada partición
+    schema_editor.execute('CREATE INDEX "archivado_fecha_prestamo_idx" ON "prestamos_prestamoarchivado" ("fecha_prestamo", "id")')
+    schema_editor.execute('CREATE INDEX "archivado_usuario_idx" ON "prestamos_prestamoarchivado" ("usuario_id", "fecha_prestamo")')
+    schema_editor.execute('CREATE INDEX "archivado_libro_idx" ON "prestamos_prestamoarchivado" ("libro_id", "fecha_prestamo")')
+
+
+def eliminar_archivo(apps, schema_editor):
+    # En PostgreSQL DROP TABLE se lleva también las particiones
+    schema_editor.delete_model(apps.get_model('prestamos', 'PrestamoArchivado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libros', '0009_indice_updated_at'),
+        ('usuarios', '0005_indice_updated_at'),
+        ('prestamos', '0007_indice_updated_at'),
+    ]
+
+    operations = [
+        # La tabla la crea crear_archivo: en PostgreSQL va particionada
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PrestamoArchivado',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('fecha_prestamo', models.DateTimeField()),
+                        ('fecha_devolucion', models.DateTimeField()),
+                        ('updated_at', models.DateTimeField()),
+                        ('libro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, related_name='prestamos_archivados', to='libros.libro')),
+                        ('usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, related_name='prestamos_archivados', to='usuarios.usuario')),
+                    ],
+                    options={
+                        'verbose_name_plural': 'Prestamos archivados',
+                        'indexes': [models.Index(fields=['fecha_prestamo', 'id'], name='archivado_fecha_prestamo_idx'), models.Index(fields=['usuario', 'fecha_prestamo'], name='archivado_usuario_idx'), models.Index(fields=['libro', 'fecha_prestamo'], name='archivado_libro_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(crear_archivo, eliminar_archivo),
+    ]
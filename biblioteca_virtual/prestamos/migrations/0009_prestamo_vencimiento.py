@@ -0,0 +1,49 @@
+# Generated by Django 4.2.26 on 2026-10-16 23:07
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def calcular_vencimientos(apps, schema_editor):
+    # Solo los abiertos: son los que revisa el barrido de vencidos
+    Prestamo = apps.get_model('prestamos', 'Prestamo')
+    Prestamo.objects.using(schema_editor.connection.alias).filter(
+        fecha_devolucion__isnull=True, fecha_vencimiento__isnull=True
+    ).update(fecha_vencimiento=models.F('fecha_prestamo') + timedelta(days=settings.PRESTAMOS_DIAS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prestamos', '0008_prestamoarchivado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestamo',
+            name='fecha_vencimiento',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='marcado_vencido',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='prestamoarchivado',
+            name='fecha_vencimiento',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='prestamoarchivado',
+            name='marcado_vencido',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(calcular_vencimientos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('fecha_devolucion__isnull', True)), fields=['fecha_vencimiento', 'id'], name='prestamo_abierto_vence_idx'),
+        ),
+    ]
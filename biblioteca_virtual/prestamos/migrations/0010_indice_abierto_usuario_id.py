@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-16 23:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prestamos', '0009_prestamo_vencimiento'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='prestamo',
+            name='prestamo_abierto_usuario_idx',
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('fecha_devolucion__isnull', True)), fields=['usuario', 'id'], name='prestamo_abierto_usuario_idx'),
+        ),
+    ]
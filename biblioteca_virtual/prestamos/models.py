@@ -7,6 +7,49 @@ class Prestamo(models.Model):
   libro = models.ForeignKey(to=Libro, on_delete=models.RESTRICT, related_name='prestamos')
   fecha_prestamo = models.DateTimeField(null=True)
   fecha_devolucion = models.DateTimeField(null=True)
+  # fecha_prestamo + PRESTAMOS_DIAS, al prestar
+  fecha_vencimiento = models.DateTimeField(null=True)
+  # Cuándo el barrido de vencidos (comando vencidos --marcar) lo marcó
+  marcado_vencido = models.DateTimeField(null=True)
+  updated_at = models.DateTimeField(auto_now=True)
 
   class Meta:
-    verbose_name_plural = "Prestamos"
\ No newline at end of file
+    verbose_name_plural = "Prestamos"
+    indexes = [
+      models.Index(fields=["id"], condition=models.Q(fecha_devolucion__isnull=True), name="prestamo_abierto_idx"),
+      models.Index(fields=["usuario", "id"], condition=models.Q(fecha_devolucion__isnull=True), name="prestamo_abierto_usuario_idx"),
+      models.Index(fields=["fecha_prestamo", "id"], name="prestamo_fecha_prestamo_idx"),
+      models.Index(fields=["updated_at"], name="prestamo_updated_at_idx"),
+      # Barrido de vencidos: un recorrido por rango sobre los abiertos
+      models.Index(fields=["fecha_vencimiento", "id"], condition=models.Q(fecha_devolucion__isnull=True), name="prestamo_abierto_vence_idx"),
+    ]
+    constraints = [
+      models.UniqueConstraint(
+        fields=["libro"],
+        condition=models.Q(fecha_devolucion__isnull=True),
+        name="prestamo_abierto_por_libro",
+        violation_error_message="El libro ya tiene un préstamo abierto.",
+      ),
+    ]
+
+class PrestamoArchivado(models.Model):
+  """Préstamo devuelto que archivar_prestamos movió fuera de Prestamo (ver prestamos/archivo.py)"""
+  # El id del préstamo original; en PostgreSQL la clave es (id, fecha_prestamo)
+  # porque la tabla está particionada por fecha_prestamo
+  id = models.BigIntegerField(primary_key=True)
+  usuario = models.ForeignKey(to=Usuario, on_delete=models.RESTRICT, related_name='prestamos_archivados', db_index=False)
+  libro = models.ForeignKey(to=Libro, on_delete=models.RESTRICT, related_name='prestamos_archivados', db_index=False)
+  fecha_prestamo = models.DateTimeField()
+  fecha_devolucion = models.DateTimeField()
+  fecha_vencimiento = models.DateTimeField(null=True)
+  marcado_vencido = models.DateTimeField(null=True)
+  # Se copia sin tocar: la clave de las filas en caché sigue siendo la misma
+  updated_at = models.DateTimeField()
+
+  class Meta:
+    verbose_name_plural = "Prestamos archivados"
+    indexes = [
+      models.Index(fields=["fecha_prestamo", "id"], name="archivado_fecha_prestamo_idx"),
+      models.Index(fields=["usuario", "fecha_prestamo"], name="archivado_usuario_idx"),
+      models.Index(fields=["libro", "fecha_prestamo"], name="archivado_libro_idx"),
+    ]
@@ -0,0 +1,198 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from biblioteca_virtual import cache_listados
+from libros.models import Libro
+from .models import Prestamo
+
+
+class LibroNoDisponible(Exception):
+  pass
+
+
+def vencimiento(fecha_prestamo):
+  """Fecha en que vence un préstamo hecho en ``fecha_prestamo``"""
+  return fecha_prestamo + timedelta(days=settings.PRESTAMOS_DIAS)
+
+
+def prestar(usuario, libro):
+  """
+  Presta ``libro`` a ``usuario`` en una sola transacción.
+
+  El UPDATE condicional reserva el libro bloqueando solo su fila y la
+  restricción prestamo_abierto_por_libro impide dos préstamos abiertos del
+  mismo libro aunque dos peticiones lleguen a la vez.
+  """
+  try:
+    with transaction.atomic():
+      ahora = timezone.now()
+      reservado = Libro.objects.filter(id=libro.id, en_prestamo=False).update(en_prestamo=True, updated_at=ahora)
+      if not reservado:
+        raise LibroNoDisponible(libro)
+      # El UPDATE no emite señales; el Prestamo sí, al crearse
+      cache_listados.invalidar(Libro)
+      prestamo = Prestamo.objects.create(
+        usuario=usuario, libro=libro, fecha_prestamo=ahora, fecha_vencimiento=vencimiento(ahora)
+      )
+  except IntegrityError as e:
+    raise LibroNoDisponible(libro) from e
+
+  libro.en_prestamo = True
+  return prestamo
+
+
+def devolver(prestamo):
+  """
+  Marca ``prestamo`` como devuelto y libera su libro en la misma transacción.
+
+  Solo actualiza si el préstamo sigue abierto, así que reintentos o envíos
+  duplicados no cambian nada. Devuelve False si ya estaba devuelto.
+  """
+  ahora = timezone.now()
+  with transaction.atomic():
+    devuelto = Prestamo.objects.filter(id=prestamo.id, fecha_devolucion__isnull=True).update(fecha_devolucion=ahora, updated_at=ahora)
+    if devuelto:
+      Libro.objects.filter(id=prestamo.libro_id).update(en_prestamo=False, updated_at=ahora)
+      cache_listados.invalidar(Prestamo, Libro)
+
+  if devuelto:
+    prestamo.fecha_devolucion = ahora
+  return bool(devuelto)
+
+
+def prestar_lote(usuario, libro_ids):
+  """
+  Presta varios libros a ``usuario`` con un número fijo de consultas:
+  una lectura de disponibilidad, un bulk_create y un UPDATE por conjunto.
+
+  Devuelve una lista con el resultado de cada libro en el orden recibido:
+  'prestado', 'no_disponible' o 'no_existe'.
+  """
+  ids = list(dict.fromkeys(libro_ids))
+  ahora = timezone.now()
+  try:
+    with transaction.atomic():
+      en_prestamo = dict(
+        Libro.objects.select_for_update().filter(id__in=ids).values_list('id', 'en_prestamo')
+      )
+      disponibles = [i for i in ids if en_prestamo.get(i) is False]
+      creados = Prestamo.objects.bulk_create([
+        Prestamo(usuario=usuario, libro_id=i, fecha_prestamo=ahora, fecha_vencimiento=vencimiento(ahora)) for i in disponibles
+      ])
+      Libro.objects.filter(id__in=disponibles).update(en_prestamo=True, updated_at=ahora)
+      if disponibles:
+        cache_listados.invalidar(Prestamo, Libro)
+  except IntegrityError:
+    # Algún libro tenía un préstamo abierto aunque figuraba disponible;
+    # se reintenta libro por libro para reportar cuál falló.
+    return [_prestar_uno(usuario, libro_id) for libro_id in ids]
+
+  prestamos = {prestamo.libro_id: prestamo.pk for prestamo in creados}
+  resultados = []
+  for libro_id in ids:
+    if libro_id in prestamos:
+      resultados.append({'libro': libro_id, 'resultado': 'prestado', 'prestamo': prestamos[libro_id]})
+    elif libro_id in en_prestamo:
+      resultados.append({'libro': libro_id, 'resultado': 'no_disponible'})
+    else:
+      resultados.append({'libro': libro_id, 'resultado': 'no_existe'})
+  return resultados
+
+
+def _prestar_uno(usuario, libro_id):
+  libro = Libro.objects.filter(id=libro_id).first()
+  if libro is None:
+    return {'libro': libro_id, 'resultado': 'no_existe'}
+  try:
+    prestamo = prestar(usuario, libro)
+  except LibroNoDisponible:
+    return {'libro': libro_id, 'resultado': 'no_disponible'}
+  return {'libro': libro_id, 'resultado': 'prestado', 'prestamo': prestamo.pk}
+
+
+def devolver_lote(prestamo_ids):
+  """
+  Devuelve varios préstamos con tres consultas: una lectura, un UPDATE de
+  préstamos y un UPDATE de libros. Los ya devueltos no se modifican.
+
+  Devuelve el resultado de cada préstamo: 'devuelto', 'ya_devuelto' o 'no_existe'.
+  """
+  ids = list(dict.fromkeys(prestamo_ids))
+  ahora = timezone.now()
+  with transaction.atomic():
+    filas = {
+      prestamo_id: (libro_id, fecha_devolucion)
+      for prestamo_id, libro_id, fecha_devolucion in Prestamo.objects.select_for_update()
+        .filter(id__in=ids).values_list('id', 'libro_id', 'fecha_devolucion')
+    }
+    abiertos = [i for i in ids if i in filas and filas[i][1] is None]
+    Prestamo.objects.filter(id__in=abiertos, fecha_devolucion__isnull=True).update(fecha_devolucion=ahora, updated_at=ahora)
+    Libro.objects.filter(id__in=[filas[i][0] for i in abiertos]).update(en_prestamo=False, updated_at=ahora)
+    if abiertos:
+      cache_listados.invalidar(Prestamo, Libro)
+
+  devueltos = set(abiertos)
+  resultados = []
+  for prestamo_id in ids:
+    if prestamo_id not in filas:
+      resultado = 'no_existe'
+    elif prestamo_id in devueltos:
+      resultado = 'devuelto'
+    else:
+      resultado = 'ya_devuelto'
+    resultados.append({'prestamo': prestamo_id, 'resultado': resultado})
+  return resultados
+
+
+def vencidos(ahora=None, using=None):
+  """
+  Préstamos abiertos con fecha_vencimiento anterior a ``ahora``, en orden de
+  vencimiento: un recorrido por rango de prestamo_abierto_vence_idx.
+  """
+  return (
+    Prestamo.objects.using(using)
+    .filter(fecha_devolucion__isnull=True, fecha_vencimiento__lt=ahora or timezone.now())
+    .order_by('fecha_vencimiento', 'id')
+  )
+
+
+def _desde(queryset, posicion):
+  """Filas de ``queryset`` con (fecha_vencimiento, id) posterior a ``posicion``"""
+  if posicion is None:
+    return queryset
+  vence, prestamo_id = posicion
+  # Escrito así y no con un OR para que SQLite acote el rango del índice por
+  # los dos lados; con el OR lo vuelve a recorrer desde el principio
+  return queryset.filter(fecha_vencimiento__gte=vence).exclude(fecha_vencimiento=vence, id__lte=prestamo_id)
+
+
+def marcar_vencidos(ahora=None, lote=10000, using=None, progreso=None):
+  """
+  Marca con ``ahora`` en marcado_vencido los vencidos que no estaban marcados,
+  de a ``lote`` en orden de vencimiento. Cada lote lee solo la fila donde
+  termina (saltando ``lote`` entradas del índice) y marca el rango con un
+  UPDATE, sin traer los ids. Devuelve cuántos marcó.
+  """
+  ahora = ahora or timezone.now()
+  abiertos = Prestamo.objects.using(using).filter(fecha_devolucion__isnull=True)
+  inicio = None
+  marcados = 0
+  while True:
+    rango = _desde(vencidos(ahora, using), inicio)
+    fin = next(iter(rango.values_list('fecha_vencimiento', 'id')[lote - 1:lote]), None)
+    if fin is not None:
+      # Solo la cota del lote: con dos cotas superiores SQLite usaba la de
+      # ``ahora`` y cada UPDATE recorría el índice hasta el final
+      rango = _desde(abiertos, inicio).filter(fecha_vencimiento__lte=fin[0]).exclude(fecha_vencimiento=fin[0], id__gt=fin[1])
+    with transaction.atomic(using=using):
+      # updated_at también: la marca se ve en el listado y en el feed de cambios
+      cambiados = rango.filter(marcado_vencido__isnull=True).update(marcado_vencido=ahora, updated_at=timezone.now())
+      if cambiados:
+        cache_listados.invalidar(Prestamo)
+    marcados += cambiados
+    if progreso:
+      progreso(marcados)
+    if fin is None:
+      return marcados
+    inicio = fin
@@ -1,12 +1,28 @@
-from django.test import TestCase, Client
+import csv
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.conf import settings
+from django.core.cache import cache
+from biblioteca_virtual import exportacion
 from django.contrib.messages import get_messages
 from django.utils import timezone
-from datetime import date, datetime
-from .models import Prestamo
+from datetime import date, datetime, timedelta, timezone as datetime_timezone
+from .models import Prestamo, PrestamoArchivado
+from . import archivo
+from django.db import IntegrityError, connection, transaction
+from django.db.models import RestrictedError
+from django.test.utils import CaptureQueriesContext
 from .forms import PrestamoForm
+from .services import prestar, devolver, prestar_lote, marcar_vencidos, vencidos, LibroNoDisponible
 from usuarios.models import Usuario
 from libros.models import Libro
+from cambios.models import Eliminacion
 
 
 class PrestamoModelTest(TestCase):
@@ -126,6 +142,16 @@ class PrestamoFormTest(TestCase):
         self.assertIn(self.libro_disponible, libros_disponibles)
         self.assertNotIn(self.libro_en_prestamo, libros_disponibles)
     
+    def test_render_no_enumera_querysets(self):
+        """Test que el formulario se renderiza sin consultar usuarios ni libros"""
+        for i in range(20):
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date.today())
+
+        with self.assertNumQueries(0):
+            html = str(PrestamoForm())
+        self.assertIn(reverse('libros:autocompletar_libros'), html)
+        self.assertNotIn('<option', html)
+
     def test_valid_form(self):
         """Test con datos válidos"""
         form_data = {
@@ -260,7 +286,7 @@ class PrestamoViewTest(TestCase):
         self.assertTrue(self.libro.en_prestamo)
         
         url = reverse('prestamos:realizar_devolucion', kwargs={'id': self.prestamo.id})
-        response = self.client.get(url)
+        response = self.client.post(url)
         
         # Debe redirigir tras realizar devolución
         self.assertEqual(response.status_code, 302)
@@ -280,8 +306,10 @@ class PrestamoViewTest(TestCase):
     
     def test_realizar_devolucion_not_found(self):
         """Test realizar devolución de préstamo que no existe"""
-        url = reverse('prestamos:realizar_devolucion', kwargs={'id': 999})
-        response = self.client.get(url)
+        # En PostgreSQL la secuencia no vuelve a empezar entre tests: 999 puede existir
+        inexistente = Prestamo.objects.order_by('-id').values_list('id', flat=True).first() + 1
+        url = reverse('prestamos:realizar_devolucion', kwargs={'id': inexistente})
+        response = self.client.post(url)
         self.assertEqual(response.status_code, 404)
     
     def test_prestamo_workflow_complete(self):
@@ -313,7 +341,7 @@ class PrestamoViewTest(TestCase):
         
         # 2. Realizar devolución
         url = reverse('prestamos:realizar_devolucion', kwargs={'id': prestamo_test.id})
-        response = self.client.get(url)
+        response = self.client.post(url)
         self.assertEqual(response.status_code, 302)
         
         # Verificar estado final
@@ -336,3 +364,581 @@ class PrestamoViewTest(TestCase):
             for prestamo in prestamos:
                 _ = prestamo.usuario.nombre
                 _ = prestamo.libro.titulo
+
+
+class PrestamoFiltroTest(TestCase):
+    """Tests para los filtros y la paginación del listado de préstamos"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.client = Client()
+        self.ana = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.luis = Usuario.objects.create(nombre="Luis", correo="luis@test.com", edad=40)
+        self.libros = [
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date.today())
+            for i in range(3)
+        ]
+        ahora = timezone.now()
+        self.devuelto = Prestamo.objects.create(
+            usuario=self.ana, libro=self.libros[0],
+            fecha_prestamo=ahora - timedelta(days=30), fecha_devolucion=ahora - timedelta(days=20)
+        )
+        self.activo_ana = Prestamo.objects.create(
+            usuario=self.ana, libro=self.libros[1], fecha_prestamo=ahora - timedelta(days=2)
+        )
+        self.activo_luis = Prestamo.objects.create(
+            usuario=self.luis, libro=self.libros[2], fecha_prestamo=ahora
+        )
+
+    def listar(self, query=''):
+        response = self.client.get(reverse('prestamos:prestamos') + query)
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['prestamos'])
+
+    def test_sin_filtros(self):
+        """Test que sin filtros se listan todos los préstamos"""
+        self.assertEqual(self.listar(), [self.devuelto, self.activo_ana, self.activo_luis])
+
+    def test_filtro_activos(self):
+        """Test del filtro de préstamos activos"""
+        self.assertEqual(self.listar('?estado=activos'), [self.activo_ana, self.activo_luis])
+
+    def test_filtro_devueltos(self):
+        """Test del filtro de préstamos devueltos"""
+        self.assertEqual(self.listar('?estado=devueltos'), [self.devuelto])
+
+    def test_filtro_usuario_y_estado(self):
+        """Test de combinación de filtros por usuario y estado"""
+        self.assertEqual(self.listar(f'?estado=activos&usuario={self.ana.id}'), [self.activo_ana])
+
+    def test_filtro_libro(self):
+        """Test del filtro por libro"""
+        self.assertEqual(self.listar(f'?libro={self.libros[0].id}'), [self.devuelto])
+
+    def test_filtro_rango_fechas(self):
+        """Test del filtro por rango de fecha de préstamo (hasta inclusivo)"""
+        hoy = timezone.localdate()
+        desde = (hoy - timedelta(days=3)).isoformat()
+        self.assertEqual(
+            self.listar(f'?desde={desde}&hasta={hoy.isoformat()}'),
+            [self.activo_ana, self.activo_luis]
+        )
+
+    def test_filtro_invalido_se_ignora(self):
+        """Test que filtros inválidos muestran el listado sin filtrar"""
+        response = self.client.get(reverse('prestamos:prestamos') + '?usuario=abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['filtro'].errors)
+        self.assertEqual(len(response.context['prestamos']), 3)
+
+    @override_settings(LIST_PAGE_SIZE=1)
+    def test_paginacion_conserva_filtros(self):
+        """Test que el enlace a la página siguiente conserva los filtros"""
+        response = self.client.get(reverse('prestamos:prestamos') + '?estado=activos')
+        self.assertEqual(list(response.context['prestamos']), [self.activo_ana])
+
+        siguiente = response.context['pagina'].url_siguiente
+        self.assertIn('estado=activos', siguiente)
+        # Validadores de ETag/Last-Modified + la página
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('prestamos:prestamos') + siguiente)
+        self.assertEqual(list(response.context['prestamos']), [self.activo_luis])
+        self.assertIsNone(response.context['pagina'].url_siguiente)
+
+
+class ExplicarConsultasTest(TestCase):
+    """Tests para el comando explicar_consultas"""
+
+    def test_consultas_frecuentes_usan_indices(self):
+        """Test que cada consulta frecuente usa su índice parcial o compuesto"""
+        if connection.vendor == 'postgresql':
+            # Con las tablas vacías los índices empatan y gana uno u otro según
+            # lo que haya dejado autovacuum: con datos (la mitad de los libros
+            # prestados) y ANALYZE el plan es siempre el mismo. Hacen falta
+            # más préstamos abiertos que el LIMIT de cada consulta: si el LIMIT
+            # los cubre a todos, ordenar a mano cuesta lo mismo que el índice
+            call_command('generar_datos', libros=4000, usuarios=500, prestamos=4000, abiertos=0.5, stdout=StringIO())
+            with connection.cursor() as cursor:
+                for modelo in (Libro, Usuario, Prestamo):
+                    cursor.execute(f"ANALYZE {modelo._meta.db_table}")
+        salida = StringIO()
+        call_command('explicar_consultas', '--estricto', stdout=salida)
+
+        self.assertIn("Préstamos abiertos por usuario", salida.getvalue())
+        self.assertNotIn("No usa", salida.getvalue())
+
+
+class PrestarServiceTest(TestCase):
+    """Tests para el préstamo atómico de libros"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.otro = Usuario.objects.create(nombre="Luis", correo="luis@test.com", edad=40)
+        self.libro = Libro.objects.create(titulo="Rayuela", autor="Cortázar", fecha_publicacion=date.today())
+
+    def test_prestar(self):
+        """Test que prestar crea el préstamo y marca el libro"""
+        prestamo = prestar(self.usuario, self.libro)
+
+        self.assertIsNotNone(prestamo.fecha_prestamo)
+        self.libro.refresh_from_db()
+        self.assertTrue(self.libro.en_prestamo)
+
+    def test_doble_prestamo_falla(self):
+        """Test que un segundo préstamo del mismo libro falla sin cambios"""
+        prestar(self.usuario, self.libro)
+        libro_obsoleto = Libro.objects.get(id=self.libro.id)
+
+        with self.assertRaises(LibroNoDisponible):
+            prestar(self.otro, libro_obsoleto)
+        self.assertEqual(Prestamo.objects.filter(libro=self.libro).count(), 1)
+
+    def test_restriccion_un_prestamo_abierto_por_libro(self):
+        """Test que la base de datos rechaza dos préstamos abiertos del mismo libro"""
+        Prestamo.objects.create(usuario=self.usuario, libro=self.libro, fecha_prestamo=timezone.now())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Prestamo.objects.create(usuario=self.otro, libro=self.libro, fecha_prestamo=timezone.now())
+
+    def test_prestamo_devuelto_no_bloquea(self):
+        """Test que los préstamos devueltos no cuentan para la restricción"""
+        Prestamo.objects.create(
+            usuario=self.usuario, libro=self.libro,
+            fecha_prestamo=timezone.now(), fecha_devolucion=timezone.now()
+        )
+        prestar(self.otro, self.libro)
+        self.assertEqual(Prestamo.objects.filter(libro=self.libro).count(), 2)
+
+    def test_carrera_con_indicador_desactualizado(self):
+        """Test que si otro préstamo ganó la carrera se revierte la reserva"""
+        # Simula un préstamo abierto cuyo libro quedó con en_prestamo=False
+        Prestamo.objects.create(usuario=self.otro, libro=self.libro, fecha_prestamo=timezone.now())
+
+        with self.assertRaises(LibroNoDisponible):
+            prestar(self.usuario, self.libro)
+        self.libro.refresh_from_db()
+        self.assertFalse(self.libro.en_prestamo)
+        self.assertFalse(Prestamo.objects.filter(usuario=self.usuario).exists())
+
+    def test_consultas_por_prestamo(self):
+        """Test de la cantidad mínima de consultas por préstamo"""
+        # 2 búsquedas del formulario + UPDATE + INSERT, más SAVEPOINT/RELEASE
+        # porque el test ya corre dentro de una transacción
+        with self.assertNumQueries(6):
+            response = self.client.post(
+                reverse('prestamos:crear_prestamo'),
+                {'usuario': self.usuario.id, 'libro': self.libro.id}
+            )
+        self.assertEqual(response.status_code, 302)
+
+    def test_vista_libro_no_disponible(self):
+        """Test que la vista muestra el error si el libro ya no está disponible"""
+        Prestamo.objects.create(usuario=self.otro, libro=self.libro, fecha_prestamo=timezone.now())
+        response = self.client.post(
+            reverse('prestamos:crear_prestamo'),
+            {'usuario': self.usuario.id, 'libro': self.libro.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('libro', response.context['form'].errors)
+
+
+class DevolucionTest(TestCase):
+    """Tests para la devolución idempotente de préstamos"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.libro = Libro.objects.create(titulo="Rayuela", autor="Cortázar", fecha_publicacion=date.today())
+        self.prestamo = prestar(self.usuario, self.libro)
+        self.url = reverse('prestamos:realizar_devolucion', kwargs={'id': self.prestamo.id})
+
+    def test_get_no_permitido(self):
+        """Test que la devolución no se realiza con GET"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 405)
+        self.prestamo.refresh_from_db()
+        self.assertIsNone(self.prestamo.fecha_devolucion)
+
+    def test_devolucion_duplicada_es_idempotente(self):
+        """Test que un segundo envío no cambia nada y cuesta una consulta"""
+        self.client.post(self.url)
+        self.prestamo.refresh_from_db()
+        fecha_devolucion = self.prestamo.fecha_devolucion
+
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, 302)
+        self.prestamo.refresh_from_db()
+        self.assertEqual(self.prestamo.fecha_devolucion, fecha_devolucion)
+        messages = list(get_messages(response.wsgi_request))
+        self.assertIn("ya ha sido devuelto", str(messages[-1]))
+
+    def test_devolver_servicio_solo_si_abierto(self):
+        """Test que devolver() solo actúa sobre préstamos abiertos"""
+        prestamo_obsoleto = Prestamo.objects.get(id=self.prestamo.id)
+        self.assertTrue(devolver(self.prestamo))
+        self.assertFalse(devolver(prestamo_obsoleto))
+
+        self.libro.refresh_from_db()
+        self.assertFalse(self.libro.en_prestamo)
+
+    def test_listado_oculta_devolver_en_devueltos(self):
+        """Test que el botón de devolver solo aparece en préstamos abiertos"""
+        response = self.client.get(reverse('prestamos:prestamos'))
+        self.assertContains(response, self.url)
+
+        devolver(self.prestamo)
+        response = self.client.get(reverse('prestamos:prestamos'))
+        self.assertNotContains(response, self.url)
+
+
+class LoteTest(TestCase):
+    """Tests para los endpoints de préstamo y devolución por lote"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.libros = [
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date.today())
+            for i in range(20)
+        ]
+        self.ids = [libro.id for libro in self.libros]
+
+    def post_json(self, nombre, datos):
+        return self.client.post(reverse(nombre), json.dumps(datos), content_type='application/json')
+
+    def test_prestar_lote(self):
+        """Test que el lote presta todos los libros disponibles"""
+        response = self.post_json('prestamos:crear_prestamos_lote', {'usuario': self.usuario.id, 'libros': self.ids})
+
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()['resultados']
+        self.assertEqual([r['resultado'] for r in resultados], ['prestado'] * 20)
+        self.assertEqual(Libro.objects.filter(en_prestamo=True).count(), 20)
+        self.assertEqual(Prestamo.objects.filter(fecha_devolucion__isnull=True).count(), 20)
+
+    def test_prestar_lote_resultados_por_libro(self):
+        """Test del resultado individual para libros no disponibles o inexistentes"""
+        prestar(self.usuario, self.libros[0])
+        response = self.post_json(
+            'prestamos:crear_prestamos_lote',
+            {'usuario': self.usuario.id, 'libros': [self.ids[0], self.ids[1], 9999]}
+        )
+        resultados = response.json()['resultados']
+        self.assertEqual(
+            [(r['libro'], r['resultado']) for r in resultados],
+            [(self.ids[0], 'no_disponible'), (self.ids[1], 'prestado'), (9999, 'no_existe')]
+        )
+
+    def test_prestar_lote_consultas_constantes(self):
+        """Test que el costo del lote no crece con la cantidad de libros"""
+        # usuario + lectura de libros + INSERT + UPDATE, más SAVEPOINT/RELEASE del test
+        with self.assertNumQueries(6):
+            self.post_json('prestamos:crear_prestamos_lote', {'usuario': self.usuario.id, 'libros': self.ids})
+
+    def test_prestar_lote_indicador_desactualizado(self):
+        """Test que un préstamo abierto con el libro marcado disponible solo falla ese libro"""
+        Prestamo.objects.create(usuario=self.usuario, libro=self.libros[0], fecha_prestamo=timezone.now())
+        resultados = prestar_lote(self.usuario, self.ids[:3])
+        self.assertEqual(
+            [r['resultado'] for r in resultados],
+            ['no_disponible', 'prestado', 'prestado']
+        )
+
+    def test_prestar_lote_usuario_inactivo(self):
+        """Test que no se presta a usuarios inactivos"""
+        self.usuario.activo = False
+        self.usuario.save()
+        response = self.post_json('prestamos:crear_prestamos_lote', {'usuario': self.usuario.id, 'libros': self.ids})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('usuario', response.json()['errores'])
+
+    @override_settings(PRESTAMOS_LOTE_MAXIMO=5)
+    def test_lote_demasiado_grande(self):
+        """Test que se rechazan lotes mayores al máximo configurado"""
+        response = self.post_json('prestamos:crear_prestamos_lote', {'usuario': self.usuario.id, 'libros': self.ids})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('libros', response.json()['errores'])
+
+    def test_json_invalido(self):
+        """Test de cuerpos que no son JSON válido"""
+        response = self.client.post(reverse('prestamos:realizar_devoluciones_lote'), 'no-json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.post_json('prestamos:realizar_devoluciones_lote', {'prestamos': ['a']})
+        self.assertEqual(response.status_code, 400)
+
+    def test_devolver_lote(self):
+        """Test de devolución por lote con resultados por préstamo"""
+        prestados = prestar_lote(self.usuario, self.ids[:3])
+        prestamo_ids = [r['prestamo'] for r in prestados]
+        devolver(Prestamo.objects.get(id=prestamo_ids[0]))
+
+        with self.assertNumQueries(5):
+            response = self.post_json('prestamos:realizar_devoluciones_lote', {'prestamos': prestamo_ids + [9999]})
+
+        self.assertEqual(
+            [r['resultado'] for r in response.json()['resultados']],
+            ['ya_devuelto', 'devuelto', 'devuelto', 'no_existe']
+        )
+        self.assertFalse(Libro.objects.filter(id__in=self.ids[:3], en_prestamo=True).exists())
+        self.assertFalse(Prestamo.objects.filter(fecha_devolucion__isnull=True).exists())
+
+
+class ArchivoPrestamosTest(TestCase):
+    """Tests para el archivo del historial de préstamos"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.libros = [
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date.today())
+            for i in range(7)
+        ]
+        ahora = timezone.now()
+        self.viejos = [
+            Prestamo.objects.create(
+                usuario=self.usuario, libro=libro,
+                fecha_prestamo=ahora - timedelta(days=1000 - i), fecha_devolucion=ahora - timedelta(days=990 - i),
+            )
+            for i, libro in enumerate(self.libros[:5])
+        ]
+        # Viejo pero abierto: no se archiva
+        self.abierto = Prestamo.objects.create(usuario=self.usuario, libro=self.libros[5], fecha_prestamo=ahora - timedelta(days=900))
+        self.reciente = Prestamo.objects.create(
+            usuario=self.usuario, libro=self.libros[6],
+            fecha_prestamo=ahora - timedelta(days=10), fecha_devolucion=ahora - timedelta(days=5),
+        )
+        self.corte = (timezone.localdate() - timedelta(days=365)).isoformat()
+
+    def archivar(self, **opciones):
+        salida = StringIO()
+        call_command('archivar_prestamos', f'--antes-de={self.corte}', stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def listar(self, query=''):
+        response = self.client.get(reverse('prestamos:prestamos') + query)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_archiva_devueltos_anteriores_al_corte(self):
+        """Test que mueve solo los devueltos anteriores al corte, con sus datos y sin registrar eliminaciones"""
+        originales = {p.id: (p.usuario_id, p.libro_id, p.fecha_prestamo, p.fecha_devolucion, p.updated_at) for p in self.viejos}
+        self.assertIn("5 préstamos devueltos", self.archivar(lote=2))
+
+        self.assertEqual(set(Prestamo.objects.values_list('id', flat=True)), {self.abierto.id, self.reciente.id})
+        archivados = {
+            p.id: (p.usuario_id, p.libro_id, p.fecha_prestamo, p.fecha_devolucion, p.updated_at)
+            for p in PrestamoArchivado.objects.all()
+        }
+        self.assertEqual(archivados, originales)
+        self.assertFalse(Eliminacion.objects.exists())
+        self.assertEqual(archivo.limite(), self.viejos[-1].fecha_prestamo)
+
+    def test_limite_sigue_la_version_del_archivo(self):
+        """Test que el límite cambia con la versión de PrestamoArchivado y vence como las páginas del listado"""
+        self.archivar(lote=2, max_lotes=1)
+        with patch.object(cache, 'set', wraps=cache.set) as guardar:
+            self.assertEqual(archivo.limite(), self.viejos[1].fecha_prestamo)
+        guardar.assert_called_once()
+        self.assertEqual(guardar.call_args.kwargs['timeout'], settings.LIST_CACHE_TIMEOUT)
+
+        self.archivar()
+        self.assertEqual(archivo.limite(), self.viejos[-1].fecha_prestamo)
+
+    @skipUnless(connection.vendor == 'postgresql', "El archivo solo se particiona en PostgreSQL")
+    def test_particiones_por_anio_en_postgresql(self):
+        """Test que en PostgreSQL cada préstamo va a la partición de su año (UTC) y una consulta por fechas lee solo esa"""
+        utc = datetime_timezone.utc
+        fin_2019 = Prestamo.objects.create(
+            usuario=self.usuario, libro=self.libros[0],
+            fecha_prestamo=datetime(2019, 12, 31, 23, 30, tzinfo=utc), fecha_devolucion=datetime(2020, 1, 10, tzinfo=utc),
+        )
+        inicio_2020 = Prestamo.objects.create(
+            usuario=self.usuario, libro=self.libros[0],
+            fecha_prestamo=datetime(2020, 1, 1, 0, 30, tzinfo=utc), fecha_devolucion=datetime(2020, 1, 20, tzinfo=utc),
+        )
+        self.archivar(lote=1)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, tableoid::regclass::text FROM {archivo.TABLA} WHERE id IN (%s, %s)",
+                [fin_2019.id, inicio_2020.id],
+            )
+            ubicacion = dict(cursor.fetchall())
+        self.assertEqual(ubicacion, {
+            fin_2019.id: f"{archivo.TABLA}_2019",
+            inicio_2020.id: f"{archivo.TABLA}_2020",
+        })
+        nombres = [nombre for nombre, _ in archivo.particiones(connection)]
+        self.assertIn(f"{archivo.TABLA}_2019", nombres)
+        self.assertIn(f"{archivo.TABLA}_2020", nombres)
+
+        consulta = PrestamoArchivado.objects.filter(
+            fecha_prestamo__gte=datetime(2020, 1, 1, tzinfo=utc), fecha_prestamo__lt=datetime(2020, 7, 1, tzinfo=utc),
+        )
+        self.assertEqual(list(consulta.values_list('id', flat=True)), [inicio_2020.id])
+        plan = consulta.explain()
+        self.assertIn(f"{archivo.TABLA}_2020", plan)
+        self.assertNotIn(f"{archivo.TABLA}_2019", plan)
+
+    def test_se_puede_retomar(self):
+        """Test que con --max-lotes se detiene y la siguiente ejecución sigue con lo que falta"""
+        self.assertIn("quedan pendientes", self.archivar(lote=2, max_lotes=1))
+        self.assertEqual(PrestamoArchivado.objects.count(), 2)
+        self.assertNotIn("quedan pendientes", self.archivar(lote=2))
+        self.assertEqual(PrestamoArchivado.objects.count(), 5)
+        self.assertIn("0 préstamos", self.archivar())
+
+    def test_simular(self):
+        """Test que --simular cuenta sin mover nada"""
+        self.assertIn("5 préstamos", self.archivar(simular=True))
+        self.assertFalse(PrestamoArchivado.objects.exists())
+
+    def test_fecha_invalida(self):
+        """Test que una fecha de corte inválida es un error del comando"""
+        with self.assertRaises(CommandError):
+            call_command('archivar_prestamos', '--antes-de=ayer', stdout=StringIO())
+
+    def test_listado_sin_rango_no_lee_el_archivo(self):
+        """Test que sin rango de fechas el listado solo muestra la tabla de préstamos"""
+        self.archivar()
+        with CaptureQueriesContext(connection) as consultas_hechas:
+            response = self.listar()
+        self.assertEqual(list(response.context['prestamos']), [self.abierto, self.reciente])
+        self.assertFalse(any(archivo.TABLA in q['sql'] for q in consultas_hechas.captured_queries))
+
+    def test_rango_reciente_no_lee_el_archivo(self):
+        """Test que un rango posterior al último préstamo archivado no consulta el archivo"""
+        self.archivar()
+        archivo.limite()
+        desde = (timezone.localdate() - timedelta(days=30)).isoformat()
+        with CaptureQueriesContext(connection) as consultas_hechas:
+            response = self.listar(f'?desde={desde}')
+        self.assertEqual(list(response.context['prestamos']), [self.reciente])
+        self.assertFalse(any(archivo.TABLA in q['sql'] for q in consultas_hechas.captured_queries))
+
+    @override_settings(LIST_PAGE_SIZE=2)
+    def test_rango_viejo_suma_el_archivo(self):
+        """Test que un rango que llega al archivo lo mezcla con los préstamos, paginado por id"""
+        self.archivar()
+        desde = (timezone.localdate() - timedelta(days=1100)).isoformat()
+        ids = []
+        query = f'?desde={desde}'
+        while query:
+            response = self.listar(query)
+            ids += [p.id for p in response.context['prestamos']]
+            query = response.context['pagina'].url_siguiente
+        self.assertEqual(ids, [p.id for p in self.viejos] + [self.abierto.id, self.reciente.id])
+
+        # Y de vuelta hacia atrás desde la última página
+        anterior = self.listar(response.context['pagina'].url_anterior)
+        self.assertEqual([p.id for p in anterior.context['prestamos']], [self.viejos[-1].id, self.abierto.id])
+
+        # Solo activos: el archivo no tiene ninguno
+        response = self.listar(f'?desde={desde}&estado=activos')
+        self.assertEqual([p.id for p in response.context['prestamos']], [self.abierto.id])
+
+    def test_archivo_impide_eliminar_el_usuario(self):
+        """Test que los préstamos archivados también protegen al usuario y al libro"""
+        self.archivar()
+        Prestamo.objects.filter(usuario=self.usuario).delete()
+        with self.assertRaises(RestrictedError):
+            self.usuario.delete()
+        with self.assertRaises(RestrictedError):
+            self.libros[0].delete()
+
+    def test_exportacion(self):
+        """Test que el archivo se puede exportar como el resto"""
+        self.archivar()
+        filas = list(exportacion.filas('prestamos_archivados'))
+        self.assertEqual([fila[0] for fila in filas], [p.id for p in self.viejos])
+
+
+class VencimientoTest(TestCase):
+    """Tests para la fecha de vencimiento y el barrido de préstamos vencidos"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        cache.clear()
+        self.usuario = Usuario.objects.create(nombre="Ana", correo="ana@test.com", edad=30)
+        self.libros = [
+            Libro.objects.create(titulo=f"Libro {i}", autor="Autor", fecha_publicacion=date.today())
+            for i in range(6)
+        ]
+        self.ahora = timezone.now()
+
+    def crear(self, libro, dias_vencido, devuelto=False):
+        vence = self.ahora - timedelta(days=dias_vencido)
+        return Prestamo.objects.create(
+            usuario=self.usuario, libro=libro, fecha_prestamo=vence - timedelta(days=14),
+            fecha_vencimiento=vence, fecha_devolucion=self.ahora if devuelto else None,
+        )
+
+    def vencidos_de_ejemplo(self):
+        return [self.crear(self.libros[0], 3), self.crear(self.libros[1], 10), self.crear(self.libros[2], 1)]
+
+    @override_settings(PRESTAMOS_DIAS=7)
+    def test_prestar_calcula_vencimiento(self):
+        """Test que prestar y prestar_lote ponen el vencimiento según PRESTAMOS_DIAS"""
+        prestamo = prestar(self.usuario, self.libros[0])
+        self.assertEqual(prestamo.fecha_vencimiento, prestamo.fecha_prestamo + timedelta(days=7))
+
+        prestar_lote(self.usuario, [self.libros[1].id])
+        prestamo = Prestamo.objects.get(libro=self.libros[1])
+        self.assertEqual(prestamo.fecha_vencimiento, prestamo.fecha_prestamo + timedelta(days=7))
+
+    def test_vencidos(self):
+        """Test que solo trae los abiertos con vencimiento pasado, del más viejo al más nuevo"""
+        a, b, c = self.vencidos_de_ejemplo()
+        self.crear(self.libros[3], -2)
+        self.crear(self.libros[4], 5, devuelto=True)
+        self.assertEqual(list(vencidos(self.ahora)), [b, a, c])
+
+    def test_marcar_vencidos_por_lotes(self):
+        """Test que marca todos los vencidos de a un lote, cambia updated_at y no repite la marca"""
+        # El último vence igual que el primero: dentro del lote se sigue por id
+        prestamos = self.vencidos_de_ejemplo() + [self.crear(self.libros[4], 3)]
+        no_vencido = self.crear(self.libros[3], -2)
+        antes = {p.id: p.updated_at for p in prestamos}
+
+        self.assertEqual(marcar_vencidos(self.ahora, lote=1), 4)
+        for prestamo in Prestamo.objects.filter(id__in=antes):
+            self.assertEqual(prestamo.marcado_vencido, self.ahora)
+            self.assertGreater(prestamo.updated_at, antes[prestamo.id])
+        no_vencido.refresh_from_db()
+        self.assertIsNone(no_vencido.marcado_vencido)
+
+        self.assertEqual(marcar_vencidos(self.ahora + timedelta(hours=1), lote=2), 0)
+        self.assertEqual(Prestamo.objects.get(id=prestamos[0].id).marcado_vencido, self.ahora)
+
+    def test_comando_lista_csv(self):
+        """Test que el comando lista los vencidos en CSV y --sin-marcar deja afuera los marcados"""
+        a, b, c = self.vencidos_de_ejemplo()
+        salida = StringIO()
+        call_command('vencidos', stdout=salida, stderr=StringIO())
+        filas = list(csv.DictReader(StringIO(salida.getvalue())))
+        self.assertEqual([int(fila['id']) for fila in filas], [b.id, a.id, c.id])
+        self.assertEqual(filas[0]['usuario_correo'], "ana@test.com")
+        self.assertEqual(filas[0]['dias_vencido'], '10')
+
+        Prestamo.objects.filter(id=b.id).update(marcado_vencido=self.ahora)
+        salida = StringIO()
+        call_command('vencidos', '--sin-marcar', stdout=salida, stderr=StringIO())
+        self.assertEqual([int(fila['id']) for fila in csv.DictReader(StringIO(salida.getvalue()))], [a.id, c.id])
+
+    def test_comando_marcar_y_listado(self):
+        """Test que --marcar hace visibles los vencidos en el listado con su filtro"""
+        a, b, c = self.vencidos_de_ejemplo()
+        self.crear(self.libros[3], -2)
+        response = self.client.get(reverse('prestamos:prestamos'), {'estado': 'vencidos'})
+        self.assertEqual(list(response.context['prestamos']), [])
+
+        salida = StringIO()
+        call_command('vencidos', '--marcar', stdout=salida)
+        self.assertIn("3 préstamos vencidos marcados", salida.getvalue())
+
+        response = self.client.get(reverse('prestamos:prestamos'), {'estado': 'vencidos'})
+        self.assertEqual(list(response.context['prestamos']), [a, b, c])
+        self.assertContains(response, "Vencido", count=3 + 1)
@@ -1,11 +1,18 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import views, views_async
+
+# Con ASYNC_VIEWS las vistas de lectura son las async (servidor ASGI)
+lectura = views_async if settings.ASYNC_VIEWS else views
 
 app_name = 'prestamos'
 
 urlpatterns = [
-    path('', views.prestamos, name='prestamos'),
+    path('', lectura.prestamos, name='prestamos'),
     path('create/', views.crear_prestamo, name='crear_prestamo'),
-    path('devolvolver/<int:id>/', views.realizar_devolucion, name='realizar_devolucion')
+    path('devolvolver/<int:id>/', views.realizar_devolucion, name='realizar_devolucion'),
+    path('lote/prestar/', views.crear_prestamos_lote, name='crear_prestamos_lote'),
+    path('lote/devolver/', views.realizar_devoluciones_lote, name='realizar_devoluciones_lote'),
+    path('exportar/', views.exportar_prestamos, name='exportar_prestamos')
 ]
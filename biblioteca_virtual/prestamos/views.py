@@ -1,43 +1,106 @@
+import json
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.utils import timezone
-from .models import Prestamo
-from .forms import PrestamoForm
+from django.views.decorators.http import require_POST
+from biblioteca_virtual import cache_listados, condicional, consultas, exportacion, replicas
+from biblioteca_virtual.paginacion import paginar
+from libros.models import Libro
+from usuarios.models import Usuario
+from .models import Prestamo, PrestamoArchivado
+from .forms import PrestamoForm, PrestamoFiltroForm, PrestamoLoteForm, DevolucionLoteForm
+from .services import prestar, devolver, prestar_lote, devolver_lote, LibroNoDisponible
 
+# updated_at propio y de las relaciones: forman la clave de la fila en caché
+COLUMNAS_LISTADO = (
+  'id', 'fecha_prestamo', 'fecha_devolucion', 'fecha_vencimiento', 'marcado_vencido', 'updated_at',
+  'usuario', 'usuario__nombre', 'usuario__updated_at',
+  'libro', 'libro__titulo', 'libro__updated_at',
+)
+
+# Muestra el nombre del usuario y el título del libro: también depende de ellos
+@replicas.lectura
+@cache_listados.cachear_listado(Prestamo, Usuario, Libro)
+@condicional.listado(Prestamo, Usuario, Libro, csrf=True)
+# Con un rango de fechas que llega al archivo: su página y, si no está en caché, archivo.limite()
+@consultas.presupuesto(4)
 def prestamos(request):
-  prestamos = Prestamo.objects.select_related('usuario', 'libro').order_by("id")
-  return render(request, 'listar_prestamos.html', {'prestamos': prestamos})
+  filtro = PrestamoFiltroForm(request.GET)
+  queryset = Prestamo.objects.select_related('usuario', 'libro').only(*COLUMNAS_LISTADO)
+  archivados = []
+  if filtro.is_valid():
+    queryset = filtro.filtrar(queryset)
+    if filtro.incluye_archivo():
+      archivados.append(filtro.filtrar(PrestamoArchivado.objects.select_related('usuario', 'libro').only(*COLUMNAS_LISTADO)))
+  pagina = paginar(request, queryset, 'id', otros=archivados)
+  return render(request, 'listar_prestamos.html', {'prestamos': pagina.objetos, 'pagina': pagina, 'filtro': filtro})
 
+@consultas.presupuesto(7)
 def crear_prestamo(request):
   if request.method == 'POST':
     form = PrestamoForm(request.POST)
     if form.is_valid():
-      prestamo = form.save()
-      prestamo.fecha_prestamo = timezone.now()
-      prestamo.save()
-      libro = prestamo.libro
-      libro.en_prestamo = True
-      libro.save()
-
-      messages.success(request, f'Préstamo creado exitosamente. El libro "{libro.titulo}" ahora está en préstamo.')
-      return redirect('prestamos:prestamos')
+      libro = form.cleaned_data['libro']
+      try:
+        prestar(form.cleaned_data['usuario'], libro)
+      except LibroNoDisponible:
+        form.add_error('libro', 'El libro ya está en préstamo.')
+      else:
+        messages.success(request, f'Préstamo creado exitosamente. El libro "{libro.titulo}" ahora está en préstamo.')
+        return redirect('prestamos:prestamos')
   else:
     form = PrestamoForm()
     
   return render(request, 'crear_prestamo.html', {'form': form})
 
+@require_POST
+@consultas.presupuesto(5)
 def realizar_devolucion(request, id):
-  prestamo = get_object_or_404(Prestamo, id=id)
+  queryset = Prestamo.objects.select_related('libro').only('id', 'fecha_devolucion', 'libro', 'libro__titulo')
+  prestamo = get_object_or_404(queryset, id=id)
 
-  if prestamo.fecha_devolucion is not None:
+  if prestamo.fecha_devolucion is not None or not devolver(prestamo):
     messages.warning(request, 'Este préstamo ya ha sido devuelto.')
     return redirect('prestamos:prestamos')
 
-  libro = prestamo.libro
-  prestamo.fecha_devolucion = timezone.now()
-  prestamo.save()
-  libro.en_prestamo = False
-  libro.save()
+  messages.success(request, f'Devolución realizada exitosamente. El libro "{prestamo.libro.titulo}" está disponible.')
+  return redirect('prestamos:prestamos')
+
+def _datos_json(request):
+  try:
+    datos = json.loads(request.body)
+  except (ValueError, UnicodeDecodeError):
+    return None
+  return datos if isinstance(datos, dict) else None
+
+@require_POST
+@consultas.presupuesto(6)
+def crear_prestamos_lote(request):
+  datos = _datos_json(request)
+  if datos is None:
+    return JsonResponse({'error': 'El cuerpo debe ser un objeto JSON.'}, status=400)
+
+  form = PrestamoLoteForm(datos)
+  if not form.is_valid():
+    return JsonResponse({'errores': form.errors}, status=400)
+
+  resultados = prestar_lote(form.cleaned_data['usuario'], form.cleaned_data['libros'])
+  return JsonResponse({'resultados': resultados})
+
+@require_POST
+@consultas.presupuesto(5)
+def realizar_devoluciones_lote(request):
+  datos = _datos_json(request)
+  if datos is None:
+    return JsonResponse({'error': 'El cuerpo debe ser un objeto JSON.'}, status=400)
+
+  form = DevolucionLoteForm(datos)
+  if not form.is_valid():
+    return JsonResponse({'errores': form.errors}, status=400)
+
+  return JsonResponse({'resultados': devolver_lote(form.cleaned_data['prestamos'])})
 
-  messages.success(request, f'Devolución realizada exitosamente. El libro "{libro.titulo}" está disponible.')
-  return redirect('prestamos:prestamos')
\ No newline at end of file
+@replicas.lectura
+@condicional.listado(Prestamo, Usuario, Libro)
+def exportar_prestamos(request):
+  return exportacion.respuesta(request, 'prestamos')
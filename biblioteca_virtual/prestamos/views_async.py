@@ -0,0 +1,28 @@
+"""
+Versión async del listado de préstamos, para servir con ASGI
+(ASYNC_VIEWS=True). Ver libros/views_async.py.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+from biblioteca_virtual import cache_listados, condicional, consultas, replicas
+from biblioteca_virtual.paginacion import apaginar
+from libros.models import Libro
+from usuarios.models import Usuario
+from . import views
+from .forms import PrestamoFiltroForm
+from .models import Prestamo, PrestamoArchivado
+
+@replicas.lectura
+@cache_listados.cachear_listado(Prestamo, Usuario, Libro)
+@condicional.listado(Prestamo, Usuario, Libro, csrf=True)
+@consultas.presupuesto(4)
+async def prestamos(request):
+  filtro = PrestamoFiltroForm(request.GET)
+  queryset = Prestamo.objects.select_related('usuario', 'libro').only(*views.COLUMNAS_LISTADO)
+  archivados = []
+  if filtro.is_valid():
+    queryset = filtro.filtrar(queryset)
+    if await sync_to_async(filtro.incluye_archivo)():
+      archivados.append(filtro.filtrar(PrestamoArchivado.objects.select_related('usuario', 'libro').only(*views.COLUMNAS_LISTADO)))
+  pagina = await apaginar(request, queryset, 'id', otros=archivados)
+  return await sync_to_async(render)(request, 'listar_prestamos.html', {'prestamos': pagina.objetos, 'pagina': pagina, 'filtro': filtro})
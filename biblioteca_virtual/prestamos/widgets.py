@@ -0,0 +1,19 @@
+from django import forms
+from django.urls import reverse
+
+
+class AutocompletarWidget(forms.TextInput):
+  """
+  Campo de búsqueda que consulta un endpoint de autocompletado en lugar de
+  enumerar el queryset en un <select>. El id elegido viaja en un input oculto.
+  """
+  template_name = 'widgets/autocompletar.html'
+
+  def __init__(self, url_name, attrs=None):
+    super().__init__(attrs)
+    self.url_name = url_name
+
+  def get_context(self, name, value, attrs):
+    context = super().get_context(name, value, attrs)
+    context['widget']['url'] = reverse(self.url_name)
+    return context
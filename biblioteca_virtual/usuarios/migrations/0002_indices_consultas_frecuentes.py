@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['id'], name='usuario_activo_idx'),
+        ),
+    ]
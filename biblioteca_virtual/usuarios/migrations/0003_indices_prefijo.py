@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Índices para la búsqueda por prefijo del autocompletado (istartswith).
+# Dependen del motor, por eso no se declaran en Meta.indexes:
+# - PostgreSQL compara UPPER(columna::text) LIKE UPPER('q%'); text_pattern_ops
+#   permite recorrer solo el rango del prefijo.
+# - SQLite aplica la optimización de LIKE solo a índices con COLLATE NOCASE.
+INDICES = {
+    'postgresql': [
+        "CREATE INDEX IF NOT EXISTS usuario_nombre_prefijo_idx ON usuarios_usuario (UPPER(nombre::text) text_pattern_ops) WHERE activo",
+        "CREATE INDEX IF NOT EXISTS usuario_correo_prefijo_idx ON usuarios_usuario (UPPER(correo::text) text_pattern_ops) WHERE activo",
+    ],
+    'sqlite': [
+        "CREATE INDEX IF NOT EXISTS usuario_nombre_prefijo_idx ON usuarios_usuario (nombre COLLATE NOCASE) WHERE activo",
+        "CREATE INDEX IF NOT EXISTS usuario_correo_prefijo_idx ON usuarios_usuario (correo COLLATE NOCASE) WHERE activo",
+    ],
+}
+
+
+def crear_indices(apps, schema_editor):
+    for sql in INDICES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor in INDICES:
+        schema_editor.execute("DROP INDEX IF EXISTS usuario_nombre_prefijo_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS usuario_correo_prefijo_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0002_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,33 @@
+import biblioteca_virtual.indices
+from django.db import migrations, models
+
+# Los índices de 0003_indices_prefijo pasan al estado del modelo
+# para que SQLite los vuelva a crear al reconstruir la tabla (el AddField
+# de 0004 los había perdido). Donde siguen existiendo no se tocan.
+INDICES = [
+    biblioteca_virtual.indices.IndicePrefijo(condition=models.Q(('activo', True)), fields=['nombre'], name='usuario_nombre_prefijo_idx'),
+    biblioteca_virtual.indices.IndicePrefijo(condition=models.Q(('activo', True)), fields=['correo'], name='usuario_correo_prefijo_idx'),
+]
+
+
+def crear_faltantes(apps, schema_editor):
+    Usuario = apps.get_model('usuarios', 'Usuario')
+    with schema_editor.connection.cursor() as cursor:
+        existentes = schema_editor.connection.introspection.get_constraints(cursor, Usuario._meta.db_table)
+    for indice in INDICES:
+        if indice.name not in existentes:
+            schema_editor.add_index(Usuario, indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_indice_updated_at'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(crear_faltantes, migrations.RunPython.noop)],
+            state_operations=[migrations.AddIndex(model_name='usuario', index=indice) for indice in INDICES],
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from biblioteca_virtual.indices import IndicePrefijo
 
 class Usuario(models.Model):
   nombre = models.CharField(max_length=100)
@@ -6,9 +7,17 @@ class Usuario(models.Model):
   edad = models.IntegerField()
   fecha_registro = models.DateTimeField(auto_now_add=True)
   activo = models.BooleanField(default=True)
+  updated_at = models.DateTimeField(auto_now=True)
 
   def __str__(self):
     return f"{self.nombre} ({self.correo})"
 
   class Meta:
-    verbose_name_plural = "Usuarios"
\ No newline at end of file
+    verbose_name_plural = "Usuarios"
+    indexes = [
+      models.Index(fields=["id"], condition=models.Q(activo=True), name="usuario_activo_idx"),
+      models.Index(fields=["updated_at"], name="usuario_updated_at_idx"),
+      # Autocompletado por prefijo (istartswith) de los usuarios activos
+      IndicePrefijo(fields=["nombre"], condition=models.Q(activo=True), name="usuario_nombre_prefijo_idx"),
+      IndicePrefijo(fields=["correo"], condition=models.Q(activo=True), name="usuario_correo_prefijo_idx"),
+    ]
\ No newline at end of file
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from biblioteca_virtual import cache_listados
+from .models import Usuario
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_listados(sender, **kwargs):
+  cache_listados.invalidar(Usuario)
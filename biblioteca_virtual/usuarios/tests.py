@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
@@ -260,8 +260,68 @@ class UsuarioViewTest(TestCase):
         messages = list(get_messages(response.wsgi_request))
         self.assertIn("no puede ser eliminado", str(messages[0]))
     
+    def test_delete_user_with_archived_loans(self):
+        """Test eliminar usuario con todos sus préstamos archivados (debe fallar)"""
+        from libros.models import Libro
+        from prestamos import archivo
+        from prestamos.models import Prestamo
+        from datetime import date, timedelta
+        from django.utils import timezone
+
+        libro = Libro.objects.create(titulo="Libro Test", autor="Autor Test", fecha_publicacion=date.today())
+        hace_un_anio = timezone.now() - timedelta(days=365)
+        Prestamo.objects.create(usuario=self.usuario, libro=libro, fecha_prestamo=hace_un_anio, fecha_devolucion=hace_un_anio)
+        self.assertEqual(archivo.archivar(timezone.now()), 1)
+        self.assertFalse(self.usuario.prestamos.exists())
+
+        response = self.client.get(reverse('usuarios:eliminar_usuario', kwargs={'id': self.usuario.id}))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Usuario.objects.filter(id=self.usuario.id).exists())
+        messages = list(get_messages(response.wsgi_request))
+        self.assertIn("no puede ser eliminado", str(messages[0]))
+
     def test_delete_user_not_found(self):
         """Test eliminar usuario que no existe"""
         url = reverse('usuarios:eliminar_usuario', kwargs={'id': 999})
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
+
+
+class AutocompletarUsuariosTest(TestCase):
+    """Tests para el endpoint de autocompletado de usuarios"""
+
+    def setUp(self):
+        """Configuración inicial para cada test"""
+        self.ana = Usuario.objects.create(nombre="Ana Gómez", correo="agomez@test.com", edad=30)
+        self.andres = Usuario.objects.create(nombre="Andrés Ruiz", correo="aruiz@test.com", edad=31)
+        self.inactivo = Usuario.objects.create(nombre="Anibal Paz", correo="apaz@test.com", edad=32, activo=False)
+        self.berta = Usuario.objects.create(nombre="Berta Ánez", correo="anez@test.com", edad=33)
+
+    def buscar(self, q):
+        response = self.client.get(reverse('usuarios:autocompletar_usuarios'), {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [r['id'] for r in response.json()['resultados']]
+
+    def test_prefijo_nombre_y_correo(self):
+        """Test que busca por prefijo de nombre o de correo, solo usuarios activos"""
+        self.assertEqual(self.buscar('an'), [self.ana.id, self.andres.id, self.berta.id])
+
+    def test_sin_distinguir_mayusculas(self):
+        """Test que el prefijo no distingue mayúsculas"""
+        self.assertEqual(self.buscar('AND'), [self.andres.id])
+
+    def test_consulta_vacia(self):
+        """Test que una consulta vacía no toca la base de datos"""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.buscar(' '), [])
+
+    @override_settings(AUTOCOMPLETE_LIMIT=2)
+    def test_limite(self):
+        """Test que se devuelven como máximo N resultados"""
+        self.assertEqual(len(self.buscar('a')), 2)
+
+    def test_texto_del_resultado(self):
+        """Test del texto mostrado en cada sugerencia"""
+        response = self.client.get(reverse('usuarios:autocompletar_usuarios'), {'q': 'berta'})
+        self.assertEqual(response.json()['resultados'][0]['texto'], str(self.berta))
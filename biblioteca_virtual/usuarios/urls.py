@@ -1,11 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
+
+# Con ASYNC_VIEWS las vistas de lectura son las async (servidor ASGI)
+lectura = views_async if settings.ASYNC_VIEWS else views
 
 app_name = 'usuarios'
 
 urlpatterns = [
-    path('', views.users, name='usuarios'),
+    path('', lectura.users, name='usuarios'),
     path('create/', views.create_user, name='crear_usuario'),
-    path('<int:id>/', views.edit_user, name='editar_usuario'),
+    path('autocompletar/', lectura.autocompletar_usuarios, name='autocompletar_usuarios'),
+    path('exportar/', views.exportar_usuarios, name='exportar_usuarios'),
+    path('<int:id>/', lectura.edit_user, name='editar_usuario'),
     path('delete/<int:id>/', views.delete_user, name='eliminar_usuario')
 ]
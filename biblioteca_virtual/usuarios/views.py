@@ -1,13 +1,55 @@
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from biblioteca_virtual import cache_listados, condicional, consultas, exportacion, replicas
 from .models import Usuario
 from .forms import UsuarioForm
 
 def home(request):
   return render(request, 'home.html')
 
+# Como en libros/views.py, las consultas de lectura se arman acá y las
+# recorren tanto estas vistas como las de views_async.py.
+
+def listado():
+  """Queryset del listado de usuarios (sin paginar)"""
+  return Usuario.objects.all()
+
+def consultas_autocompletado(request):
+  """
+  Consultas del autocompletado (ninguna sin término). Una por columna en vez
+  de un OR: cada una recorre solo el rango del prefijo en su índice y se
+  detiene al llegar al límite.
+  """
+  q = request.GET.get('q', '').strip()[:100]
+  if not q:
+    return []
+  limite = settings.AUTOCOMPLETE_LIMIT
+  activos = Usuario.objects.filter(activo=True).only('id', 'nombre', 'correo')
+  return [activos.filter(**filtro)[:limite] for filtro in ({'nombre__istartswith': q}, {'correo__istartswith': q})]
+
+def respuesta_autocompletado(encontrados):
+  """JSON con los usuarios de consultas_autocompletado, sin repetir y en orden de nombre"""
+  usuarios = sorted({u.id: u for u in encontrados}.values(), key=lambda u: (u.nombre.lower(), u.id))
+  return JsonResponse({'resultados': [{'id': u.id, 'texto': str(u)} for u in usuarios[:settings.AUTOCOMPLETE_LIMIT]]})
+
+@replicas.lectura
+@cache_listados.cachear_listado(Usuario)
+@condicional.listado(Usuario)
+@consultas.presupuesto(2)
 def users(request):
-  return render(request, 'users.html', {'users': Usuario.objects.all()})
+  return render(request, 'users.html', {'users': listado()})
+
+@replicas.lectura
+def autocompletar_usuarios(request):
+  consultas_hechas = consultas_autocompletado(request)
+  return respuesta_autocompletado(usuario for consulta in consultas_hechas for usuario in consulta)
+
+@replicas.lectura
+@condicional.listado(Usuario)
+def exportar_usuarios(request):
+  return exportacion.respuesta(request, 'usuarios')
 
 def create_user(request):
   if request.method == "POST":
@@ -21,6 +63,7 @@ def create_user(request):
 
   return render(request, "user_create.html", {"form": form})
 
+@condicional.detalle(Usuario, csrf=True)
 def edit_user(request, id):
   user = get_object_or_404(Usuario, id=id)
   
@@ -37,8 +80,8 @@ def edit_user(request, id):
 
 def delete_user(request, id):
   user = get_object_or_404(Usuario, id=id)
-  user_prestamos = user.prestamos.all()
-  if len(user_prestamos) > 0:
+  # Los préstamos archivados también restringen el borrado (on_delete=RESTRICT)
+  if user.prestamos.exists() or user.prestamos_archivados.exists():
     messages.warning(request, "El usuario no puede ser eliminado debido a que tiene información relacionada.")
     return redirect("usuarios:usuarios")
   else:
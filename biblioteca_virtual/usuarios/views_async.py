@@ -0,0 +1,36 @@
+"""
+Versiones async de las vistas de lectura de usuarios, para servir con ASGI
+(ASYNC_VIEWS=True). Ver libros/views_async.py; las consultas las arman las
+funciones de views.py.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+from biblioteca_virtual import cache_listados, condicional, consultas, replicas
+from . import views
+from .forms import UsuarioForm
+from .models import Usuario
+
+@replicas.lectura
+@cache_listados.cachear_listado(Usuario)
+@condicional.listado(Usuario)
+@consultas.presupuesto(2)
+async def users(request):
+  # El listado no está paginado: se lee por bloques sin cachear el queryset
+  usuarios = [usuario async for usuario in views.listado().aiterator(chunk_size=2000)]
+  return await sync_to_async(render)(request, 'users.html', {'users': usuarios})
+
+@replicas.lectura
+async def autocompletar_usuarios(request):
+  encontrados = [usuario for consulta in views.consultas_autocompletado(request) async for usuario in consulta]
+  return views.respuesta_autocompletado(encontrados)
+
+@condicional.detalle(Usuario, csrf=True)
+async def edit_user(request, id):
+  if request.method != 'GET':
+    return await sync_to_async(views.edit_user)(request, id)
+  try:
+    user = await Usuario.objects.aget(id=id)
+  except Usuario.DoesNotExist:
+    raise Http404("No existe el usuario")
+  return await sync_to_async(render)(request, 'user_edit.html', {'user': user, 'form': UsuarioForm(instance=user)})
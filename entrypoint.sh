@@ -10,10 +10,29 @@ echo "PostgreSQL started"
 # Navigate to the Django project directory
 cd biblioteca_virtual
 
+if [ "${BOOT_MODE:-development}" = "production" ]; then
+    # Las migraciones vienen en la imagen: sin makemigrations. Migraciones,
+    # tabla de caché y superusuario en un solo proceso, detrás de un bloqueo
+    echo "Preparing database..."
+    python manage.py preparar_despliegue
+
+    echo "Starting gunicorn..."
+    if [ $# -eq 0 ]; then
+        exec gunicorn -c gunicorn.conf.py
+    else
+        exec "$@"
+    fi
+fi
+
+# Vigilancia de consultas solo en desarrollo (en settings.py está apagada)
+export QUERY_GUARD="${QUERY_GUARD:-warn}"
+
 # Run migrations
 echo "Running database migrations..."
 python manage.py makemigrations
 python manage.py migrate
+# Tabla de la caché compartida (no hace nada si CACHE_BACKEND no es DatabaseCache)
+python manage.py createcachetable
 
 # Create superuser if it doesn't exist
 echo "Creating superuser if it doesn't exist..."
@@ -13,6 +13,7 @@ echo "📋 Resumen de tests:"
 echo "- Usuarios: Models, Forms, Views"
 echo "- Libros: Models, Forms, Views"  
 echo "- Préstamos: Models, Forms, Views"
+echo "- Proyecto (biblioteca_virtual): caché, réplicas, métricas, exportación y comandos"
 echo ""
 
 # Ejecutar todos los tests con verbose
@@ -40,6 +41,7 @@ echo "🔍 Comandos útiles para testing:"
 echo "  python manage.py test usuarios                    # Solo tests de usuarios"
 echo "  python manage.py test libros                      # Solo tests de libros"
 echo "  python manage.py test prestamos                   # Solo tests de préstamos"
+echo "  python manage.py test biblioteca_virtual          # Solo tests del proyecto"
 echo "  python manage.py test usuarios.tests.UsuarioModelTest  # Test específico"
 echo "  python manage.py test --keepdb                    # Mantener DB de test"
 echo "  python manage.py test --debug-mode                # Modo debug"